@@ -12,7 +12,8 @@ class CategoryAdmin(admin.ModelAdmin):
 class CourseAdmin(admin.ModelAdmin):
     list_display = ['title', 'instructor', 'category', 'price', 'is_published', 'created_at']
     list_filter = ['is_published', 'level', 'category', 'created_at']
-    search_fields = ['title', 'description']
+    search_fields = ['title', 'slug', 'description']
+    prepopulated_fields = {'slug': ['title']}
     filter_horizontal = []
 
 
@@ -0,0 +1,172 @@
+"""
+Instructor analytics, materialized into summary tables.
+
+refresh_analytics() aggregates only the rows written since its watermarks:
+enrollments by enrolled_at and Progress by updated_at. New enrollments are
+added to CourseDailyStats per course and day, lessons with changed Progress
+get their LessonStats recounted from that lesson's rows, and every course
+touched either way gets its CourseStats recounted. Each window closes
+ANALYTICS_SETTLE_SECONDS in the past, so rows of transactions that were
+still committing are picked up by the next run instead of being skipped.
+
+Deletions move no watermark: after deleting enrollments or progress rebuild
+with `manage.py refresh_analytics --full`. The instructor endpoints read
+the summary tables only, never Enrollment or Progress.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Q, Window
+from django.db.models.functions import RowNumber, TruncDate
+from django.utils import timezone
+from .models import (
+    AnalyticsWatermark, CourseDailyStats, CourseStats, Enrollment, Lesson, LessonStats, Progress,
+)
+
+ENROLLMENTS_WATERMARK = 'enrollments'
+PROGRESS_WATERMARK = 'progress'
+BATCH_SIZE = 500
+
+
+def batches(ids):
+    ids = sorted(ids)
+    for start in range(0, len(ids), BATCH_SIZE):
+        yield ids[start:start + BATCH_SIZE]
+
+
+def refresh_analytics(full=False):
+    """
+    Bring the summary tables up to date and advance the watermarks. With
+    full=True the tables are rebuilt from every row. Returns the number of
+    new enrollments, lessons and courses that were aggregated.
+    """
+    until = timezone.now() - timedelta(seconds=getattr(settings, 'ANALYTICS_SETTLE_SECONDS', 10))
+    with transaction.atomic():
+        # Locking the watermarks keeps concurrent runs from adding the same enrollments twice
+        watermarks = dict(AnalyticsWatermark.objects.select_for_update().values_list('name', 'position'))
+        if full:
+            watermarks = {}
+            CourseDailyStats.objects.all().delete()
+            CourseStats.objects.all().delete()
+            LessonStats.objects.all().delete()
+
+        enrollments = Enrollment.objects.filter(enrolled_at__lte=until)
+        progress = Progress.objects.filter(updated_at__lte=until)
+        if ENROLLMENTS_WATERMARK in watermarks:
+            enrollments = enrollments.filter(enrolled_at__gt=watermarks[ENROLLMENTS_WATERMARK])
+        if PROGRESS_WATERMARK in watermarks:
+            progress = progress.filter(updated_at__gt=watermarks[PROGRESS_WATERMARK])
+
+        new_enrollments = add_daily_enrollments(enrollments)
+        lesson_ids = set(progress.order_by().values_list('lesson_id', flat=True).distinct())
+        course_ids = {course_id for course_id, _ in new_enrollments}
+        for ids in batches(lesson_ids):
+            course_ids.update(Lesson.objects.filter(pk__in=ids).values_list('course_id', flat=True))
+            refresh_lesson_stats(ids)
+        for ids in batches(course_ids):
+            refresh_course_stats(ids)
+
+        AnalyticsWatermark.objects.bulk_create(
+            [AnalyticsWatermark(name=name, position=until) for name in (ENROLLMENTS_WATERMARK, PROGRESS_WATERMARK)],
+            update_conflicts=True, unique_fields=['name'], update_fields=['position'],
+        )
+    return {
+        'enrollments': sum(new_enrollments.values()),
+        'lessons': len(lesson_ids),
+        'courses': len(course_ids),
+    }
+
+
+def add_daily_enrollments(enrollments):
+    """Add `enrollments` to the per-day counts; return {(course_id, date): added}."""
+    added = {
+        (row['course_id'], row['date']): row['total']
+        for row in enrollments.annotate(date=TruncDate('enrolled_at')).order_by()
+        .values('course_id', 'date').annotate(total=Count('pk'))
+    }
+    if not added:
+        return added
+    existing = set(CourseDailyStats.objects.filter(
+        course_id__in={course_id for course_id, _ in added},
+        date__in={date for _, date in added},
+    ).values_list('course_id', 'date'))
+    for (course_id, date), total in added.items():
+        if (course_id, date) in existing:
+            CourseDailyStats.objects.filter(course_id=course_id, date=date).update(
+                enrollments=F('enrollments') + total
+            )
+    CourseDailyStats.objects.bulk_create([
+        CourseDailyStats(course_id=course_id, date=date, enrollments=total)
+        for (course_id, date), total in added.items() if (course_id, date) not in existing
+    ], batch_size=BATCH_SIZE)
+    return added
+
+
+def refresh_lesson_stats(lesson_ids):
+    """Recount the funnel step and median position of each lesson in `lesson_ids`."""
+    rows = Progress.objects.filter(lesson_id__in=lesson_ids)
+    counts = rows.order_by().values('lesson_id').annotate(
+        started=Count('pk'), completed=Count('pk', filter=Q(completed=True)),
+    )
+    stats = {lesson_id: LessonStats(lesson_id=lesson_id) for lesson_id in lesson_ids}
+    for row in counts:
+        stats[row['lesson_id']].started_count = row['started']
+        stats[row['lesson_id']].completed_count = row['completed']
+
+    # The middle one or two positions of every lesson, ranked in one query
+    middle = rows.annotate(
+        rank=Window(RowNumber(), partition_by=F('lesson_id'), order_by=F('last_position').asc()),
+        total=Window(Count('pk'), partition_by=F('lesson_id')),
+    ).filter(rank__gte=(F('total') + 1) / 2, rank__lte=(F('total') + 2) / 2).values_list('lesson_id', 'last_position')
+    positions = defaultdict(list)
+    for lesson_id, position in middle:
+        positions[lesson_id].append(position)
+    for lesson_id, values in positions.items():
+        stats[lesson_id].median_position = sum(values) / len(values)
+
+    LessonStats.objects.bulk_create(
+        stats.values(), batch_size=BATCH_SIZE, update_conflicts=True, unique_fields=['lesson'],
+        update_fields=['started_count', 'completed_count', 'median_position'],
+    )
+
+
+def refresh_course_stats(course_ids):
+    """Recount the enrolled and completed totals of each course in `course_ids`."""
+    now = timezone.now()
+    stats = {course_id: CourseStats(course_id=course_id, refreshed_at=now) for course_id in course_ids}
+    counts = Enrollment.objects.filter(course_id__in=course_ids).order_by().values('course_id').annotate(
+        enrolled=Count('pk'), completed=Count('pk', filter=Q(is_completed=True)),
+    )
+    for row in counts:
+        stats[row['course_id']].enrolled_count = row['enrolled']
+        stats[row['course_id']].completed_count = row['completed']
+    CourseStats.objects.bulk_create(
+        stats.values(), batch_size=BATCH_SIZE, update_conflicts=True, unique_fields=['course'],
+        update_fields=['enrolled_count', 'completed_count', 'refreshed_at'],
+    )
+
+
+def completion_funnel(enrolled_count, lessons):
+    """
+    Build the funnel from `lessons` (dicts with the lesson and its stats, in
+    lesson order) and pick the drop-off lesson: the one losing the most
+    students against the step before it, the first step being enrollment.
+    """
+    steps, drop_off, largest_drop, previous = [], None, 0, enrolled_count
+    for lesson in lessons:
+        completed = lesson['stats__completed_count'] or 0
+        steps.append({
+            'lesson_id': lesson['id'],
+            'title': lesson['title'],
+            'order': lesson['order'],
+            'started_count': lesson['stats__started_count'] or 0,
+            'completed_count': completed,
+            'completion_rate': round(completed / enrolled_count, 4) if enrolled_count else 0.0,
+            'median_position': lesson['stats__median_position'],
+        })
+        if previous - completed > largest_drop:
+            drop_off, largest_drop = lesson['id'], previous - completed
+        previous = completed
+    return steps, drop_off
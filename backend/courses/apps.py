@@ -1,7 +1,13 @@
 from django.apps import AppConfig
+from django.core import checks
 
 
 class CoursesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'courses'
 
+    def ready(self):
+        from . import signals  # noqa: F401
+        from .position_buffer import check_cache
+
+        checks.register(check_cache, checks.Tags.caches)
@@ -0,0 +1,148 @@
+"""
+Versioned response cache for the anonymous course catalog.
+
+Cached responses are keyed by the view, the normalized query parameters and
+the version stamps the response depends on. Saving or deleting a course,
+lesson or category bumps the relevant stamps (see courses.signals), so a
+change invalidates in O(1) and the superseded entries simply age out of the
+cache. Counters that change on every enrollment (enrolled_count) may lag by
+up to CATALOG_CACHE_TIMEOUT seconds on list pages; course details are also
+keyed by their ETag validators and never lag.
+
+Student dashboards (courses.dashboard) are cached per student instead and
+deleted whenever the student's rollups change.
+"""
+import hashlib
+import time
+from urllib.parse import urlencode
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.response import Response
+
+# Bumped by any course, lesson or category change: list pages
+CATALOG_VERSION = 'catalog:version'
+# Bumped by category changes only: category endpoints and nested categories
+TAXONOMY_VERSION = 'catalog:version:taxonomy'
+HITS_KEY = 'catalog:stats:hits'
+MISSES_KEY = 'catalog:stats:misses'
+
+
+def course_version_key(course_id):
+    return f'catalog:version:course:{int(course_id)}'
+
+
+def dashboard_cache_key(student_id):
+    return f'dashboard:{int(student_id)}'
+
+
+def invalidate_dashboards(student_ids):
+    keys = [dashboard_cache_key(student_id) for student_id in set(student_ids)]
+    if keys:
+        cache.delete_many(keys)
+
+
+def bump_version(*keys):
+    for key in keys:
+        # Seed from the clock so a version evicted from the cache can never
+        # come back with a value that old entries were stored under
+        cache.add(key, int(time.time() * 1000), timeout=None)
+        try:
+            cache.incr(key)
+        except ValueError:
+            pass
+
+
+def get_versions(keys):
+    stored = cache.get_many(keys)
+    missing = {key: int(time.time() * 1000) for key in keys if key not in stored}
+    for key, value in missing.items():
+        cache.add(key, value, timeout=None)
+    if missing:
+        stored.update(cache.get_many(list(missing)))
+    return [stored.get(key, 0) for key in keys]
+
+
+def _incr(key):
+    if not cache.add(key, 1, timeout=None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            pass
+
+
+def cache_stats():
+    stats = cache.get_many([HITS_KEY, MISSES_KEY])
+    hits, misses = stats.get(HITS_KEY, 0), stats.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': round(hits / total, 4) if total else 0.0,
+    }
+
+
+class CatalogCacheMixin:
+    """
+    Serve list/retrieve for anonymous requests from the cache. Requests with
+    query parameters outside `cache_query_params` bypass the cache. The
+    handlers are async; use with learning_platform.async_views viewsets.
+    """
+    cache_query_params = ()
+
+    def get_cache_version_keys(self):
+        return [CATALOG_VERSION]
+
+    def get_cache_key(self, request):
+        if request.user.is_authenticated:
+            return None
+        pk = self.kwargs.get('pk', '')
+        if pk and not str(pk).isdigit():
+            return None
+        params = []
+        for name in request.query_params:
+            if name not in self.cache_query_params:
+                return None
+            value = request.query_params.get(name, '').strip()
+            if value:
+                params.append((name, value))
+        versions = get_versions(self.get_cache_version_keys())
+        digest = hashlib.md5(urlencode(sorted(params)).encode()).hexdigest()
+        return ':'.join([
+            'catalog', self.basename, self.action, str(int(pk)) if pk else '',
+            *map(str, versions), digest,
+        ])
+
+    def cache_lookup(self, request):
+        """Return (key, cached data); key is None when the request is not cacheable."""
+        key = self.get_cache_key(request)
+        if key is None:
+            return None, None
+        data = cache.get(key)
+        _incr(MISSES_KEY if data is None else HITS_KEY)
+        return key, data
+
+    async def cached_response(self, request, render):
+        key, data = await sync_to_async(self.cache_lookup)(request)
+        if key is None:
+            return await render()
+        if data is not None:
+            response = Response(data)
+            response['X-Cache'] = 'HIT'
+            return response
+        response = await render()
+        if response.status_code == 200:
+            await cache.aset(key, response.data, getattr(settings, 'CATALOG_CACHE_TIMEOUT', 300))
+        response['X-Cache'] = 'MISS'
+        return response
+
+    async def list(self, request, *args, **kwargs):
+        return await self.cached_response(
+            request, lambda: super(CatalogCacheMixin, self).list(request, *args, **kwargs)
+        )
+
+    async def retrieve(self, request, *args, **kwargs):
+        return await self.cached_response(
+            request, lambda: super(CatalogCacheMixin, self).retrieve(request, *args, **kwargs)
+        )
@@ -0,0 +1,76 @@
+"""
+Student dashboard read model.
+
+The dashboard is served from the per-student rollups in StudentSummary and
+the Enrollment rollup columns (watched_seconds, last_lesson,
+last_active_at), which courses.signals keeps current on every enrollment and
+Progress write. Building it is two indexed queries and never touches
+Progress. The built data is cached per student under
+courses.cache.dashboard_cache_key and deleted whenever the rollups change;
+course titles, descriptions and thumbnails may lag by up to
+DASHBOARD_CACHE_TIMEOUT seconds.
+"""
+from django.conf import settings
+from django.db.models.functions import Substr
+from .models import Course, Enrollment, StudentSummary
+from .serializers import progress_percentage
+
+# Characters of the course description shown on a dashboard card
+DESCRIPTION_PREVIEW_LENGTH = 100
+
+EMPTY_SUMMARY = {'enrolled_count': 0, 'completed_count': 0, 'watched_seconds': 0}
+
+
+def dashboard_enrollments(student_id):
+    """The student's most recently active enrollments as dashboard rows."""
+    return (
+        Enrollment.objects.filter(student_id=student_id)
+        .order_by('-last_active_at', 'id')
+        .annotate(course_description=Substr('course__description', 1, DESCRIPTION_PREVIEW_LENGTH))
+        .values(
+            'id', 'is_completed', 'completed_lessons_count', 'watched_seconds', 'last_active_at',
+            'course_id', 'course__title', 'course_description', 'course__thumbnail', 'course__lessons_count',
+            'last_lesson_id', 'last_lesson__title',
+        )[:getattr(settings, 'DASHBOARD_COURSES', 12)]
+    )
+
+
+async def build_dashboard(student_id):
+    """
+    Return the student's totals and their most recently active enrollments,
+    at most DASHBOARD_COURSES of them. Thumbnails are storage-relative; see
+    absolute_thumbnails().
+    """
+    summary = await StudentSummary.objects.filter(student_id=student_id).values(
+        'enrolled_count', 'completed_count', 'watched_seconds',
+    ).afirst()
+    enrollments = []
+    async for row in dashboard_enrollments(student_id):
+        enrollments.append({
+            'id': row['id'],
+            'is_completed': row['is_completed'],
+            'progress_percentage': progress_percentage(row['completed_lessons_count'], row['course__lessons_count']),
+            'watched_seconds': row['watched_seconds'],
+            'last_active_at': row['last_active_at'],
+            'course': {
+                'id': row['course_id'],
+                'title': row['course__title'],
+                'description': row['course_description'],
+                'thumbnail': row['course__thumbnail'] or None,
+            },
+            'last_lesson': {
+                'id': row['last_lesson_id'], 'title': row['last_lesson__title'],
+            } if row['last_lesson_id'] is not None else None,
+        })
+    return {'summary': summary or dict(EMPTY_SUMMARY), 'enrollments': enrollments}
+
+
+def absolute_thumbnails(data, request):
+    """Copy of `data` with thumbnail names turned into absolute URLs for `request`."""
+    storage = Course._meta.get_field('thumbnail').storage
+    enrollments = []
+    for enrollment in data['enrollments']:
+        name = enrollment['course']['thumbnail']
+        course = {**enrollment['course'], 'thumbnail': request.build_absolute_uri(storage.url(name)) if name else None}
+        enrollments.append({**enrollment, 'course': course})
+    return {**data, 'enrollments': enrollments}
@@ -0,0 +1,91 @@
+"""
+Bulk exports of enrollments and progress for reporting.
+
+export_rows() returns the column names and a values_list() queryset of one
+table, ordered by primary key and filtered by course and by a date range
+(enrolled_at for enrollments, updated_at for progress). Iterate it with
+.iterator(chunk_size=EXPORT_CHUNK_SIZE) or .aiterator() and encode it with
+learning_platform.streaming, as the export endpoint and
+`manage.py export_learning_data` do.
+"""
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from .models import Enrollment, Progress
+
+# Table name: (model, date field filtered by since/until, {column: path})
+EXPORT_TABLES = {
+    'enrollments': (Enrollment, 'enrolled_at', {
+        'id': 'id',
+        'student_id': 'student_id',
+        'student_username': 'student__username',
+        'course_id': 'course_id',
+        'enrolled_at': 'enrolled_at',
+        'is_completed': 'is_completed',
+        'completed_at': 'completed_at',
+        'completed_lessons_count': 'completed_lessons_count',
+        'watched_seconds': 'watched_seconds',
+        'last_lesson_id': 'last_lesson_id',
+        'last_active_at': 'last_active_at',
+    }),
+    'progress': (Progress, 'updated_at', {
+        'id': 'id',
+        'enrollment_id': 'enrollment_id',
+        'student_id': 'enrollment__student_id',
+        'course_id': 'lesson__course_id',
+        'lesson_id': 'lesson_id',
+        'lesson_order': 'lesson__order',
+        'completed': 'completed',
+        'completed_at': 'completed_at',
+        'last_position': 'last_position',
+        'updated_at': 'updated_at',
+    }),
+}
+
+
+def export_chunk_size():
+    return getattr(settings, 'EXPORT_CHUNK_SIZE', 2000)
+
+
+def parse_bound(value, end=False):
+    """
+    Parse an ISO date or datetime. A bare date covers the whole day, so as an
+    upper bound it means the start of the next day. Raise ValueError if invalid.
+    """
+    # parse_datetime() accepts bare dates too, so try those first
+    day = parse_date(value)
+    if day is not None:
+        parsed = datetime.combine(day + timedelta(days=1) if end else day, time.min)
+    else:
+        parsed = parse_datetime(value)
+    if parsed is None:
+        raise ValueError(f'Invalid date: {value!r}')
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def export_rows(table, courses=None, since=None, until=None):
+    """
+    Return (columns, queryset) for `table`, limited to the course ids in
+    `courses` and to rows dated from `since` up to `until` (ISO strings, both
+    inclusive). Raise ValueError for an unknown table or invalid bounds.
+    """
+    try:
+        model, date_field, columns = EXPORT_TABLES[table]
+    except KeyError:
+        raise ValueError(f'Unknown table {table!r}, expected one of: {", ".join(EXPORT_TABLES)}')
+    queryset = model.objects.order_by('pk')
+    if courses:
+        course_path = 'course_id' if model is Enrollment else 'lesson__course_id'
+        queryset = queryset.filter(**{f'{course_path}__in': courses})
+    if since:
+        queryset = queryset.filter(**{f'{date_field}__gte': parse_bound(since)})
+    if until:
+        # A date bound is exclusive of the next day, a datetime bound inclusive
+        bound = parse_bound(until, end=True)
+        lookup = 'lt' if parse_date(until) is not None else 'lte'
+        queryset = queryset.filter(**{f'{date_field}__{lookup}': bound})
+    return list(columns), queryset.values_list(*columns.values())
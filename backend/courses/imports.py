@@ -0,0 +1,292 @@
+"""
+Bulk catalog imports.
+
+read_catalog() parses a JSON or CSV catalog file into course records and
+import_catalog() writes them: every record is validated with
+CourseImportSerializer, categories and instructors are resolved by name in
+one query per chunk, and courses are upserted on their slug and lessons on
+(course, order) with chunked bulk_create, all inside one transaction. A
+record that fails validation, names an unknown instructor or whose chunk
+hits a database error is reported with its row number and skipped; the rest
+of the file is still imported. Courses without a slug are keyed by their
+title's slug, numbered -2, -3, ... when an earlier record of the file already
+uses it; a slug given twice is an error.
+
+On courses that already exist, fields a record leaves out keep their stored
+values, and lessons the record does not list are kept, never deleted.
+Missing categories are created. bulk_create skips the model signals, so
+lessons_count, enrollment completion, the search index and the catalog cache
+versions are brought up to date once at the end.
+"""
+import csv
+import json
+import os
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import DatabaseError, transaction
+from django.db.models import Q
+from rest_framework.exceptions import ValidationError
+from .cache import CATALOG_VERSION, TAXONOMY_VERSION, bump_version, course_version_key
+from .models import Category, Course, Enrollment, Lesson, count_subquery
+from .search import get_search_backend
+from .serializers import CourseImportSerializer
+
+User = get_user_model()
+
+FORMATS = ('json', 'csv')
+# Course and lesson columns written by an import besides the keys
+COURSE_FIELDS = ['title', 'description', 'price', 'is_free', 'duration_hours', 'level', 'is_published']
+LESSON_FIELDS = ['title', 'description', 'video_url', 'content', 'duration_minutes']
+# CSV catalogs have one row per lesson; lesson columns carry this prefix
+LESSON_COLUMN_PREFIX = 'lesson_'
+# Above this many imported courses the search index is rebuilt rather than
+# updated course by course
+REINDEX_LIMIT = 200
+
+
+class CatalogError(ValueError):
+    """The catalog file as a whole cannot be read."""
+
+
+def import_chunk_size():
+    return getattr(settings, 'IMPORT_CHUNK_SIZE', 500)
+
+
+def catalog_format(filename):
+    """The format named by the file extension, or None."""
+    extension = os.path.splitext(filename or '')[1].lower().lstrip('.')
+    return extension if extension in FORMATS else None
+
+
+def read_catalog(stream, format):
+    """
+    Parse the text `stream` as a `format` catalog into a list of (row,
+    record). JSON holds a list of courses, or an object with a "courses"
+    list, and rows count courses from 1. Raise CatalogError if unreadable.
+    """
+    if format == 'json':
+        try:
+            data = json.load(stream)
+        except ValueError as exc:
+            raise CatalogError(f'Invalid JSON: {exc}')
+        if isinstance(data, dict):
+            data = data.get('courses')
+        if not isinstance(data, list):
+            raise CatalogError('Expected a list of courses or an object with a "courses" list')
+        return list(enumerate(data, start=1))
+    if format == 'csv':
+        try:
+            return read_csv(stream)
+        except csv.Error as exc:
+            raise CatalogError(f'Invalid CSV: {exc}')
+    raise CatalogError(f'Unknown format {format!r}, expected one of: {", ".join(FORMATS)}')
+
+
+def read_csv(stream):
+    """
+    Group a CSV catalog, one lesson per line, into course records. Course
+    columns are read from the first line of each course, which is found by
+    slug or else by title; rows are line numbers. Empty cells are left out so
+    they fall back to the defaults or the stored values.
+    """
+    reader = csv.DictReader(stream)
+    if not reader.fieldnames or 'title' not in reader.fieldnames:
+        raise CatalogError('Expected a header line with at least a title column')
+    courses = {}
+    for line in reader:
+        # Cells past the header come back under the None key
+        values = {
+            column: value for column, value in line.items()
+            if column and isinstance(value, str) and value.strip()
+        }
+        course = {column: value for column, value in values.items() if not column.startswith(LESSON_COLUMN_PREFIX)}
+        lesson = {
+            column[len(LESSON_COLUMN_PREFIX):]: value
+            for column, value in values.items() if column.startswith(LESSON_COLUMN_PREFIX)
+        }
+        key = course.get('slug') or course.get('title') or f'line {reader.line_num}'
+        _, record = courses.setdefault(key, (reader.line_num, {**course, 'lessons': []}))
+        if lesson:
+            record['lessons'].append(lesson)
+    return list(courses.values())
+
+
+def import_catalog(records, default_instructor=None, dry_run=False):
+    """
+    Validate and upsert the (row, record) pairs from read_catalog(). New
+    courses without an instructor get the `default_instructor` username. With
+    dry_run everything is written and rolled back. Returns the counts of
+    created and updated courses, written lessons and new categories, plus
+    {row, slug, errors} for every record that was skipped.
+    """
+    report = {'created': 0, 'updated': 0, 'lessons': 0, 'categories_created': 0, 'errors': []}
+    course_ids = set()
+    valid = validate_records(records, report['errors'])
+    chunk_size = import_chunk_size()
+    with transaction.atomic():
+        for start in range(0, len(valid), chunk_size):
+            rows = resolve_chunk(valid[start:start + chunk_size], default_instructor, report)
+            try:
+                with transaction.atomic():
+                    written = [(rows, write_chunk(rows))]
+            except DatabaseError:
+                # Find the offending records by writing the chunk one course at a time
+                written = []
+                for row in rows:
+                    try:
+                        with transaction.atomic():
+                            written.append(([row], write_chunk([row])))
+                    except DatabaseError as exc:
+                        report['errors'].append(row_error(row['row'], row['slug'], {'non_field_errors': [str(exc)]}))
+            # Counted once written, so a rolled back savepoint adds nothing
+            for written_rows, (ids, lessons) in written:
+                created = sum(row['created'] for row in written_rows)
+                report['created'] += created
+                report['updated'] += len(written_rows) - created
+                report['lessons'] += lessons
+                course_ids.update(ids)
+        refresh_courses(course_ids)
+        if dry_run:
+            transaction.set_rollback(True)
+    report['errors'].sort(key=lambda error: error['row'])
+    if course_ids and not dry_run:
+        bump_version(CATALOG_VERSION, *map(course_version_key, course_ids))
+        if report['categories_created']:
+            bump_version(TAXONOMY_VERSION)
+    return report
+
+
+def row_error(row, slug, errors):
+    return {'row': row, 'slug': slug, 'errors': errors}
+
+
+def validate_records(records, errors):
+    """Return the validated data of `records` as (row, data); append the rest to `errors`."""
+    valid = []
+    slug_rows = {}
+    # One instance for every record, as ListSerializer does: building the
+    # model serializer's fields costs more than validating a record
+    serializer = CourseImportSerializer()
+    for row, record in records:
+        try:
+            data = serializer.run_validation(record)
+        except ValidationError as exc:
+            slug = record.get('slug') if isinstance(record, dict) else None
+            errors.append(row_error(row, slug, exc.detail))
+            continue
+        if data['slug'] in slug_rows and not (isinstance(record, dict) and record.get('slug')):
+            data['slug'] = number_slug(data['slug'], slug_rows)
+        if data['slug'] in slug_rows:
+            errors.append(row_error(row, data['slug'], {
+                'slug': [f'Duplicate slug, already used by row {slug_rows[data["slug"]]}.'],
+            }))
+            continue
+        slug_rows[data['slug']] = row
+        valid.append((row, data))
+    return valid
+
+
+def number_slug(slug, taken):
+    """`slug` with the first -2, -3, ... suffix that is not in `taken`."""
+    attempt = 2
+    while True:
+        suffix = f'-{attempt}'
+        numbered = slug[:200 - len(suffix)] + suffix
+        if numbered not in taken:
+            return numbered
+        attempt += 1
+
+
+def resolve_chunk(chunk, default_instructor, report):
+    """
+    Resolve the categories and instructors of the validated `chunk` in
+    batch, creating missing categories, and merge in the stored values of
+    courses and lessons that exist. Returns one dict per importable course.
+    """
+    usernames = {data.get('instructor', default_instructor) for _, data in chunk} - {None}
+    instructors = dict(
+        User.objects.filter(Q(is_instructor=True) | Q(is_staff=True), username__in=usernames)
+        .values_list('username', 'pk')
+    )
+    names = {data['category'] for _, data in chunk if data.get('category')}
+    categories = dict(Category.objects.filter(name__in=names).values_list('name', 'pk'))
+    if names - set(categories):
+        Category.objects.bulk_create([Category(name=name) for name in names - set(categories)], ignore_conflicts=True)
+        report['categories_created'] += len(names - set(categories))
+        categories = dict(Category.objects.filter(name__in=names).values_list('name', 'pk'))
+    existing = {
+        course.pop('slug'): course for course in Course.objects.filter(slug__in=[data['slug'] for _, data in chunk])
+        .values('slug', 'pk', 'instructor_id', 'category_id', *COURSE_FIELDS)
+    }
+    stored_lessons = {}
+    for lesson in Lesson.objects.filter(course_id__in=[course['pk'] for course in existing.values()]).values(
+        'course_id', 'order', *LESSON_FIELDS
+    ):
+        stored_lessons[lesson.pop('course_id'), lesson['order']] = lesson
+
+    rows = []
+    for row, data in chunk:
+        stored = existing.get(data['slug'])
+        fields = {field: data[field] for field in COURSE_FIELDS if field in data}
+        if 'category' in data:
+            fields['category_id'] = categories.get(data['category']) if data['category'] else None
+        username = data.get('instructor', None if stored else default_instructor)
+        if username is not None:
+            if username not in instructors:
+                report['errors'].append(row_error(row, data['slug'], {
+                    'instructor': [f'No instructor with username "{username}".'],
+                }))
+                continue
+            fields['instructor_id'] = instructors[username]
+        elif stored is None:
+            report['errors'].append(row_error(row, data['slug'], {
+                'instructor': ['This field is required for new courses.'],
+            }))
+            continue
+        lessons = []
+        for lesson in data.get('lessons', []):
+            stored_lesson = stored_lessons.get((stored['pk'], lesson['order'])) if stored else None
+            lessons.append({**(stored_lesson or {}), **lesson})
+        rows.append({
+            'row': row,
+            'slug': data['slug'],
+            'created': stored is None,
+            'fields': {**{key: value for key, value in (stored or {}).items() if key != 'pk'}, **fields},
+            'lessons': lessons,
+        })
+    return rows
+
+
+def write_chunk(rows):
+    """Upsert the courses and lessons of resolved `rows`; return (course ids, lessons written)."""
+    Course.objects.bulk_create(
+        [Course(slug=row['slug'], **row['fields']) for row in rows],
+        update_conflicts=True, unique_fields=['slug'],
+        update_fields=[*COURSE_FIELDS, 'instructor', 'category', 'updated_at'],
+    )
+    # Upserts don't return primary keys, so look them up by slug
+    ids = dict(Course.objects.filter(slug__in=[row['slug'] for row in rows]).values_list('slug', 'pk'))
+    lessons = [Lesson(course_id=ids[row['slug']], **lesson) for row in rows for lesson in row['lessons']]
+    Lesson.objects.bulk_create(
+        lessons, update_conflicts=True, unique_fields=['course', 'order'],
+        update_fields=[*LESSON_FIELDS, 'updated_at'],
+    )
+    return ids.values(), len(lessons)
+
+
+def refresh_courses(course_ids):
+    """Recount lessons, re-evaluate completion and reindex the imported courses."""
+    course_ids = sorted(course_ids)
+    chunk_size = import_chunk_size()
+    for start in range(0, len(course_ids), chunk_size):
+        ids = course_ids[start:start + chunk_size]
+        Course.objects.filter(pk__in=ids).update(lessons_count=count_subquery(Lesson.objects.all(), 'course'))
+        # New lessons reopen courses students had completed
+        Enrollment.objects.filter(course_id__in=ids).sync_completion()
+    backend = get_search_backend()
+    if len(course_ids) > REINDEX_LIMIT:
+        backend.rebuild()
+    else:
+        for course_id in course_ids:
+            backend.index_course(course_id)
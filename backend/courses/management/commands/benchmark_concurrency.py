@@ -0,0 +1,161 @@
+import asyncio
+import json
+import math
+import socket
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+SERVERS = ('wsgi', 'asgi')
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)] if ordered else 0
+
+
+class Command(BaseCommand):
+    help = (
+        'Start the project under gunicorn (WSGI) and uvicorn (ASGI) and hold N concurrent '
+        'connections against read endpoints for a fixed time, reporting throughput, latency '
+        'and errors per server as JSON. Runs against the configured database, so seed it '
+        'first (e.g. manage.py seed_courses --courses 1000).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--connections', type=int, default=500, help='Concurrent client connections')
+        parser.add_argument('--duration', type=float, default=15, help='Seconds of load per server')
+        parser.add_argument('--path', action='append', dest='paths',
+                            help='Request path, repeatable (default: course list, category list)')
+        parser.add_argument('--token', help='Send this JWT access token as a Bearer header')
+        parser.add_argument('--slow-client-ms', type=int, default=0,
+                            help='Trickle each request over this many milliseconds, like a poor mobile link')
+        parser.add_argument('--server', action='append', dest='servers', choices=SERVERS,
+                            help='Only benchmark this server (repeatable)')
+        parser.add_argument('--workers', type=int, default=2, help='Processes per server')
+        parser.add_argument('--wsgi-threads', type=int, default=8, help='Threads per gunicorn worker')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--timeout', type=float, default=30, help='Per-request client timeout')
+        parser.add_argument('--output', help='Write the JSON report to this file instead of stdout')
+
+    def handle(self, *args, **options):
+        paths = options['paths'] or ['/api/courses/', '/api/categories/']
+        results = {}
+        for server in options['servers'] or SERVERS:
+            process = self.start_server(server, options)
+            try:
+                self.wait_until_listening(options['port'], process)
+                results[server] = asyncio.run(self.load(paths, options))
+            finally:
+                process.terminate()
+                process.wait(timeout=30)
+
+        report = {
+            'connections': options['connections'],
+            'duration_s': options['duration'],
+            'paths': paths,
+            'slow_client_ms': options['slow_client_ms'],
+            'workers': options['workers'],
+            'wsgi_threads': options['wsgi_threads'],
+            'database': settings.DATABASES['default']['ENGINE'].rsplit('.', 1)[-1],
+            'servers': results,
+        }
+        output = json.dumps(report, indent=2, sort_keys=True)
+        if options['output']:
+            with open(options['output'], 'w') as output_file:
+                output_file.write(output + '\n')
+        else:
+            self.stdout.write(output)
+
+    def start_server(self, server, options):
+        bind = f'127.0.0.1:{options["port"]}'
+        if server == 'wsgi':
+            command = [
+                sys.executable, '-m', 'gunicorn', 'learning_platform.wsgi:application', '--bind', bind,
+                '--workers', str(options['workers']), '--threads', str(options['wsgi_threads']),
+                '--backlog', str(max(2048, options['connections'])), '--log-level', 'warning',
+            ]
+        else:
+            command = [
+                sys.executable, '-m', 'uvicorn', 'learning_platform.asgi:application',
+                '--host', '127.0.0.1', '--port', str(options['port']), '--workers', str(options['workers']),
+                '--backlog', str(max(2048, options['connections'])), '--log-level', 'warning', '--no-access-log',
+            ]
+        try:
+            # Inherits DJANGO_SETTINGS_MODULE from manage.py
+            return subprocess.Popen(command, cwd=settings.BASE_DIR)
+        except OSError as exc:
+            raise CommandError(f'Could not start the {server} server: {exc}')
+
+    def wait_until_listening(self, port, process, timeout=30):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise CommandError(f'Server exited with status {process.returncode} before listening')
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=1).close()
+                return
+            except OSError:
+                time.sleep(0.2)
+        raise CommandError(f'Server did not listen on port {port} within {timeout}s')
+
+    async def load(self, paths, options):
+        deadline = time.monotonic() + options['duration']
+        latencies, statuses, errors = [], {}, {}
+
+        async def client(number):
+            index = number
+            while time.monotonic() < deadline:
+                path = paths[index % len(paths)]
+                index += 1
+                start = time.perf_counter()
+                try:
+                    status = await asyncio.wait_for(self.request(path, options), options['timeout'])
+                except (OSError, asyncio.TimeoutError, IndexError, ValueError) as exc:
+                    errors[type(exc).__name__] = errors.get(type(exc).__name__, 0) + 1
+                    continue
+                latencies.append((time.perf_counter() - start) * 1000)
+                statuses[status] = statuses.get(status, 0) + 1
+
+        start = time.monotonic()
+        await asyncio.gather(*(client(number) for number in range(options['connections'])))
+        elapsed = time.monotonic() - start
+        return {
+            'requests': len(latencies),
+            'requests_per_s': round(len(latencies) / elapsed, 1),
+            'p50_ms': round(percentile(latencies, 0.5), 2),
+            'p95_ms': round(percentile(latencies, 0.95), 2),
+            'p99_ms': round(percentile(latencies, 0.99), 2),
+            'status': {str(status): count for status, count in sorted(statuses.items())},
+            'errors': errors,
+        }
+
+    async def request(self, path, options):
+        """Send one GET on a fresh connection and return the response status."""
+        reader, writer = await asyncio.open_connection('127.0.0.1', options['port'])
+        try:
+            headers = [f'GET {path} HTTP/1.1', f'Host: localhost:{options["port"]}', 'Connection: close']
+            if options['token']:
+                headers.append(f'Authorization: Bearer {options["token"]}')
+            payload = ('\r\n'.join(headers) + '\r\n\r\n').encode()
+
+            if options['slow_client_ms']:
+                chunks = 10
+                size = math.ceil(len(payload) / chunks)
+                for offset in range(0, len(payload), size):
+                    writer.write(payload[offset:offset + size])
+                    await writer.drain()
+                    await asyncio.sleep(options['slow_client_ms'] / chunks / 1000)
+            else:
+                writer.write(payload)
+                await writer.drain()
+
+            status_line = await reader.readline()
+            status = int(status_line.split()[1])
+            await reader.read()  # drain the body until the server closes
+            return status
+        finally:
+            writer.close()
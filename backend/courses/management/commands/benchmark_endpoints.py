@@ -0,0 +1,191 @@
+import io
+import json
+import math
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.test import APIClient
+from courses.analytics import refresh_analytics
+from courses.models import Course, Enrollment
+
+User = get_user_model()
+
+METRICS = ('p50_ms', 'p95_ms', 'queries', 'bytes')
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a known dataset, drive every API endpoint through the test client and '
+        'report p50/p95 latency, SQL query count and response size per endpoint as JSON. '
+        'All data is rolled back afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20, help='Timed requests per endpoint')
+        parser.add_argument('--courses', type=int, default=200)
+        parser.add_argument('--lessons-per-course', type=int, default=10)
+        parser.add_argument('--students', type=int, default=200)
+        parser.add_argument('--enrollments-per-student', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=7)
+        parser.add_argument('--output', help='Write the JSON report to this file instead of stdout')
+        parser.add_argument('--budgets', help='JSON file of per-endpoint maximums for ' + ', '.join(METRICS))
+        parser.add_argument('--endpoint', action='append', dest='endpoints',
+                            help='Only run endpoints with this name (repeatable)')
+
+    def handle(self, *args, **options):
+        budgets = {}
+        if options['budgets']:
+            with open(options['budgets']) as budgets_file:
+                budgets = json.load(budgets_file)
+
+        # Keep the position flusher thread away from the uncommitted dataset
+        with override_settings(PROGRESS_FLUSH_INTERVAL=None), transaction.atomic():
+            call_command(
+                'seed_courses', courses=options['courses'], lessons_per_course=options['lessons_per_course'],
+                students=options['students'], enrollments_per_student=options['enrollments_per_student'],
+                seed=options['seed'], stdout=io.StringIO(),
+            )
+            results = {}
+            for name, make_request, cold_cache in self.endpoints(options['seed']):
+                if options['endpoints'] and name not in options['endpoints']:
+                    continue
+                results[name] = self.measure(make_request, options['iterations'], cold_cache)
+            transaction.set_rollback(True)
+            cache.clear()
+
+        report = {
+            'dataset': {key: options[key] for key in (
+                'courses', 'lessons_per_course', 'students', 'enrollments_per_student', 'seed')},
+            'iterations': options['iterations'],
+            'database': connection.vendor,
+            'endpoints': results,
+        }
+        output = json.dumps(report, indent=2, sort_keys=True)
+        if options['output']:
+            with open(options['output'], 'w') as output_file:
+                output_file.write(output + '\n')
+        else:
+            self.stdout.write(output)
+
+        exceeded = [
+            f'{name} {metric} {results[name][metric]} > {limit}'
+            for name, limits in budgets.items() if name in results
+            for metric, limit in limits.items()
+            if results[name][metric] > limit
+        ]
+        if exceeded:
+            raise CommandError('Benchmark budgets exceeded:\n  ' + '\n  '.join(exceeded))
+
+    def measure(self, make_request, iterations, cold_cache):
+        make_request(0)  # warm up imports, connections and the cache
+        timings, queries, sizes, statuses = [], [], [], set()
+        for iteration in range(1, iterations + 1):
+            if cold_cache:
+                cache.clear()
+            with CaptureQueriesContext(connection) as captured:
+                start = time.perf_counter()
+                response = make_request(iteration)
+                # Streamed bodies are read from the database as they are consumed
+                body = b''.join(response) if response.streaming else response.content
+                timings.append((time.perf_counter() - start) * 1000)
+            queries.append(len(captured))
+            sizes.append(len(body))
+            statuses.add(response.status_code)
+        return {
+            'p50_ms': round(percentile(timings, 0.5), 2),
+            'p95_ms': round(percentile(timings, 0.95), 2),
+            'queries': max(queries),
+            'bytes': max(sizes),
+            'status': sorted(statuses),
+        }
+
+    def client(self, token=None):
+        client = APIClient(SERVER_NAME='localhost')
+        if token:
+            client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        return client
+
+    def endpoints(self, seed):
+        """Yield (name, make_request(iteration), cold_cache) for every routed endpoint."""
+        prefix = f'synthetic{seed}'
+        password = 'student123'
+        anonymous = self.client()
+
+        login = anonymous.post('/api/auth/login/', {'username': f'{prefix}_student0', 'password': password},
+                               format='json').json()
+        student = self.client(login['access'])
+        user = User.objects.get(username=f'{prefix}_student0')
+        enrollment = Enrollment.objects.filter(student=user).select_related('course').first()
+        course = enrollment.course
+        lesson_ids = list(course.lessons.values_list('id', flat=True))
+        other_courses = list(Course.objects.exclude(enrollments__student=user).values_list('id', flat=True))
+
+        staff = User.objects.create_user(
+            username=f'{prefix}_staff', email=f'{prefix}_staff@example.com', password=password, is_staff=True
+        )
+        staff_client = self.client()
+        staff_client.force_authenticate(staff)
+        instructor = self.client()
+        instructor.force_authenticate(course.instructor)
+        with override_settings(ANALYTICS_SETTLE_SECONDS=0):
+            refresh_analytics(full=True)
+
+        yield 'categories-list', lambda i: anonymous.get('/api/categories/'), True
+        yield 'categories-detail', lambda i: anonymous.get(f'/api/categories/{course.category_id}/'), True
+        yield 'courses-list', lambda i: anonymous.get('/api/courses/'), True
+        yield 'courses-list-cached', lambda i: anonymous.get('/api/courses/'), False
+        yield 'courses-list-student', lambda i: student.get('/api/courses/'), False
+        yield 'courses-list-level', lambda i: anonymous.get('/api/courses/?level=advanced'), True
+        yield 'courses-list-search', lambda i: anonymous.get('/api/courses/?search=python data'), True
+        yield 'courses-list-deep-page', lambda i: anonymous.get('/api/courses/?page=15'), True
+        yield 'courses-list-cursor', lambda i: anonymous.get('/api/courses/?pagination=cursor'), True
+        yield 'courses-detail', lambda i: anonymous.get(f'/api/courses/{course.id}/'), True
+        course_etag = anonymous.get(f'/api/courses/{course.id}/')['ETag']
+        yield 'courses-detail-not-modified', lambda i: anonymous.get(
+            f'/api/courses/{course.id}/', HTTP_IF_NONE_MATCH=course_etag), True
+        yield 'courses-lesson-content', lambda i: anonymous.get(
+            f'/api/courses/{course.id}/lessons/{lesson_ids[i % len(lesson_ids)]}/content/'), False
+        yield 'courses-enroll', lambda i: student.post(
+            f'/api/courses/{other_courses[i % len(other_courses)]}/enroll/'), False
+        yield 'courses-learner-state', lambda i: student.get(f'/api/courses/{course.id}/learner-state/'), False
+        yield 'courses-my-enrollment', lambda i: student.get(f'/api/courses/{course.id}/my_enrollment/'), False
+        yield 'enrollments-list', lambda i: student.get('/api/enrollments/'), False
+        yield 'dashboard', lambda i: student.get('/api/dashboard/'), True
+        yield 'dashboard-cached', lambda i: student.get('/api/dashboard/'), False
+        yield 'instructor-analytics-list', lambda i: instructor.get('/api/instructor/analytics/'), False
+        yield 'instructor-analytics-detail', lambda i: instructor.get(
+            f'/api/instructor/analytics/{course.id}/'), False
+        yield 'enrollments-detail', lambda i: student.get(f'/api/enrollments/{enrollment.id}/'), False
+        yield 'progress-list', lambda i: student.get(f'/api/progress/?enrollment={enrollment.id}'), False
+        yield 'progress-create', lambda i: student.post('/api/progress/', {
+            'enrollment': enrollment.id, 'lesson': lesson_ids[i % len(lesson_ids)], 'completed': True,
+        }, format='json'), False
+        yield 'progress-bulk', lambda i: student.post('/api/progress/bulk/', {
+            'enrollment': enrollment.id,
+            'updates': [{'lesson': lesson_id, 'last_position': i * 10} for lesson_id in lesson_ids],
+        }, format='json'), False
+        yield 'catalog-cache-stats', lambda i: staff_client.get('/api/catalog-cache/stats/'), False
+        yield 'exports-enrollments', lambda i: staff_client.get(f'/api/exports/enrollments/?course={course.id}'), False
+        yield 'exports-progress', lambda i: staff_client.get(
+            f'/api/exports/progress/?course={course.id}&output=ndjson'), False
+        yield 'auth-register', lambda i: anonymous.post('/api/auth/register/', {
+            'username': f'{prefix}_new{i}', 'email': f'{prefix}_new{i}@example.com',
+            'password': 'Bench-mark-42!', 'password2': 'Bench-mark-42!',
+        }, format='json'), False
+        yield 'auth-login', lambda i: anonymous.post('/api/auth/login/', {
+            'username': f'{prefix}_student0', 'password': password,
+        }, format='json'), False
+        yield 'auth-profile', lambda i: student.get('/api/auth/profile/'), False
+        yield 'auth-token-refresh', lambda i: anonymous.post('/api/auth/token/refresh/', {
+            'refresh': login['refresh'],
+        }, format='json'), False
@@ -0,0 +1,71 @@
+import random
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from courses.models import Course
+from courses.search import IContainsSearchBackend, get_search_backend
+from .seed_courses import WORDS
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare course search latency of the icontains scan and the configured '
+        'full-text backend on a synthetic catalog. All data is rolled back afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--courses', type=int, default=100000, help='Number of synthetic courses')
+        parser.add_argument('--repeat', type=int, default=5, help='Timed runs per query')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed for the catalog')
+        parser.add_argument('--query', action='append', dest='queries',
+                            help='Search text to time (repeatable)')
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        queries = options['queries'] or ['python', 'machine learning', 'kuber', 'advanced data science']
+
+        with transaction.atomic():
+            self.seed_catalog(rng, options['courses'])
+            backends = [('icontains', IContainsSearchBackend()), ('indexed', get_search_backend())]
+            for text in queries:
+                for label, backend in backends:
+                    timings = [self.time_search(backend, text) for _ in range(options['repeat'])]
+                    self.stdout.write(
+                        f'{text!r:28} {label:10} median {statistics.median(timings) * 1000:8.2f} ms  '
+                        f'max {max(timings) * 1000:8.2f} ms'
+                    )
+            transaction.set_rollback(True)
+
+    def seed_catalog(self, rng, count):
+        self.stdout.write(f'Seeding {count} courses...')
+        # Topic words are diluted with a filler vocabulary so that common
+        # queries match a realistic fraction of the catalog
+        syllables = ['ka', 'lo', 'mi', 'ne', 'ru', 'sa', 'ti', 'vo', 'ze', 'pa', 'qu', 'do']
+        filler = [''.join(rng.choices(syllables, k=3)) for _ in range(5000)]
+        instructor = User.objects.create(username='benchmark_instructor', email='benchmark@example.com')
+        batch = []
+        for i in range(count):
+            batch.append(Course(
+                title=' '.join(rng.choices(WORDS, k=2) + rng.choices(filler, k=2)).title(),
+                description=' '.join(rng.choices(WORDS, k=2) + rng.choices(filler, k=38)),
+                instructor=instructor,
+                is_published=True,
+            ))
+            if len(batch) == 5000:
+                Course.objects.bulk_create(batch)
+                batch = []
+        Course.objects.bulk_create(batch)
+        get_search_backend().rebuild()
+
+    def time_search(self, backend, text):
+        """Time what the list endpoint does: a COUNT plus the first page."""
+        queryset = backend.search(Course.objects.filter(is_published=True), text)
+        start = time.perf_counter()
+        queryset.count()
+        list(queryset[:10])
+        return time.perf_counter() - start
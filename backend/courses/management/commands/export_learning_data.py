@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+from courses.exports import EXPORT_TABLES, export_chunk_size, export_rows
+from learning_platform.streaming import ROW_ENCODERS, iter_rows
+
+
+class Command(BaseCommand):
+    help = (
+        'Stream every enrollment or progress row, optionally for some courses and a date range, '
+        'as CSV or NDJSON. Memory use does not grow with the number of rows.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('table', choices=list(EXPORT_TABLES))
+        parser.add_argument('--format', choices=list(ROW_ENCODERS), default='csv')
+        parser.add_argument('--course', type=int, action='append', dest='courses',
+                            help='Only export the given course id (repeatable)')
+        parser.add_argument('--since', help='First date or datetime to include (enrolled_at / updated_at)')
+        parser.add_argument('--until', help='Last date or datetime to include')
+        parser.add_argument('--output', help='File to write instead of stdout')
+
+    def handle(self, *args, **options):
+        try:
+            columns, rows = export_rows(options['table'], options['courses'], options['since'], options['until'])
+        except ValueError as exc:
+            raise CommandError(exc)
+        encoder = ROW_ENCODERS[options['format']](columns)
+        chunks = iter_rows(encoder, rows.iterator(chunk_size=export_chunk_size()))
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8', newline='') as output:
+                output.writelines(chunks)
+        else:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from courses import position_buffer
+
+
+class Command(BaseCommand):
+    help = 'Write buffered video positions from the cache to the Progress table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep flushing until interrupted')
+        parser.add_argument('--interval', type=float, default=5, help='Seconds between flushes with --loop')
+
+    def handle(self, *args, **options):
+        while True:
+            written = position_buffer.flush()
+            if written or not options['loop']:
+                self.stdout.write(f'Flushed {written} buffered positions')
+            if not options['loop']:
+                return
+            close_old_connections()
+            time.sleep(options['interval'])
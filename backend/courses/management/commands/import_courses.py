@@ -0,0 +1,38 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from courses.imports import FORMATS, CatalogError, catalog_format, import_catalog, read_catalog
+
+
+class Command(BaseCommand):
+    help = (
+        'Import a JSON or CSV catalog of courses with their lessons, upserting courses on their slug '
+        'and lessons on their order. Invalid records are reported and skipped.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=FORMATS, help='Catalog format; defaults to the file extension')
+        parser.add_argument('--instructor', help='Username of the instructor of new courses that name none')
+        parser.add_argument('--dry-run', action='store_true', help='Validate and write, then roll back')
+
+    def handle(self, *args, **options):
+        format = options['format'] or catalog_format(options['path'])
+        if format is None:
+            raise CommandError(f'Cannot tell the format of {options["path"]}; pass --format')
+        try:
+            with open(options['path'], encoding='utf-8-sig', newline='') as catalog:
+                records = read_catalog(catalog, format)
+        except (OSError, CatalogError) as exc:
+            raise CommandError(exc)
+        report = import_catalog(records, options['instructor'], dry_run=options['dry_run'])
+
+        for error in report['errors']:
+            self.stderr.write(f'row {error["row"]} ({error["slug"] or "no slug"}): {json.dumps(error["errors"])}')
+        summary = (
+            f'{report["created"]} courses created, {report["updated"]} updated, {report["lessons"]} lessons, '
+            f'{report["categories_created"]} new categories, {len(report["errors"])} rows skipped'
+        )
+        if options['dry_run']:
+            summary += ' (dry run, rolled back)'
+        self.stdout.write(self.style.WARNING(summary) if report['errors'] else self.style.SUCCESS(summary))
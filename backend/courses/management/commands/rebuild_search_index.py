@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from courses.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the course full-text search index from the course and lesson tables'
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        with transaction.atomic():
+            backend.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt search index using {type(backend).__name__}'))
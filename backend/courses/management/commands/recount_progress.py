@@ -0,0 +1,70 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F
+from courses.models import (
+    Course, Enrollment, Lesson, Progress, StudentSummary, count_subquery, watched_seconds_subquery
+)
+
+
+class Command(BaseCommand):
+    help = 'Recompute denormalized lesson, enrollment, progress and student dashboard counters and repair drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--course', type=int, action='append', dest='courses',
+                            help='Only repair the given course id (repeatable)')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Report drift without writing any changes')
+
+    def handle(self, *args, **options):
+        courses = Course.objects.all()
+        enrollments = Enrollment.objects.all()
+        if options['courses']:
+            courses = courses.filter(pk__in=options['courses'])
+            enrollments = enrollments.filter(course_id__in=options['courses'])
+
+        drifted_courses = courses.with_actual_counts().exclude(
+            lessons_count=F('actual_lessons_count'),
+            enrolled_count=F('actual_enrolled_count'),
+        )
+        drifted_enrollments = enrollments.with_actual_counts().exclude(
+            completed_lessons_count=F('actual_completed_lessons_count'),
+            watched_seconds=F('actual_watched_seconds'),
+        )
+        students = enrollments.order_by().values('student_id').distinct()
+        summaries = StudentSummary.objects.filter(student_id__in=students)
+        drifted_summaries = summaries.with_actual_counts().exclude(
+            enrolled_count=F('actual_enrolled_count'),
+            completed_count=F('actual_completed_count'),
+            watched_seconds=F('actual_watched_seconds'),
+        )
+        course_drift = drifted_courses.count()
+        enrollment_drift = drifted_enrollments.count()
+        # Students with enrollments but no summary row count as drifted too
+        summary_drift = drifted_summaries.count() + students.count() - summaries.count()
+
+        self.stdout.write(f'Courses with drifted counters: {course_drift}')
+        self.stdout.write(f'Enrollments with drifted counters: {enrollment_drift}')
+        self.stdout.write(f'Student summaries with drifted counters: {summary_drift}')
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING('Dry run, no changes written.'))
+            return
+
+        with transaction.atomic():
+            Course.objects.filter(pk__in=drifted_courses.values('pk')).update(
+                lessons_count=count_subquery(Lesson.objects.all(), 'course'),
+                enrolled_count=count_subquery(Enrollment.objects.all(), 'course'),
+            )
+            Enrollment.objects.filter(pk__in=drifted_enrollments.values('pk')).update(
+                completed_lessons_count=count_subquery(Progress.objects.filter(completed=True), 'enrollment'),
+                watched_seconds=watched_seconds_subquery(),
+            )
+            synced = enrollments.sync_completion()
+            # Completion may just have changed, so recount every summary in scope
+            student_ids = list(students.values_list('student_id', flat=True))
+            for start in range(0, len(student_ids), 500):
+                StudentSummary.objects.rebuild(student_ids[start:start + 500])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Repaired {course_drift} courses, {enrollment_drift} enrollments and {summary_drift} student '
+            f'summaries, updated completion state of {synced} enrollments.'
+        ))
@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from courses.analytics import refresh_analytics
+
+
+class Command(BaseCommand):
+    help = (
+        'Aggregate enrollments and progress written since the last run into the instructor '
+        'analytics summary tables'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true',
+                            help='Rebuild the summary tables from every row (needed after deletions)')
+        parser.add_argument('--loop', action='store_true', help='Keep aggregating until interrupted')
+        parser.add_argument('--interval', type=float, default=60, help='Seconds between runs with --loop')
+
+    def handle(self, *args, **options):
+        full = options['full']
+        while True:
+            started = time.perf_counter()
+            totals = refresh_analytics(full=full)
+            self.stdout.write(
+                f'Aggregated {totals["enrollments"]} new enrollments, {totals["lessons"]} lessons and '
+                f'{totals["courses"]} courses in {time.perf_counter() - started:.2f}s'
+            )
+            if not options['loop']:
+                return
+            full = False
+            close_old_connections()
+            time.sleep(options['interval'])
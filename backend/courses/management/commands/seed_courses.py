@@ -1,14 +1,52 @@
-from django.core.management.base import BaseCommand
+import random
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
 from django.contrib.auth import get_user_model
-from courses.models import Category, Course, Lesson
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.utils import timezone
+from django.utils.text import slugify
+from courses.cache import CATALOG_VERSION, bump_version
+from courses.models import Category, Course, Lesson, Enrollment, Progress, StudentSummary, count_subquery
+from courses.search import get_search_backend
 
 User = get_user_model()
 
+# Vocabulary for synthetic course titles and descriptions
+WORDS = [
+    'python', 'java', 'django', 'react', 'data', 'science', 'machine', 'learning', 'deep',
+    'neural', 'network', 'cloud', 'devops', 'security', 'design', 'pattern', 'algorithm',
+    'structure', 'database', 'query', 'frontend', 'backend', 'mobile', 'testing', 'api',
+    'kubernetes', 'docker', 'linux', 'statistics', 'analytics', 'visualization', 'compiler',
+    'systems', 'concurrency', 'functional', 'programming', 'web', 'performance', 'scaling',
+    'introduction', 'advanced', 'practical', 'fundamentals', 'mastering', 'complete', 'guide',
+]
+
 
 class Command(BaseCommand):
-    help = 'Seed the database with course categories, courses, and lessons'
+    help = (
+        'Seed the database with course categories, courses, and lessons. '
+        'Pass --courses to generate a synthetic dataset for load testing instead.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--courses', type=int,
+                            help='Generate this many synthetic courses instead of the sample catalog')
+        parser.add_argument('--lessons-per-course', type=int, default=10)
+        parser.add_argument('--students', type=int, default=0)
+        parser.add_argument('--enrollments-per-student', type=int, default=5)
+        parser.add_argument('--progress-density', type=float, default=0.5,
+                            help='Fraction of each enrolled course a student has worked through (0-1)')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed; the same seed gives the same data')
+        parser.add_argument('--chunk-size', type=int, default=5000,
+                            help='Rows per bulk_create batch and per transaction')
 
     def handle(self, *args, **options):
+        if options['courses'] is not None:
+            return self.generate(options)
+
         self.stdout.write(self.style.SUCCESS('Starting to seed courses...'))
 
         # Create or get categories
@@ -99,6 +137,7 @@ class Command(BaseCommand):
             course, created = Course.objects.get_or_create(
                 title=course_data['title'],
                 defaults={
+                    'slug': slugify(course_data['title']),
                     'description': course_data['description'],
                     'instructor': instructor,
                     'category': category,
@@ -176,3 +215,153 @@ class Command(BaseCommand):
         
         return instructor
 
+
+    def generate(self, options):
+        """
+        Bulk-generate a synthetic dataset. Rows are written with bulk_create in
+        chunks, one transaction per chunk, and the denormalized counters are
+        filled in directly since bulk_create skips the model signals.
+        """
+        if not 0 <= options['progress_density'] <= 1:
+            raise CommandError('--progress-density must be between 0 and 1')
+        if options['enrollments_per_student'] > options['courses']:
+            raise CommandError('--enrollments-per-student cannot exceed --courses')
+        self.rng = random.Random(options['seed'])
+        self.chunk_size = options['chunk_size']
+        self.prefix = f"synthetic{options['seed']}"
+        if User.objects.filter(username__startswith=f'{self.prefix}_').exists():
+            raise CommandError(f'Synthetic data for --seed {options["seed"]} already exists; use another seed')
+
+        started = time.monotonic()
+        categories = list(self.create_categories().values())
+        course_lessons = self.generate_courses(options['courses'], options['lessons_per_course'], categories)
+        if options['students']:
+            self.generate_students(
+                options['students'], options['enrollments_per_student'],
+                options['progress_density'], course_lessons,
+            )
+        get_search_backend().rebuild()
+        bump_version(CATALOG_VERSION)
+        self.stdout.write(self.style.SUCCESS(f'Generated synthetic dataset in {time.monotonic() - started:.1f}s'))
+
+    def chunks(self, items):
+        for start in range(0, len(items), self.chunk_size):
+            yield items[start:start + self.chunk_size]
+
+    def generate_courses(self, count, lessons_per_course, categories):
+        """Create courses with their lessons; returns {course_id: [lesson_id, ...]}."""
+        rng = self.rng
+        instructor_hash = make_password(None)
+        instructors = User.objects.bulk_create([
+            User(
+                username=f'{self.prefix}_instructor{i}', email=f'{self.prefix}_instructor{i}@example.com',
+                password=instructor_hash, is_instructor=True,
+            )
+            for i in range(max(1, count // 20))
+        ])
+        course_lessons = {}
+        for numbers in self.chunks(range(count)):
+            with transaction.atomic():
+                courses = Course.objects.bulk_create([
+                    Course(
+                        title=' '.join(rng.choices(WORDS, k=3)).title(),
+                        description=' '.join(rng.choices(WORDS, k=30)),
+                        instructor=rng.choice(instructors),
+                        category=rng.choice(categories),
+                        level=rng.choice(['beginner', 'intermediate', 'advanced']),
+                        duration_hours=rng.randint(1, 80),
+                        is_published=True,
+                        lessons_count=lessons_per_course,
+                    )
+                    for _ in numbers
+                ])
+                lessons = Lesson.objects.bulk_create([
+                    Lesson(
+                        course=course,
+                        title=' '.join(rng.choices(WORDS, k=3)).capitalize(),
+                        description=' '.join(rng.choices(WORDS, k=12)),
+                        content=' '.join(rng.choices(WORDS, k=200)),
+                        order=order,
+                        duration_minutes=rng.randint(5, 90),
+                    )
+                    for course in courses
+                    for order in range(1, lessons_per_course + 1)
+                ], batch_size=self.chunk_size)
+            for course in courses:
+                course_lessons[course.id] = []
+            for lesson in lessons:
+                course_lessons[lesson.course_id].append(lesson.id)
+            self.stdout.write(f'  {len(course_lessons)}/{count} courses')
+        return course_lessons
+
+    def generate_students(self, count, enrollments_per_student, density, course_lessons):
+        """Create students, their enrollments and their Progress rows."""
+        rng = self.rng
+        # Hash once: every synthetic student logs in with the same password
+        password = make_password('student123')
+        course_ids = list(course_lessons)
+        enrolled = Counter()
+        progress_rows = 0
+        now = timezone.now()
+        for numbers in self.chunks(range(count)):
+            with transaction.atomic():
+                students = User.objects.bulk_create([
+                    User(username=f'{self.prefix}_student{i}', email=f'{self.prefix}_student{i}@example.com',
+                         password=password)
+                    for i in numbers
+                ])
+                enrollments = []
+                touched = {}
+                for student in students:
+                    for course_id in rng.sample(course_ids, enrollments_per_student):
+                        lessons = course_lessons[course_id]
+                        # Students work through a course in order; the last
+                        # lesson they touched is the one still in progress
+                        reached = round(len(lessons) * density * rng.uniform(0.5, 1.5))
+                        reached = min(len(lessons), reached)
+                        completed = reached if reached == len(lessons) else max(reached - 1, 0)
+                        enrollment = Enrollment(
+                            student=student, course_id=course_id,
+                            completed_lessons_count=completed,
+                            is_completed=bool(lessons) and completed == len(lessons),
+                            completed_at=now if lessons and completed == len(lessons) else None,
+                        )
+                        enrollments.append(enrollment)
+                        touched[id(enrollment)] = lessons[:reached]
+                        enrolled[course_id] += 1
+                positions = {
+                    id(enrollment): [rng.randint(0, 3600) for _ in touched[id(enrollment)]]
+                    for enrollment in enrollments
+                }
+                summaries = {student.pk: StudentSummary(student=student) for student in students}
+                for enrollment in enrollments:
+                    # bulk_create skips the signals maintaining the dashboard rollups
+                    enrollment.watched_seconds = sum(positions[id(enrollment)])
+                    enrollment.last_lesson_id = touched[id(enrollment)][-1] if touched[id(enrollment)] else None
+                    summary = summaries[enrollment.student.pk]
+                    summary.enrolled_count += 1
+                    summary.completed_count += enrollment.is_completed
+                    summary.watched_seconds += enrollment.watched_seconds
+                Enrollment.objects.bulk_create(enrollments, batch_size=self.chunk_size)
+                StudentSummary.objects.bulk_create(summaries.values(), batch_size=self.chunk_size)
+                progress = [
+                    Progress(
+                        enrollment=enrollment,
+                        lesson_id=lesson_id,
+                        completed=index < enrollment.completed_lessons_count,
+                        completed_at=now if index < enrollment.completed_lessons_count else None,
+                        last_position=position,
+                    )
+                    for enrollment in enrollments
+                    for index, (lesson_id, position) in enumerate(
+                        zip(touched[id(enrollment)], positions[id(enrollment)])
+                    )
+                ]
+                Progress.objects.bulk_create(progress, batch_size=self.chunk_size)
+            progress_rows += len(progress)
+            self.stdout.write(f'  {numbers[-1] + 1}/{count} students, {progress_rows} progress rows')
+
+        for ids in self.chunks(list(enrolled)):
+            Course.objects.filter(pk__in=ids).update(
+                enrolled_count=count_subquery(Enrollment.objects.all(), 'course')
+            )
@@ -0,0 +1,50 @@
+# Generated by Django 4.2.7 on 2025-11-24 10:12
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def _count(queryset, field):
+    counts = queryset.filter(**{field: OuterRef('pk')}).order_by().values(field).annotate(total=Count('pk')).values('total')
+    return Coalesce(Subquery(counts), 0)
+
+
+def backfill_counters(apps, schema_editor):
+    Course = apps.get_model('courses', 'Course')
+    Lesson = apps.get_model('courses', 'Lesson')
+    Enrollment = apps.get_model('courses', 'Enrollment')
+    Progress = apps.get_model('courses', 'Progress')
+    Course.objects.update(
+        lessons_count=_count(Lesson.objects.all(), 'course'),
+        enrolled_count=_count(Enrollment.objects.all(), 'course'),
+    )
+    Enrollment.objects.update(
+        completed_lessons_count=_count(Progress.objects.filter(completed=True), 'enrollment'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='enrolled_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='lessons_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='enrollment',
+            name='completed_lessons_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
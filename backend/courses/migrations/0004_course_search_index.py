@@ -0,0 +1,79 @@
+# Generated by Django 4.2.7 on 2025-11-24 11:03
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+FTS_TABLE = 'courses_course_fts'
+
+POSTGRES_COURSE_VECTOR = (
+    "setweight(to_tsvector('english'::regconfig, COALESCE((title)::text, '')), 'A') || "
+    "setweight(to_tsvector('english'::regconfig, COALESCE((description)::text, '')), 'B')"
+)
+POSTGRES_LESSON_VECTOR = (
+    "to_tsvector('english'::regconfig, "
+    "COALESCE((title)::text, '') || ' ' || COALESCE((description)::text, ''))"
+)
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+            f"title, description, lessons, tokenize='porter unicode61')"
+        )
+        # Weight title over description over lesson text in the rank column
+        schema_editor.execute(
+            f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rank) VALUES ('rank', 'bm25(10.0, 4.0, 1.0)')"
+        )
+        schema_editor.execute(
+            f"INSERT INTO {FTS_TABLE} (rowid, title, description, lessons) "
+            f"SELECT c.id, c.title, c.description, "
+            f"(SELECT group_concat(l.title || ' ' || l.description, ' ') "
+            f"FROM courses_lesson l WHERE l.course_id = c.id) "
+            f"FROM courses_course c"
+        )
+    elif vendor == 'postgresql':
+        schema_editor.execute(
+            f'CREATE INDEX courses_course_search_idx ON courses_course '
+            f'USING GIN (({POSTGRES_COURSE_VECTOR}))'
+        )
+        schema_editor.execute(
+            f'CREATE INDEX courses_lesson_search_idx ON courses_lesson '
+            f'USING GIN (({POSTGRES_LESSON_VECTOR}))'
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+    elif vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS courses_course_search_idx')
+        schema_editor.execute('DROP INDEX IF EXISTS courses_lesson_search_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0003_completion_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourseSearchEntry',
+            fields=[
+                ('course', models.OneToOneField(db_column='rowid', db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_entry', serialize=False, to='courses.course')),
+                ('title', models.TextField()),
+                ('description', models.TextField()),
+                ('lessons', models.TextField()),
+                ('document', models.TextField(db_column='courses_course_fts')),
+                ('rank', models.FloatField()),
+            ],
+            options={
+                'db_table': 'courses_course_fts',
+                'managed': False,
+            },
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
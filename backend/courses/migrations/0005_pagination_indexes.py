@@ -0,0 +1,21 @@
+# Generated by Django 4.2.7 on 2025-11-26 09:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0004_course_search_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(fields=['-created_at', 'id'], name='course_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='enrollment',
+            index=models.Index(fields=['student', '-enrolled_at', 'id'], name='enrollment_student_date_idx'),
+        ),
+    ]
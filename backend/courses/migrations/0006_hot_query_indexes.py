@@ -0,0 +1,29 @@
+# Generated by Django 4.2.7 on 2025-11-28 14:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0005_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='course',
+            name='course_created_id_idx',
+        ),
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(condition=models.Q(('is_published', True)), fields=['-created_at', 'id'], name='course_published_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(condition=models.Q(('is_published', True)), fields=['level', '-created_at', 'id'], name='course_published_level_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='progress',
+            index=models.Index(condition=models.Q(('completed', True)), fields=['enrollment'], name='progress_completed_idx'),
+        ),
+    ]
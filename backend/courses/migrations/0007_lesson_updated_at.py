@@ -0,0 +1,27 @@
+# Generated by Django 4.2.7 on 2025-12-02 09:41
+
+from django.db import migrations, models
+from django.db.models import F
+import django.utils.timezone
+
+
+def backfill_updated_at(apps, schema_editor):
+    Lesson = apps.get_model('courses', 'Lesson')
+    Lesson.objects.update(updated_at=F('created_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0006_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lesson',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.RunPython(backfill_updated_at, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,81 @@
+# Generated by Django 4.2.7 on 2025-12-09 10:12
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count, Max, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce, Greatest
+import django.utils.timezone
+
+
+def backfill_rollups(apps, schema_editor):
+    Enrollment = apps.get_model('courses', 'Enrollment')
+    Progress = apps.get_model('courses', 'Progress')
+    StudentSummary = apps.get_model('courses', 'StudentSummary')
+    progress = Progress.objects.filter(enrollment=OuterRef('pk')).order_by()
+    # Progress rows carry no write time: take the newest row as the last
+    # active lesson and the latest completion (or the enrollment) as the time
+    Enrollment.objects.update(
+        watched_seconds=Coalesce(Subquery(
+            progress.values('enrollment').annotate(total=Sum(Greatest('last_position', 0))).values('total')
+        ), 0),
+        last_lesson_id=Subquery(progress.order_by('-pk').values('lesson_id')[:1]),
+        last_active_at=Coalesce(Subquery(
+            progress.values('enrollment').annotate(latest=Max('completed_at')).values('latest')
+        ), 'enrolled_at'),
+    )
+    totals = Enrollment.objects.order_by().values('student_id').annotate(
+        enrolled_count=Count('pk'),
+        completed_count=Count('pk', filter=Q(is_completed=True)),
+        total_watched_seconds=Sum('watched_seconds'),
+    )
+    StudentSummary.objects.bulk_create([
+        StudentSummary(
+            student_id=total['student_id'], enrolled_count=total['enrolled_count'],
+            completed_count=total['completed_count'], watched_seconds=total['total_watched_seconds'],
+        )
+        for total in totals.iterator()
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+        ('courses', '0007_lesson_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StudentSummary',
+            fields=[
+                ('student', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='learning_summary', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('enrolled_count', models.PositiveIntegerField(default=0)),
+                ('completed_count', models.PositiveIntegerField(default=0)),
+                ('watched_seconds', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name_plural': 'Student summaries',
+            },
+        ),
+        migrations.AddField(
+            model_name='enrollment',
+            name='last_active_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.AddField(
+            model_name='enrollment',
+            name='last_lesson',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='courses.lesson'),
+        ),
+        migrations.AddField(
+            model_name='enrollment',
+            name='watched_seconds',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='enrollment',
+            index=models.Index(fields=['student', '-last_active_at', 'id'], name='enrollment_student_active_idx'),
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,84 @@
+# Generated by Django 4.2.7 on 2025-12-16 14:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0008_dashboard_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnalyticsWatermark',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('position', models.DateTimeField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='CourseDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('enrollments', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name_plural': 'Course daily stats',
+            },
+        ),
+        migrations.CreateModel(
+            name='CourseStats',
+            fields=[
+                ('course', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='courses.course')),
+                ('enrolled_count', models.PositiveIntegerField(default=0)),
+                ('completed_count', models.PositiveIntegerField(default=0)),
+                ('refreshed_at', models.DateTimeField()),
+            ],
+            options={
+                'verbose_name_plural': 'Course stats',
+            },
+        ),
+        migrations.CreateModel(
+            name='LessonStats',
+            fields=[
+                ('lesson', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='courses.lesson')),
+                ('started_count', models.PositiveIntegerField(default=0)),
+                ('completed_count', models.PositiveIntegerField(default=0)),
+                ('median_position', models.FloatField(null=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Lesson stats',
+            },
+        ),
+        migrations.AddField(
+            model_name='progress',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddIndex(
+            model_name='enrollment',
+            index=models.Index(fields=['enrolled_at'], name='enrollment_enrolled_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='progress',
+            index=models.Index(fields=['updated_at'], name='progress_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='progress',
+            index=models.Index(fields=['lesson', 'last_position'], name='progress_lesson_position_idx'),
+        ),
+        migrations.AddField(
+            model_name='coursedailystats',
+            name='course',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='courses.course'),
+        ),
+        migrations.AddConstraint(
+            model_name='coursedailystats',
+            constraint=models.UniqueConstraint(fields=('course', 'date'), name='course_daily_stats_unique'),
+        ),
+    ]
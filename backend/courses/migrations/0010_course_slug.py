@@ -0,0 +1,38 @@
+# Generated by Django 4.2.7 on 2025-12-19 09:41
+
+from django.db import migrations, models
+from django.utils.text import slugify
+
+
+def backfill_slugs(apps, schema_editor):
+    Course = apps.get_model('courses', 'Course')
+    # Oldest course keeps the plain title slug, later duplicates get their id
+    # appended, and a counter too if another title already slugified to that
+    taken = set()
+    courses = []
+    for course in Course.objects.order_by('pk').only('pk', 'title').iterator():
+        base = slugify(course.title)[:180] or 'course'
+        slug, attempt = base, 1
+        while slug in taken:
+            slug = f'{base}-{course.pk}' if attempt == 1 else f'{base}-{course.pk}-{attempt}'
+            attempt += 1
+        taken.add(slug)
+        course.slug = slug
+        courses.append(course)
+    Course.objects.bulk_update(courses, ['slug'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0009_course_analytics'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='slug',
+            field=models.SlugField(blank=True, max_length=200, null=True, unique=True),
+        ),
+        migrations.RunPython(backfill_slugs, migrations.RunPython.noop),
+    ]
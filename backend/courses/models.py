@@ -1,5 +1,58 @@
-from django.db import models
+from collections import Counter, defaultdict
+
+from django.db import connections, models, transaction
+from django.db.models import Count, Exists, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.db.models.signals import post_save
 from django.conf import settings
+from django.utils import timezone
+from .cache import invalidate_dashboards
+
+
+def count_subquery(queryset, field):
+    """Correlated COUNT(*) of `queryset` rows whose `field` matches the outer pk."""
+    counts = (
+        queryset.filter(**{field: OuterRef('pk')})
+        .order_by()
+        .values(field)
+        .annotate(total=Count('pk'))
+        .values('total')
+    )
+    return Coalesce(Subquery(counts), 0)
+
+
+def sum_subquery(queryset, field, expression):
+    """Correlated SUM(expression) of `queryset` rows whose `field` matches the outer pk."""
+    sums = (
+        queryset.filter(**{field: OuterRef('pk')})
+        .order_by()
+        .values(field)
+        .annotate(total=Sum(expression))
+        .values('total')
+    )
+    return Coalesce(Subquery(sums), 0)
+
+
+def watched_seconds_subquery():
+    """Correlated Enrollment.watched_seconds recomputed from its Progress positions."""
+    return sum_subquery(Progress.objects.all(), 'enrollment', Greatest('last_position', 0))
+
+
+class SignalCountersMixin:
+    """
+    Leave the columns named in `counter_fields`, which courses.signals keeps
+    up to date with F() updates, out of save() on existing rows, so saving a
+    stale instance can't overwrite them. Pass update_fields to write them.
+    """
+    counter_fields = ()
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.counter_fields
+            ]
+        super().save(*args, **kwargs)
 
 
 class Category(models.Model):
@@ -14,8 +67,35 @@ class Category(models.Model):
         verbose_name_plural = "Categories"
 
 
-class Course(models.Model):
+def enrollment_status(user, course_ref='pk'):
+    """EXISTS subquery: is `user` enrolled in the course at OuterRef(course_ref)."""
+    if user is not None and user.is_authenticated:
+        return Exists(Enrollment.objects.filter(course=OuterRef(course_ref), student_id=user.id))
+    return Value(False)
+
+
+class CourseQuerySet(models.QuerySet):
+    def with_enrollment_status(self, user=None):
+        """Annotate is_enrolled for `user` as an EXISTS subquery."""
+        return self.annotate(is_enrolled=enrollment_status(user))
+
+    def with_lessons_modified(self):
+        """Annotate the latest updated_at among the course's lessons (None without lessons)."""
+        latest = Lesson.objects.filter(course=OuterRef('pk')).order_by('-updated_at').values('updated_at')[:1]
+        return self.annotate(lessons_modified=Subquery(latest))
+
+    def with_actual_counts(self):
+        """Annotate the lesson and enrollment counts recomputed from scratch."""
+        return self.annotate(
+            actual_lessons_count=count_subquery(Lesson.objects.all(), 'course'),
+            actual_enrolled_count=count_subquery(Enrollment.objects.all(), 'course'),
+        )
+
+
+class Course(SignalCountersMixin, models.Model):
     title = models.CharField(max_length=200)
+    # Natural key that catalog imports upsert on, see courses.imports
+    slug = models.SlugField(max_length=200, unique=True, null=True, blank=True)
     description = models.TextField()
     instructor = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='courses')
     category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, blank=True)
@@ -31,12 +111,66 @@ class Course(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     is_published = models.BooleanField(default=False)
+    # Denormalized counters, maintained by courses.signals
+    lessons_count = models.PositiveIntegerField(default=0, editable=False)
+    enrolled_count = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = CourseQuerySet.as_manager()
+    counter_fields = ('lessons_count', 'enrolled_count')
 
     def __str__(self):
         return self.title
 
     class Meta:
         ordering = ['-created_at']
+        # The catalog only ever lists published courses, and boolean filters
+        # compile to a bare column test that composite indexes can't seek on,
+        # so the hot indexes are partial on is_published instead.
+        indexes = [
+            # Default and keyset pagination order, see courses.pagination
+            models.Index(
+                fields=['-created_at', 'id'], condition=models.Q(is_published=True),
+                name='course_published_created_idx',
+            ),
+            models.Index(
+                fields=['level', '-created_at', 'id'], condition=models.Q(is_published=True),
+                name='course_published_level_idx',
+            ),
+        ]
+
+
+class FullTextMatch(models.Lookup):
+    lookup_name = 'match'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} MATCH {rhs}', lhs_params + rhs_params
+
+
+class CourseSearchEntry(models.Model):
+    """
+    Read-only view of the SQLite FTS5 table created in migration 0004, joined to
+    Course on rowid. Only used by courses.search.SQLiteFTSSearchBackend.
+    """
+    course = models.OneToOneField(
+        Course, primary_key=True, db_column='rowid', db_constraint=False,
+        on_delete=models.DO_NOTHING, related_name='search_entry',
+    )
+    title = models.TextField()
+    description = models.TextField()
+    lessons = models.TextField()
+    # FTS5 hidden columns: the table-named column matches against every
+    # column, and rank is bm25 with the weights configured in the migration
+    document = models.TextField(db_column='courses_course_fts')
+    rank = models.FloatField()
+
+    class Meta:
+        managed = False
+        db_table = 'courses_course_fts'
+
+
+CourseSearchEntry._meta.get_field('document').register_lookup(FullTextMatch)
 
 
 class Lesson(models.Model):
@@ -48,6 +182,7 @@ class Lesson(models.Model):
     order = models.IntegerField(default=0)
     duration_minutes = models.IntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['order']
@@ -57,16 +192,110 @@ class Lesson(models.Model):
         return f"{self.course.title} - {self.title}"
 
 
-class Enrollment(models.Model):
+class EnrollmentQuerySet(models.QuerySet):
+    def enroll(self, student_id, course_id):
+        """
+        Insert an enrollment unless the student already has one, as a single
+        INSERT ... ON CONFLICT DO NOTHING so concurrent requests never raise
+        IntegrityError. Return (enrollment, True) for a new row, (None, False)
+        otherwise. post_save is sent for the new row, so the counter signals
+        run as they do for save().
+        """
+        model = self.model
+        meta = model._meta
+        connection = connections[self.db]
+        qn = connection.ops.quote_name
+        enrollment = model(student_id=student_id, course_id=course_id)
+        fields = [field for field in meta.local_concrete_fields if not field.primary_key]
+        values = [field.get_db_prep_save(field.pre_save(enrollment, add=True), connection) for field in fields]
+        conflict = [meta.get_field(name).column for name in ('student', 'course')]
+        sql = (
+            f'INSERT INTO {qn(meta.db_table)} ({", ".join(qn(field.column) for field in fields)}) '
+            f'VALUES ({", ".join(["%s"] * len(fields))}) '
+            f'ON CONFLICT ({", ".join(map(qn, conflict))}) DO NOTHING RETURNING {qn(meta.pk.column)}'
+        )
+        with transaction.atomic(using=self.db):
+            with connection.cursor() as cursor:
+                cursor.execute(sql, values)
+                row = cursor.fetchone()
+            if row is None:
+                return None, False
+            enrollment.pk = row[0]
+            enrollment._state.adding = False
+            enrollment._state.db = self.db
+            post_save.send(
+                sender=model, instance=enrollment, created=True, update_fields=None, raw=False, using=self.db,
+            )
+        return enrollment, True
+
+    def with_actual_counts(self):
+        """Annotate the completed lesson count and watched seconds recomputed from Progress rows."""
+        return self.annotate(
+            actual_completed_lessons_count=count_subquery(Progress.objects.filter(completed=True), 'enrollment'),
+            actual_watched_seconds=watched_seconds_subquery(),
+        )
+
+    def sync_completion(self):
+        """
+        Set is_completed/completed_at from completed_lessons_count against the
+        course's lessons_count, touching only rows whose state changes, and
+        shift the students' completed course counts to match.
+        """
+        lessons_total = Subquery(Course.objects.filter(pk=OuterRef('course_id')).values('lessons_count'))
+        finished = self.annotate(lessons_total=lessons_total).filter(
+            lessons_total__gt=0,
+            completed_lessons_count__gte=F('lessons_total'),
+        )
+        completing = dict(
+            self.filter(is_completed=False, pk__in=finished.values('pk')).values_list('pk', 'student_id')
+        )
+        reopening = dict(
+            self.filter(is_completed=True).exclude(pk__in=finished.values('pk')).values_list('pk', 'student_id')
+        )
+        if completing:
+            Enrollment.objects.filter(pk__in=completing, is_completed=False).update(
+                is_completed=True, completed_at=timezone.now()
+            )
+        if reopening:
+            Enrollment.objects.filter(pk__in=reopening, is_completed=True).update(
+                is_completed=False, completed_at=None
+            )
+        deltas = Counter(completing.values())
+        deltas.subtract(reopening.values())
+        StudentSummary.objects.adjust('completed_count', deltas)
+        return len(completing) + len(reopening)
+
+
+class Enrollment(SignalCountersMixin, models.Model):
     student = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='enrollments')
     course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='enrollments')
     enrolled_at = models.DateTimeField(auto_now_add=True)
     completed_at = models.DateTimeField(null=True, blank=True)
     is_completed = models.BooleanField(default=False)
+    # Denormalized counter of completed Progress rows, maintained by courses.signals
+    completed_lessons_count = models.PositiveIntegerField(default=0, editable=False)
+    # Dashboard rollups maintained from Progress writes: the summed furthest
+    # positions of the course's lessons, and the lesson touched last
+    watched_seconds = models.PositiveIntegerField(default=0, editable=False)
+    last_lesson = models.ForeignKey(
+        'Lesson', on_delete=models.SET_NULL, null=True, blank=True, editable=False, related_name='+'
+    )
+    last_active_at = models.DateTimeField(default=timezone.now, editable=False)
+
+    objects = EnrollmentQuerySet.as_manager()
+    counter_fields = ('completed_lessons_count', 'watched_seconds', 'last_lesson', 'last_active_at')
 
     class Meta:
         unique_together = ['student', 'course']
         ordering = ['-enrolled_at']
+        indexes = [
+            # A student's enrollments in keyset pagination order
+            models.Index(fields=['student', '-enrolled_at', 'id'], name='enrollment_student_date_idx'),
+            # A student's most recently active enrollments, see courses.dashboard
+            models.Index(fields=['student', '-last_active_at', 'id'], name='enrollment_student_active_idx'),
+            # Enrollments since the analytics watermark, see courses.analytics
+            models.Index(fields=['enrolled_at'], name='enrollment_enrolled_at_idx'),
+        ]
 
     def __str__(self):
         return f"{self.student.username} - {self.course.title}"
@@ -78,11 +307,143 @@ class Progress(models.Model):
     completed = models.BooleanField(default=False)
     completed_at = models.DateTimeField(null=True, blank=True)
     last_position = models.IntegerField(default=0)  # For video position tracking
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         unique_together = ['enrollment', 'lesson']
         verbose_name_plural = "Progress"
+        indexes = [
+            # Completed lessons per enrollment (progress and counter repair)
+            models.Index(fields=['enrollment'], condition=models.Q(completed=True), name='progress_completed_idx'),
+            # Rows changed since the analytics watermark, and a lesson's
+            # positions in order for its median, see courses.analytics
+            models.Index(fields=['updated_at'], name='progress_updated_idx'),
+            models.Index(fields=['lesson', 'last_position'], name='progress_lesson_position_idx'),
+        ]
 
     def __str__(self):
         return f"{self.enrollment.student.username} - {self.lesson.title}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored state so the counter signals can detect a flip
+        # and how far the position moved
+        instance._stored_completed = instance.__dict__.get('completed', False)
+        instance._stored_position = instance.__dict__.get('last_position', 0)
+        return instance
+
+
+class StudentSummaryQuerySet(models.QuerySet):
+    def adjust(self, field, deltas):
+        """
+        Add {student_id: delta} to `field`. Students without a row yet get one
+        rebuilt from their enrollments, which already include the change.
+        """
+        by_delta = defaultdict(list)
+        for student_id, delta in deltas.items():
+            if delta:
+                by_delta[delta].append(student_id)
+        for delta, student_ids in by_delta.items():
+            updated = self.filter(student_id__in=student_ids).update(**{field: Greatest(F(field) + delta, 0)})
+            if updated < len(student_ids):
+                existing = set(self.filter(student_id__in=student_ids).values_list('student_id', flat=True))
+                self.rebuild(set(student_ids) - existing)
+        if by_delta:
+            invalidate_dashboards(student_id for student_ids in by_delta.values() for student_id in student_ids)
+
+    def with_actual_counts(self):
+        """Annotate the rollups recomputed from the student's enrollments."""
+        enrollments = Enrollment.objects.all()
+        return self.annotate(
+            actual_enrolled_count=count_subquery(enrollments, 'student'),
+            actual_completed_count=count_subquery(enrollments.filter(is_completed=True), 'student'),
+            actual_watched_seconds=sum_subquery(enrollments, 'student', 'watched_seconds'),
+        )
+
+    def rebuild(self, student_ids, create=True):
+        """
+        Recompute the rows of `student_ids` from their enrollments. With
+        create=False only existing rows are rewritten.
+        """
+        student_ids = list(student_ids)
+        totals = Enrollment.objects.filter(student_id__in=student_ids).order_by().values('student_id').annotate(
+            enrolled_count=Count('pk'),
+            completed_count=Count('pk', filter=models.Q(is_completed=True)),
+            total_watched_seconds=Coalesce(Sum('watched_seconds'), 0),
+        )
+        rows = {student_id: StudentSummary(student_id=student_id) for student_id in student_ids}
+        for total in totals:
+            rows[total['student_id']] = StudentSummary(
+                student_id=total['student_id'], enrolled_count=total['enrolled_count'],
+                completed_count=total['completed_count'], watched_seconds=total['total_watched_seconds'],
+            )
+        fields = ['enrolled_count', 'completed_count', 'watched_seconds']
+        if create:
+            self.bulk_create(rows.values(), update_conflicts=True, unique_fields=['student'], update_fields=fields)
+        else:
+            self.bulk_update(rows.values(), fields)
+        invalidate_dashboards(student_ids)
+
+
+class StudentSummary(models.Model):
+    """
+    Per-student dashboard rollup, maintained incrementally by courses.signals
+    and repaired by `manage.py recount_progress`.
+    """
+    student = models.OneToOneField(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, primary_key=True, related_name='learning_summary'
+    )
+    enrolled_count = models.PositiveIntegerField(default=0)
+    completed_count = models.PositiveIntegerField(default=0)
+    watched_seconds = models.PositiveIntegerField(default=0)
+
+    objects = StudentSummaryQuerySet.as_manager()
+
+    class Meta:
+        verbose_name_plural = "Student summaries"
+
+    def __str__(self):
+        return f"{self.student_id}: {self.enrolled_count} enrolled, {self.completed_count} completed"
+
+
+class CourseStats(models.Model):
+    """Per-course analytics totals, written by courses.analytics.refresh_analytics()."""
+    course = models.OneToOneField(Course, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    enrolled_count = models.PositiveIntegerField(default=0)
+    completed_count = models.PositiveIntegerField(default=0)
+    refreshed_at = models.DateTimeField()
+
+    class Meta:
+        verbose_name_plural = "Course stats"
+
+
+class CourseDailyStats(models.Model):
+    """New enrollments per course and day, written by courses.analytics.refresh_analytics()."""
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='daily_stats')
+    date = models.DateField()
+    enrollments = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name_plural = "Course daily stats"
+        constraints = [
+            models.UniqueConstraint(fields=['course', 'date'], name='course_daily_stats_unique'),
+        ]
+
+
+class LessonStats(models.Model):
+    """Per-lesson funnel step, written by courses.analytics.refresh_analytics()."""
+    lesson = models.OneToOneField(Lesson, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    started_count = models.PositiveIntegerField(default=0)
+    completed_count = models.PositiveIntegerField(default=0)
+    # Median furthest position among students who started the lesson
+    median_position = models.FloatField(null=True)
+
+    class Meta:
+        verbose_name_plural = "Lesson stats"
+
+
+class AnalyticsWatermark(models.Model):
+    """How far courses.analytics has aggregated the rows of each source."""
+    name = models.CharField(max_length=50, primary_key=True)
+    position = models.DateTimeField()
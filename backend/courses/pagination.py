@@ -0,0 +1,50 @@
+from django.conf import settings
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+MAX_PAGE_SIZE = 100
+
+
+class SizedPageNumberPagination(PageNumberPagination):
+    """The default page-number pagination with a client-selectable, capped page size."""
+    page_size_query_param = 'page_size'
+    max_page_size = MAX_PAGE_SIZE
+
+
+class SizedCursorPagination(CursorPagination):
+    """
+    Keyset pagination: no COUNT(*) and no OFFSET scan, so deep pages cost the
+    same as the first one. Subclasses set `ordering` to match a composite index.
+    """
+    page_size = settings.REST_FRAMEWORK['PAGE_SIZE']
+    page_size_query_param = 'page_size'
+    max_page_size = MAX_PAGE_SIZE
+
+
+class CourseCursorPagination(SizedCursorPagination):
+    ordering = ('-created_at', 'id')
+
+
+class EnrollmentCursorPagination(SizedCursorPagination):
+    ordering = ('-enrolled_at', 'id')
+
+
+class SelectablePaginationMixin:
+    """
+    Page-number pagination by default; clients opt into cursor pagination
+    with ?pagination=cursor (the `next`/`previous` links carry ?cursor=).
+    """
+    pagination_class = SizedPageNumberPagination
+    cursor_pagination_class = None
+
+    def uses_cursor_pagination(self):
+        params = self.request.query_params
+        return params.get('pagination') == 'cursor' or 'cursor' in params
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            if self.cursor_pagination_class and self.uses_cursor_pagination():
+                self._paginator = self.cursor_pagination_class()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
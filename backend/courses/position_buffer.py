@@ -0,0 +1,200 @@
+"""
+Write-behind buffer for video position heartbeats.
+
+Position-only updates are coalesced in the cache under one key per
+(enrollment, lesson), keeping the furthest position, instead of hitting the
+database on every tick. A key is registered in an append-only log of
+numbered slots, and its value records the slot number. flush() walks the
+log from its watermark and writes the pending positions with a single
+upsert; a key whose slot is at or below the watermark has been flushed and
+is registered again by its next heartbeat.
+
+Keys are never deleted by flush(), so a heartbeat that lands while a flush
+is running cannot be lost: the pairs written by one flush are read again by
+the next one and written once more if they changed in between. A slot
+number is reserved before its slot is written, so flush() stops at the
+first missing slot and only skips it once it has been missing for
+GAP_TIMEOUT seconds, which means its writer died.
+
+The buffer needs a cache shared by every process, with an atomic incr, such
+as Redis or Memcached; with a process-local cache it stays disabled (see
+check_cache). Completion events never go through the buffer; callers write
+them through synchronously.
+"""
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core import checks
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import close_old_connections, transaction
+
+SEQUENCE_KEY = 'progress:positions:seq'
+WATERMARK_KEY = 'progress:positions:flushed'
+FLUSH_LOCK_KEY = 'progress:positions:lock'
+# The missing slot flush() is waiting on, as (number, first seen)
+GAP_KEY = 'progress:positions:gap'
+# The {(enrollment_id, lesson_id): position} written by the last flush
+RECHECK_KEY = 'progress:positions:recheck'
+# Buffered values outlive several flush intervals but are never kept forever
+BUFFER_TIMEOUT = 24 * 60 * 60
+FLUSH_CHUNK = 1000
+# Seconds after which a reserved slot that was never written is skipped
+GAP_TIMEOUT = 60
+
+logger = logging.getLogger(__name__)
+
+_flusher = None
+_flusher_lock = threading.Lock()
+
+
+def cache_is_shared():
+    return not isinstance(caches['default'], (LocMemCache, DummyCache))
+
+
+def is_enabled():
+    return getattr(settings, 'PROGRESS_WRITE_BEHIND', False) and cache_is_shared()
+
+
+def check_cache(app_configs, **kwargs):
+    if getattr(settings, 'PROGRESS_WRITE_BEHIND', False) and not cache_is_shared():
+        return [checks.Warning(
+            'PROGRESS_WRITE_BEHIND is ignored because the default cache is not shared between processes.',
+            hint='Use a Redis or Memcached cache to buffer progress positions.',
+            obj='settings.PROGRESS_WRITE_BEHIND',
+            id='courses.W001',
+        )]
+    return []
+
+
+def position_key(enrollment_id, lesson_id):
+    return f'progress:position:{enrollment_id}:{lesson_id}'
+
+
+def slot_key(number):
+    return f'progress:positions:slot:{number}'
+
+
+def buffer_position(enrollment_id, lesson_id, last_position):
+    """
+    Buffer a position for the pair unless a further one is buffered. The
+    compare and set are not atomic, so of two heartbeats for the same pair
+    racing each other the nearer position may win; the database only ever
+    moves forward and the next heartbeat overwrites it, so at most one tick
+    is lost.
+    """
+    key = position_key(enrollment_id, lesson_id)
+    stored = cache.get_many([key, WATERMARK_KEY])
+    current = stored.get(key)
+    if current is None or current[1] <= stored.get(WATERMARK_KEY, 0):
+        # New or already flushed: register the key again, writing it before
+        # its slot so flush() never finds a slot without a position
+        cache.add(SEQUENCE_KEY, 0, timeout=None)
+        number = cache.incr(SEQUENCE_KEY)
+        position = last_position if current is None else max(last_position, current[0])
+        cache.set(key, (position, number), BUFFER_TIMEOUT)
+        cache.set(slot_key(number), (enrollment_id, lesson_id), BUFFER_TIMEOUT)
+    elif last_position > current[0]:
+        cache.set(key, (last_position, current[1]), BUFFER_TIMEOUT)
+    ensure_flusher()
+
+
+def buffered_positions(pairs):
+    """Return {(enrollment_id, lesson_id): position} for the buffered pairs."""
+    keys = {position_key(*pair): pair for pair in pairs}
+    return {keys[key]: value[0] for key, value in cache.get_many(list(keys)).items()}
+
+
+def flush():
+    """Write every buffered position to the database; returns the number of rows."""
+    if not cache.add(FLUSH_LOCK_KEY, True, 60):
+        return 0
+    try:
+        # Pairs the last flush wrote may have moved on while it ran; those
+        # registered again since are written through their new slot below
+        watermark = cache.get(WATERMARK_KEY, 0)
+        recheck = cache.get(RECHECK_KEY, {})
+        keys = {position_key(*pair): pair for pair in recheck}
+        positions = {
+            keys[key]: position for key, (position, number) in cache.get_many(list(keys)).items()
+            if position != recheck[keys[key]] and number <= watermark
+        }
+        written = write_positions(positions)
+        flushed = positions
+        cache.set(RECHECK_KEY, flushed, BUFFER_TIMEOUT)
+
+        sequence = cache.get(SEQUENCE_KEY, 0)
+        while watermark < sequence:
+            numbers = range(watermark + 1, min(watermark + FLUSH_CHUNK, sequence) + 1)
+            slots = cache.get_many([slot_key(number) for number in numbers])
+            present = []
+            for number in numbers:
+                if slot_key(number) not in slots and not gap_expired(number):
+                    break
+                present.append(number)
+            if not present:
+                break
+            positions = buffered_positions({slots[slot_key(number)] for number in present if slot_key(number) in slots})
+            written += write_positions(positions)
+            flushed.update(positions)
+            cache.set(RECHECK_KEY, flushed, BUFFER_TIMEOUT)
+            watermark = present[-1]
+            cache.set(WATERMARK_KEY, watermark, timeout=None)
+            cache.delete_many([slot_key(number) for number in present])
+            if len(present) < len(numbers):
+                break
+        return written
+    finally:
+        cache.delete(FLUSH_LOCK_KEY)
+
+
+def gap_expired(number):
+    """Whether the reserved but missing slot `number` has been missing for GAP_TIMEOUT."""
+    gap = cache.get(GAP_KEY)
+    if gap is None or gap[0] != number:
+        cache.set(GAP_KEY, (number, time.time()), BUFFER_TIMEOUT)
+        return False
+    if time.time() - gap[1] < GAP_TIMEOUT:
+        return False
+    logger.warning('Skipping progress position slot %s, which was reserved but never written', number)
+    return True
+
+
+def write_positions(positions):
+    from .progress import apply_progress_updates
+
+    if not positions:
+        return 0
+    with transaction.atomic():
+        rows = apply_progress_updates({
+            pair: {'last_position': position} for pair, position in positions.items()
+        })
+    return len(rows)
+
+
+def _flush_forever(interval):
+    while True:
+        time.sleep(interval)
+        try:
+            flush()
+        except Exception:
+            logger.exception('Flushing buffered progress positions failed')
+        finally:
+            close_old_connections()
+
+
+def ensure_flusher():
+    """Start the in-process flusher thread if PROGRESS_FLUSH_INTERVAL asks for one."""
+    global _flusher
+    interval = getattr(settings, 'PROGRESS_FLUSH_INTERVAL', None)
+    if not interval or (_flusher is not None and _flusher.is_alive()):
+        return
+    with _flusher_lock:
+        if _flusher is None or not _flusher.is_alive():
+            _flusher = threading.Thread(
+                target=_flush_forever, args=(interval,), name='progress-position-flusher', daemon=True
+            )
+            _flusher.start()
@@ -0,0 +1,80 @@
+"""
+Batched Progress writes shared by the bulk sync endpoint and the position
+write-behind flusher.
+"""
+from collections import Counter
+
+from django.utils import timezone
+from .models import Enrollment, Lesson, Progress
+from .signals import adjust_completed_lessons, record_activity
+
+
+def apply_progress_updates(updates):
+    """
+    Upsert Progress rows from {(enrollment_id, lesson_id): {'last_position': int,
+    'completed': bool}} in three reads and one bulk upsert. last_position
+    never moves backwards and a completed lesson keeps its original
+    completed_at. Updates for enrollments or lessons that no longer exist are
+    dropped. Must run inside a transaction; returns the written rows.
+    """
+    if not updates:
+        return []
+    now = timezone.now()
+    # Rows that don't exist yet can't be locked, so serialize batches on their
+    # enrollments; otherwise two batches creating the same row would both
+    # count its completion and the later upsert could move last_position back
+    enrollment_ids = set(Enrollment.objects.select_for_update().filter(
+        id__in={enrollment_id for enrollment_id, _ in updates}
+    ).order_by('id').values_list('id', flat=True))
+    lesson_ids = set(Lesson.objects.filter(
+        id__in={lesson_id for _, lesson_id in updates}
+    ).values_list('id', flat=True))
+    # Buffered positions can outlive their enrollment or lesson
+    updates = {
+        (enrollment_id, lesson_id): update for (enrollment_id, lesson_id), update in updates.items()
+        if enrollment_id in enrollment_ids and lesson_id in lesson_ids
+    }
+    if not updates:
+        return []
+    candidates = Progress.objects.select_for_update().filter(
+        enrollment_id__in={enrollment_id for enrollment_id, _ in updates},
+        lesson_id__in={lesson_id for _, lesson_id in updates},
+    )
+    existing = {
+        (progress.enrollment_id, progress.lesson_id): progress
+        for progress in candidates
+        if (progress.enrollment_id, progress.lesson_id) in updates
+    }
+
+    rows = []
+    newly_completed = Counter()
+    activity = {}
+    for (enrollment_id, lesson_id), update in updates.items():
+        current = existing.get((enrollment_id, lesson_id))
+        was_completed = current is not None and current.completed
+        completed = was_completed or update.get('completed', False)
+        if completed and not was_completed:
+            newly_completed[enrollment_id] += 1
+        stored_position = current.last_position if current else 0
+        position = max(update.get('last_position', 0), stored_position)
+        watched, _ = activity.get(enrollment_id, (0, None))
+        activity[enrollment_id] = (watched + position - stored_position, lesson_id)
+        rows.append(Progress(
+            enrollment_id=enrollment_id,
+            lesson_id=lesson_id,
+            last_position=position,
+            completed=completed,
+            completed_at=current.completed_at if was_completed else (now if completed else None),
+        ))
+    Progress.objects.bulk_create(
+        rows,
+        batch_size=500,
+        update_conflicts=True,
+        unique_fields=['enrollment', 'lesson'],
+        update_fields=['last_position', 'completed', 'completed_at', 'updated_at'],
+    )
+    # bulk_create skips the post_save counter and rollup signals
+    for enrollment_id, count in newly_completed.items():
+        adjust_completed_lessons(enrollment_id, count)
+    record_activity(activity)
+    return rows
@@ -0,0 +1,130 @@
+"""
+Full-text course search.
+
+The backend is picked from COURSE_SEARCH_BACKEND, or from the database vendor
+when unset: an FTS5 virtual table on SQLite, tsvector expressions backed by GIN
+indexes on PostgreSQL, and a plain icontains scan everywhere else. Every backend
+returns the filtered queryset ordered by relevance, best match first, and
+matches each search term as a prefix.
+"""
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Exists, OuterRef, Q
+from django.utils.module_loading import import_string
+
+TERM_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def search_terms(text):
+    return TERM_RE.findall(text or '')
+
+
+class IContainsSearchBackend:
+    """Unindexed LIKE scan over course titles and descriptions."""
+
+    def search(self, queryset, text):
+        return queryset.filter(Q(title__icontains=text) | Q(description__icontains=text))
+
+    def index_course(self, course_id):
+        pass
+
+    def remove_course(self, course_id):
+        pass
+
+    def rebuild(self):
+        pass
+
+
+class SQLiteFTSSearchBackend(IContainsSearchBackend):
+    """
+    FTS5 index with one row per course, rowid = course id. Lesson titles and
+    descriptions are folded into the `lessons` column. Ranked with bm25,
+    weighting title over description over lessons.
+    """
+    table = 'courses_course_fts'
+
+    def match_expression(self, text):
+        # Quote every term so FTS5 operators in user input are taken literally
+        return ' '.join('"%s"*' % term.replace('"', '""') for term in search_terms(text))
+
+    def search(self, queryset, text):
+        expression = self.match_expression(text)
+        if not expression:
+            return super().search(queryset, text)
+        # rank is negative, better matches are lower, so ascending order works
+        return queryset.filter(search_entry__document__match=expression).order_by(
+            'search_entry__rank', '-created_at'
+        )
+
+    def index_course(self, course_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table} WHERE rowid = %s', [course_id])
+            cursor.execute(self.populate_sql('WHERE c.id = %s'), [course_id])
+
+    def remove_course(self, course_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table} WHERE rowid = %s', [course_id])
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table}')
+            cursor.execute(self.populate_sql())
+
+    @classmethod
+    def populate_sql(cls, where=''):
+        return (
+            f'INSERT INTO {cls.table} (rowid, title, description, lessons) '
+            f"SELECT c.id, c.title, c.description, "
+            f"(SELECT group_concat(l.title || ' ' || l.description, ' ') "
+            f'FROM courses_lesson l WHERE l.course_id = c.id) '
+            f'FROM courses_course c {where}'
+        )
+
+
+class PostgresSearchBackend(IContainsSearchBackend):
+    """
+    Weighted tsvector over course and lesson text. The vectors below must stay
+    in step with the GIN expression indexes created in migration 0004.
+    """
+    config = 'english'
+
+    def search(self, queryset, text):
+        from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+        from .models import Lesson
+
+        terms = search_terms(text)
+        if not terms:
+            return super().search(queryset, text)
+        query = SearchQuery(
+            ' & '.join(f'{term}:*' for term in terms), config=self.config, search_type='raw'
+        )
+        vector = (
+            SearchVector('title', weight='A', config=self.config)
+            + SearchVector('description', weight='B', config=self.config)
+        )
+        lesson_vector = SearchVector('title', 'description', config=self.config)
+        lesson_matches = (
+            Lesson.objects.filter(course=OuterRef('pk'))
+            .annotate(search=lesson_vector)
+            .filter(search=query)
+        )
+        return (
+            queryset.annotate(search=vector, search_rank=SearchRank(vector, query))
+            .filter(Q(search=query) | Exists(lesson_matches))
+            .order_by('-search_rank', '-created_at')
+        )
+
+
+DEFAULT_BACKENDS = {
+    'sqlite': 'courses.search.SQLiteFTSSearchBackend',
+    'postgresql': 'courses.search.PostgresSearchBackend',
+}
+
+
+def get_search_backend():
+    path = getattr(settings, 'COURSE_SEARCH_BACKEND', None) or DEFAULT_BACKENDS.get(
+        connection.vendor, 'courses.search.IContainsSearchBackend'
+    )
+    return import_string(path)()
@@ -1,25 +1,38 @@
 from rest_framework import serializers
-from .models import Category, Course, Lesson, Enrollment, Progress
+from django.utils.text import slugify
+from learning_platform.fieldsets import SparseFieldsetMixin
+from . import position_buffer
+from .models import Category, Course, Lesson, Enrollment, Progress, enrollment_status
 from users.serializers import UserSerializer
 
 
-class CategorySerializer(serializers.ModelSerializer):
+def progress_percentage(completed_lessons, total_lessons):
+    if total_lessons == 0:
+        return 0
+    return int((min(completed_lessons, total_lessons) / total_lessons) * 100)
+
+
+class CategorySerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     class Meta:
         model = Category
         fields = ['id', 'name', 'description']
 
 
-class LessonSerializer(serializers.ModelSerializer):
+class LessonSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     class Meta:
         model = Lesson
         fields = ['id', 'title', 'description', 'video_url', 'content', 'order', 'duration_minutes']
 
 
-class CourseSerializer(serializers.ModelSerializer):
+class LessonOutlineSerializer(LessonSerializer):
+    """A lesson without its body, which is served by the lesson content endpoint."""
+    class Meta(LessonSerializer.Meta):
+        fields = ['id', 'title', 'description', 'video_url', 'order', 'duration_minutes']
+
+
+class CourseSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     instructor = UserSerializer(read_only=True)
     category = CategorySerializer(read_only=True)
-    lessons_count = serializers.IntegerField(source='lessons.count', read_only=True)
-    enrolled_count = serializers.IntegerField(source='enrollments.count', read_only=True)
     is_enrolled = serializers.SerializerMethodField()
 
     class Meta:
@@ -30,36 +43,52 @@ class CourseSerializer(serializers.ModelSerializer):
             'created_at', 'updated_at', 'is_published',
             'lessons_count', 'enrolled_count', 'is_enrolled'
         ]
+        read_only_fields = ['lessons_count', 'enrolled_count']
 
+    # is_enrolled is read from Course.objects.with_enrollment_status(); the
+    # fallback query only runs for unannotated instances.
     def get_is_enrolled(self, obj):
+        if hasattr(obj, 'is_enrolled'):
+            return obj.is_enrolled
         request = self.context.get('request')
         if request and request.user.is_authenticated:
-            return Enrollment.objects.filter(student=request.user, course=obj).exists()
+            return Enrollment.objects.filter(student_id=request.user.id, course=obj).exists()
         return False
 
+    def values_annotations(self, course_ref):
+        """is_enrolled for the values() fast path, see learning_platform.fastserializers."""
+        request = self.context.get('request')
+        return {'is_enrolled': enrollment_status(request.user if request else None, course_ref)}
+
 
 class CourseDetailSerializer(CourseSerializer):
-    lessons = LessonSerializer(many=True, read_only=True)
+    lessons = LessonOutlineSerializer(many=True, read_only=True)
 
     class Meta(CourseSerializer.Meta):
         fields = CourseSerializer.Meta.fields + ['lessons']
 
 
-class EnrollmentSerializer(serializers.ModelSerializer):
+class EnrollmentSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     course = CourseSerializer(read_only=True)
     student = UserSerializer(read_only=True)
     progress_percentage = serializers.SerializerMethodField()
+    sparse_field_sources = {'progress_percentage': ('completed_lessons_count', 'course__lessons_count')}
 
     class Meta:
         model = Enrollment
         fields = ['id', 'student', 'course', 'enrolled_at', 'completed_at', 'is_completed', 'progress_percentage']
 
     def get_progress_percentage(self, obj):
-        total_lessons = obj.course.lessons.count()
-        if total_lessons == 0:
-            return 0
-        completed_lessons = obj.progress.filter(completed=True).count()
-        return int((completed_lessons / total_lessons) * 100)
+        return progress_percentage(obj.completed_lessons_count, obj.course.lessons_count)
+
+
+class BufferedProgressListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        progress = list(data.all() if hasattr(data, 'all') else data)
+        self.child.context['buffered_positions'] = position_buffer.buffered_positions(
+            (item.enrollment_id, item.lesson_id) for item in progress
+        )
+        return super().to_representation(progress)
 
 
 class ProgressSerializer(serializers.ModelSerializer):
@@ -68,4 +97,69 @@ class ProgressSerializer(serializers.ModelSerializer):
     class Meta:
         model = Progress
         fields = ['id', 'lesson', 'completed', 'completed_at', 'last_position']
+        list_serializer_class = BufferedProgressListSerializer
+
+    def to_representation(self, instance):
+        # Positions still waiting in the write-behind buffer are newer than the row
+        data = super().to_representation(instance)
+        pair = (instance.enrollment_id, instance.lesson_id)
+        buffered = self.context.get('buffered_positions')
+        if buffered is None:
+            buffered = position_buffer.buffered_positions([pair])
+        if pair in buffered:
+            data['last_position'] = max(data['last_position'], buffered[pair])
+        return data
+
+
+class ProgressUpdateSerializer(serializers.Serializer):
+    lesson = serializers.IntegerField()
+    last_position = serializers.IntegerField(min_value=0, default=0)
+    completed = serializers.BooleanField(default=False)
+
+
+class BulkProgressSerializer(serializers.Serializer):
+    enrollment = serializers.IntegerField()
+    updates = ProgressUpdateSerializer(many=True, allow_empty=False, max_length=500)
+
+
+class LessonImportSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Lesson
+        fields = ['order', 'title', 'description', 'video_url', 'content', 'duration_minutes']
+
+
+class CourseImportSerializer(serializers.ModelSerializer):
+    """
+    One course of a catalog file, see courses.imports. The category and the
+    instructor are given by name and resolved by the importer; without a slug
+    the course is keyed by its slugified title.
+    """
+    # Declared explicitly: uniqueness is what the import upserts on, not an error
+    slug = serializers.SlugField(max_length=200, required=False)
+    category = serializers.CharField(max_length=100, required=False, allow_null=True, allow_blank=True)
+    instructor = serializers.CharField(max_length=150, required=False)
+    lessons = LessonImportSerializer(many=True, required=False)
+
+    class Meta:
+        model = Course
+        fields = [
+            'slug', 'title', 'description', 'category', 'instructor', 'price', 'is_free',
+            'duration_hours', 'level', 'is_published', 'lessons',
+        ]
 
+    def validate_lessons(self, lessons):
+        # Lessons without an order follow the file's order
+        for position, lesson in enumerate(lessons, start=1):
+            lesson.setdefault('order', position)
+        orders = [lesson['order'] for lesson in lessons]
+        duplicates = sorted({order for order in orders if orders.count(order) > 1})
+        if duplicates:
+            raise serializers.ValidationError(f'Duplicate lesson order: {", ".join(map(str, duplicates))}.')
+        return lessons
+
+    def validate(self, attrs):
+        if not attrs.get('slug'):
+            attrs['slug'] = slugify(attrs['title'])[:200]
+            if not attrs['slug']:
+                raise serializers.ValidationError({'slug': 'No slug can be derived from the title; give one.'})
+        return attrs
@@ -0,0 +1,141 @@
+from collections import Counter
+
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from .cache import CATALOG_VERSION, TAXONOMY_VERSION, bump_version, course_version_key, invalidate_dashboards
+from .models import Category, Course, Lesson, Enrollment, Progress, StudentSummary
+from .search import get_search_backend
+
+
+def adjust_completed_lessons(enrollment_id, delta):
+    """Shift an enrollment's completed lesson counter and re-evaluate completion."""
+    enrollments = Enrollment.objects.filter(pk=enrollment_id)
+    if delta < 0:
+        enrollments = enrollments.filter(completed_lessons_count__gte=-delta)
+    enrollments.update(completed_lessons_count=F('completed_lessons_count') + delta)
+    Enrollment.objects.filter(pk=enrollment_id).sync_completion()
+
+
+def record_activity(activity, students=None):
+    """
+    Apply {enrollment_id: (watched_delta, lesson_id)} to the dashboard
+    rollups: watched_delta shifts the enrollment's and the student's watched
+    seconds, and a lesson_id marks it as the enrollment's last active lesson.
+    `students` maps the enrollment ids to student ids when the caller has them.
+    """
+    if students is None:
+        students = dict(Enrollment.objects.filter(pk__in=activity).values_list('pk', 'student_id'))
+    watched = Counter()
+    now = timezone.now()
+    for enrollment_id, (delta, lesson_id) in activity.items():
+        if enrollment_id not in students:
+            continue
+        changes = {}
+        if delta:
+            changes['watched_seconds'] = Greatest(F('watched_seconds') + delta, 0)
+            watched[students[enrollment_id]] += delta
+        if lesson_id is not None:
+            changes.update(last_lesson_id=lesson_id, last_active_at=now)
+        if changes:
+            Enrollment.objects.filter(pk=enrollment_id).update(**changes)
+    StudentSummary.objects.adjust('watched_seconds', watched)
+    invalidate_dashboards(students.values())
+
+
+def adjust_lessons_count(course_id, delta):
+    """Shift a course's lesson counter; completion of every enrollment may change."""
+    courses = Course.objects.filter(pk=course_id)
+    if delta < 0:
+        courses = courses.filter(lessons_count__gte=-delta)
+    courses.update(lessons_count=F('lessons_count') + delta)
+    Enrollment.objects.filter(course_id=course_id).sync_completion()
+
+
+@receiver(post_save, sender=Lesson)
+def lesson_saved(sender, instance, created, **kwargs):
+    if created:
+        adjust_lessons_count(instance.course_id, 1)
+
+
+@receiver(post_delete, sender=Lesson)
+def lesson_deleted(sender, instance, **kwargs):
+    adjust_lessons_count(instance.course_id, -1)
+
+
+@receiver(post_save, sender=Enrollment)
+def enrollment_saved(sender, instance, created, **kwargs):
+    if created:
+        Course.objects.filter(pk=instance.course_id).update(enrolled_count=F('enrolled_count') + 1)
+        StudentSummary.objects.adjust('enrolled_count', {instance.student_id: 1})
+
+
+@receiver(post_delete, sender=Enrollment)
+def enrollment_deleted(sender, instance, **kwargs):
+    Course.objects.filter(pk=instance.course_id, enrolled_count__gt=0).update(
+        enrolled_count=F('enrolled_count') - 1
+    )
+    # Recount rather than subtract: the completed and watched totals go too
+    StudentSummary.objects.rebuild([instance.student_id], create=False)
+
+
+@receiver(post_save, sender=Progress)
+def progress_saved(sender, instance, created, **kwargs):
+    was_completed = False if created else getattr(instance, '_stored_completed', False)
+    if instance.completed != was_completed:
+        adjust_completed_lessons(instance.enrollment_id, 1 if instance.completed else -1)
+    stored_position = 0 if created else getattr(instance, '_stored_position', instance.last_position)
+    # Writes through the API carry the enrollment they were checked against
+    students = (
+        {instance.enrollment_id: instance.enrollment.student_id}
+        if Progress.enrollment.is_cached(instance) else None
+    )
+    record_activity(
+        {instance.enrollment_id: (instance.last_position - stored_position, instance.lesson_id)}, students,
+    )
+    instance._stored_completed = instance.completed
+    instance._stored_position = instance.last_position
+
+
+@receiver(post_delete, sender=Progress)
+def progress_deleted(sender, instance, **kwargs):
+    if getattr(instance, '_stored_completed', False):
+        adjust_completed_lessons(instance.enrollment_id, -1)
+    if getattr(instance, '_stored_position', 0):
+        record_activity({instance.enrollment_id: (-instance._stored_position, None)})
+
+
+@receiver(post_save, sender=Course)
+def course_search_saved(sender, instance, **kwargs):
+    get_search_backend().index_course(instance.pk)
+
+
+@receiver(post_delete, sender=Course)
+def course_search_deleted(sender, instance, **kwargs):
+    get_search_backend().remove_course(instance.pk)
+
+
+@receiver(post_save, sender=Lesson)
+@receiver(post_delete, sender=Lesson)
+def lesson_search_changed(sender, instance, **kwargs):
+    get_search_backend().index_course(instance.course_id)
+
+
+@receiver(post_save, sender=Course)
+@receiver(post_delete, sender=Course)
+def course_cache_changed(sender, instance, **kwargs):
+    bump_version(CATALOG_VERSION, course_version_key(instance.pk))
+
+
+@receiver(post_save, sender=Lesson)
+@receiver(post_delete, sender=Lesson)
+def lesson_cache_changed(sender, instance, **kwargs):
+    bump_version(CATALOG_VERSION, course_version_key(instance.course_id))
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def category_cache_changed(sender, instance, **kwargs):
+    bump_version(CATALOG_VERSION, TAXONOMY_VERSION)
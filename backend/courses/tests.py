@@ -0,0 +1,939 @@
+import asyncio
+import importlib
+import io
+import json
+import logging
+import re
+import threading
+import time
+import unittest
+from datetime import datetime, timedelta, timezone as dt_timezone
+from unittest import mock
+
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+from .cache import cache_stats
+from .dashboard import dashboard_enrollments
+from .exports import export_rows, parse_bound
+from . import analytics, imports, position_buffer, progress
+from .models import (
+    Category, Course, CourseDailyStats, CourseStats, Enrollment, Lesson, LessonStats, Progress, StudentSummary,
+)
+from .views import CategoryViewSet, CourseViewSet, EnrollmentViewSet, InstructorAnalyticsViewSet, ProgressViewSet
+
+User = get_user_model()
+
+
+class CatalogTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.instructor = User.objects.create_user('instructor', 'instructor@example.com', 'x', is_instructor=True)
+        cls.student = User.objects.create_user('student', 'student@example.com', 'x')
+        category = Category.objects.create(name='Programming')
+        cls.course = Course.objects.create(
+            title='Python', description='Learn Python', instructor=cls.instructor, category=category,
+            is_published=True,
+        )
+        for order in range(3):
+            Lesson.objects.create(course=cls.course, title=f'Lesson {order}', order=order, content='Body')
+
+    def setUp(self):
+        cache.clear()
+
+    def client_for(self, user=None):
+        client = APIClient()
+        if user is not None:
+            client.force_authenticate(user)
+        return client
+
+
+class CounterSignalTests(CatalogTestCase):
+    def refreshed(self, instance):
+        instance.refresh_from_db()
+        return instance
+
+    def test_enroll_and_unenroll(self):
+        enrollment = Enrollment.objects.create(student=self.student, course=self.course)
+        self.assertEqual(self.refreshed(self.course).enrolled_count, 1)
+        self.assertEqual(StudentSummary.objects.get(student=self.student).enrolled_count, 1)
+        enrollment.delete()
+        self.assertEqual(self.refreshed(self.course).enrolled_count, 0)
+        self.assertEqual(StudentSummary.objects.get(student=self.student).enrolled_count, 0)
+
+    def test_lesson_add_and_delete(self):
+        lesson = Lesson.objects.create(course=self.course, title='Lesson 3', order=3)
+        self.assertEqual(self.refreshed(self.course).lessons_count, 4)
+        lesson.delete()
+        self.assertEqual(self.refreshed(self.course).lessons_count, 3)
+
+    def test_completion_toggle(self):
+        enrollment = Enrollment.objects.create(student=self.student, course=self.course)
+        progress = [
+            Progress.objects.create(enrollment=enrollment, lesson=lesson, completed=True)
+            for lesson in self.course.lessons.all()
+        ]
+        self.refreshed(enrollment)
+        self.assertEqual(enrollment.completed_lessons_count, 3)
+        self.assertTrue(enrollment.is_completed)
+        self.assertEqual(StudentSummary.objects.get(student=self.student).completed_count, 1)
+
+        progress[0].completed = False
+        progress[0].save()
+        self.refreshed(enrollment)
+        self.assertEqual(enrollment.completed_lessons_count, 2)
+        self.assertFalse(enrollment.is_completed)
+        self.assertIsNone(enrollment.completed_at)
+        self.assertEqual(StudentSummary.objects.get(student=self.student).completed_count, 0)
+
+        # A new lesson reopens a completed course
+        progress[0].completed = True
+        progress[0].save()
+        self.assertTrue(self.refreshed(enrollment).is_completed)
+        Lesson.objects.create(course=self.course, title='Lesson 3', order=3)
+        self.assertFalse(self.refreshed(enrollment).is_completed)
+
+    def test_stale_course_save_keeps_counters(self):
+        stale = Course.objects.get(pk=self.course.pk)
+        Enrollment.objects.create(student=self.student, course=self.course)
+        Lesson.objects.create(course=self.course, title='Lesson 3', order=3)
+        stale.title = 'Renamed'
+        stale.save()
+        course = self.refreshed(self.course)
+        self.assertEqual((course.title, course.enrolled_count, course.lessons_count), ('Renamed', 1, 4))
+
+    def test_course_update_endpoint_keeps_counters(self):
+        Enrollment.objects.create(student=self.student, course=self.course)
+        response = self.client_for(self.instructor).patch(
+            f'/api/courses/{self.course.id}/', {'title': 'Renamed'}, format='json',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.refreshed(self.course).enrolled_count, 1)
+
+    def test_stale_enrollment_save_keeps_counters(self):
+        enrollment = Enrollment.objects.create(student=self.student, course=self.course)
+        stale = Enrollment.objects.get(pk=enrollment.pk)
+        lesson = self.course.lessons.first()
+        Progress.objects.create(enrollment=enrollment, lesson=lesson, completed=True, last_position=30)
+        stale.save()
+        self.refreshed(enrollment)
+        self.assertEqual(enrollment.completed_lessons_count, 1)
+        self.assertEqual(enrollment.watched_seconds, 30)
+        self.assertEqual(enrollment.last_lesson_id, lesson.id)
+
+
+class CourseDetailCacheTests(CatalogTestCase):
+    def test_enrollment_between_gets_changes_body_and_etag(self):
+        client = self.client_for()
+        url = f'/api/courses/{self.course.id}/'
+        first = client.get(url)
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first['X-Cache'], 'MISS')
+        self.assertEqual(client.get(url)['X-Cache'], 'HIT')
+
+        Enrollment.objects.create(student=self.student, course=self.course)
+
+        second = client.get(url)
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.json()['enrolled_count'], first.json()['enrolled_count'] + 1)
+        self.assertNotEqual(second['ETag'], first['ETag'])
+        self.assertEqual(client.get(url, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 200)
+        self.assertEqual(client.get(url, HTTP_IF_NONE_MATCH=second['ETag']).status_code, 304)
+
+
+class CatalogCacheTests(CatalogTestCase):
+    def assert_cache(self, url, expected):
+        response = self.client_for().get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Cache'], expected)
+        return response
+
+    def test_miss_then_hit(self):
+        self.assert_cache('/api/courses/', 'MISS')
+        self.assert_cache('/api/courses/', 'HIT')
+        self.assert_cache('/api/courses/?level=beginner', 'MISS')
+        self.assertEqual(cache_stats(), {'hits': 1, 'misses': 2, 'hit_rate': 0.3333})
+
+    def test_bypassed_for_users_and_unknown_parameters(self):
+        self.assertNotIn('X-Cache', self.client_for(self.student).get('/api/courses/'))
+        self.assertNotIn('X-Cache', self.client_for().get('/api/courses/?ordering=title'))
+
+    def test_course_save_invalidates(self):
+        detail = f'/api/courses/{self.course.id}/'
+        self.assert_cache('/api/courses/', 'MISS')
+        self.assert_cache(detail, 'MISS')
+        self.course.title = 'Advanced Python'
+        self.course.save()
+        self.assertEqual(self.assert_cache('/api/courses/', 'MISS').json()['results'][0]['title'], 'Advanced Python')
+        self.assertEqual(self.assert_cache(detail, 'MISS').json()['title'], 'Advanced Python')
+
+    def test_lesson_save_invalidates(self):
+        detail = f'/api/courses/{self.course.id}/'
+        self.assert_cache('/api/courses/', 'MISS')
+        self.assert_cache(detail, 'MISS')
+        Lesson.objects.create(course=self.course, title='Lesson 3', order=3)
+        self.assert_cache('/api/courses/', 'MISS')
+        self.assertEqual(len(self.assert_cache(detail, 'MISS').json()['lessons']), 4)
+        self.assert_cache(detail, 'HIT')
+
+    def test_other_course_keeps_detail_cached(self):
+        detail = f'/api/courses/{self.course.id}/'
+        self.assert_cache(detail, 'MISS')
+        Course.objects.create(title='Go', description='Learn Go', instructor=self.instructor, is_published=True)
+        self.assert_cache(detail, 'HIT')
+
+    def test_category_save_invalidates(self):
+        self.assert_cache('/api/categories/', 'MISS')
+        self.assert_cache('/api/courses/', 'MISS')
+        category = Category.objects.get()
+        category.name = 'Software'
+        category.save()
+        self.assertEqual(self.assert_cache('/api/categories/', 'MISS').json()['results'][0]['name'], 'Software')
+        self.assert_cache('/api/courses/', 'MISS')
+
+
+class CourseSearchTests(CatalogTestCase):
+    def search(self, text, **params):
+        response = self.client_for().get('/api/courses/', {'search': text, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def titles(self, text):
+        return [course['title'] for course in self.search(text)['results']]
+
+    def create_course(self, title, description=''):
+        return Course.objects.create(
+            title=title, description=description, instructor=self.instructor, is_published=True,
+        )
+
+    def test_terms_match_as_prefixes(self):
+        self.assertEqual(self.titles('pyth'), ['Python'])
+        self.assertEqual(self.titles('learn pyt'), ['Python'])
+        self.assertEqual(self.titles('ython'), [])
+
+    def test_query_syntax_is_taken_literally(self):
+        for text in ('"', '"python', 'NEAR(python learn)', 'python AND', 'python OR -learn', '*', '()'):
+            with self.subTest(text=text):
+                self.search(text)
+        self.assertEqual(self.titles('python AND'), [])
+        self.assertEqual(self.titles('NEAR(python learn)'), [])
+        self.assertEqual(self.titles('"python"'), ['Python'])
+
+    def test_title_matches_rank_first(self):
+        self.create_course('Data science', 'Uses Python throughout')
+        self.assertEqual(self.titles('python'), ['Python', 'Data science'])
+
+    def test_cursor_pagination_keeps_relevance_order(self):
+        self.create_course('Data science', 'Uses Python throughout')
+        body = self.search('python', pagination='cursor')
+        self.assertEqual([course['title'] for course in body['results']], ['Python', 'Data science'])
+        self.assertIn('count', body)
+        self.assertNotIn('count', self.client_for().get('/api/courses/', {'pagination': 'cursor'}).json())
+
+    def test_index_follows_course_and_lesson_changes(self):
+        course = self.create_course('Rust')
+        self.assertEqual(self.titles('rust'), ['Rust'])
+        course.title = 'Go'
+        course.save()
+        self.assertEqual(self.titles('rust'), [])
+        lesson = Lesson.objects.create(course=course, title='Goroutines', order=0)
+        self.assertEqual(self.titles('gorout'), ['Go'])
+        lesson.delete()
+        self.assertEqual(self.titles('gorout'), [])
+        Lesson.objects.create(course=course, title='Channels', order=0)
+        course.delete()
+        self.assertEqual(self.titles('go'), [])
+        self.assertEqual(self.titles('channels'), [])
+
+
+class DashboardTests(CatalogTestCase):
+    def dashboard(self):
+        response = self.client_for(self.student).get('/api/dashboard/')
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def sync(self, enrollment_id, lesson, position, completed=False):
+        return self.client_for(self.student).post('/api/progress/bulk/', {
+            'enrollment': enrollment_id,
+            'updates': [{'lesson': lesson.id, 'last_position': position, 'completed': completed}],
+        }, format='json')
+
+    def test_served_from_cache_until_rollups_change(self):
+        self.assertEqual(self.dashboard(), {
+            'summary': {'enrolled_count': 0, 'completed_count': 0, 'watched_seconds': 0}, 'enrollments': [],
+        })
+        with self.assertNumQueries(0):
+            self.dashboard()
+
+        self.assertEqual(
+            self.client_for(self.student).post(f'/api/courses/{self.course.id}/enroll/').status_code, 201,
+        )
+        data = self.dashboard()
+        self.assertEqual(data['summary']['enrolled_count'], 1)
+        [enrollment] = data['enrollments']
+        self.assertEqual((enrollment['course']['title'], enrollment['last_lesson']), ('Python', None))
+
+    def test_progress_and_completion_invalidate(self):
+        enrollment = Enrollment.objects.create(student=self.student, course=self.course)
+        lessons = list(self.course.lessons.all())
+        self.dashboard()
+        self.sync(enrollment.id, lessons[0], 40, completed=True)
+        data = self.dashboard()
+        self.assertEqual(data['summary']['watched_seconds'], 40)
+        self.assertEqual(data['enrollments'][0]['progress_percentage'], 33)
+        self.assertEqual(data['enrollments'][0]['last_lesson'], {'id': lessons[0].id, 'title': 'Lesson 0'})
+
+        self.sync(enrollment.id, lessons[1], 10, completed=True)
+        self.sync(enrollment.id, lessons[2], 10, completed=True)
+        data = self.dashboard()
+        self.assertEqual((data['summary']['completed_count'], data['enrollments'][0]['is_completed']), (1, True))
+
+        enrollment.delete()
+        self.assertEqual(self.dashboard()['enrollments'], [])
+
+    def test_other_students_keep_their_cache(self):
+        other = User.objects.create_user('other', 'other@example.com', 'x')
+        self.dashboard()
+        Enrollment.objects.create(student=other, course=self.course)
+        with self.assertNumQueries(0):
+            self.dashboard()
+
+
+class BulkProgressTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.enrollment = Enrollment.objects.create(student=self.student, course=self.course)
+        self.lessons = list(self.course.lessons.all())
+
+    def sync(self, *updates):
+        return self.client_for(self.student).post('/api/progress/bulk/', {
+            'enrollment': self.enrollment.id,
+            'updates': [
+                {'lesson': lesson.id, 'last_position': position, 'completed': completed}
+                for lesson, position, completed in updates
+            ],
+        }, format='json')
+
+    def progress(self, lesson):
+        return Progress.objects.get(enrollment=self.enrollment, lesson=lesson)
+
+    def test_position_never_moves_backwards(self):
+        self.assertEqual(self.sync((self.lessons[0], 50, False)).status_code, 200)
+        self.sync((self.lessons[0], 20, False), (self.lessons[1], 30, False), (self.lessons[1], 10, False))
+        self.assertEqual(self.progress(self.lessons[0]).last_position, 50)
+        self.assertEqual(self.progress(self.lessons[1]).last_position, 30)
+        self.enrollment.refresh_from_db()
+        self.assertEqual(self.enrollment.watched_seconds, 80)
+
+    def test_completion_is_sticky(self):
+        self.sync((self.lessons[0], 10, True))
+        completed_at = self.progress(self.lessons[0]).completed_at
+        self.assertIsNotNone(completed_at)
+        self.sync((self.lessons[0], 20, False))
+        self.sync((self.lessons[0], 30, True))
+        progress = self.progress(self.lessons[0])
+        self.assertEqual((progress.completed, progress.completed_at, progress.last_position), (True, completed_at, 30))
+
+    def test_completed_count_moves_once_per_lesson(self):
+        self.sync((self.lessons[0], 10, True), (self.lessons[0], 10, True))
+        self.sync((self.lessons[0], 10, True), (self.lessons[1], 10, True))
+        self.sync((self.lessons[1], 10, True))
+        self.enrollment.refresh_from_db()
+        self.assertEqual(self.enrollment.completed_lessons_count, 2)
+        self.assertFalse(self.enrollment.is_completed)
+        self.sync((self.lessons[2], 0, True))
+        self.enrollment.refresh_from_db()
+        self.assertEqual(self.enrollment.completed_lessons_count, 3)
+        self.assertTrue(self.enrollment.is_completed)
+
+    def test_batch_is_capped(self):
+        self.assertEqual(self.sync(*[(self.lessons[0], position, False) for position in range(500)]).status_code, 200)
+        response = self.sync(*[(self.lessons[0], position, False) for position in range(501)])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('updates', response.json())
+        self.assertEqual(self.progress(self.lessons[0]).last_position, 499)
+
+    def test_foreign_lesson_is_rejected(self):
+        other = Course.objects.create(title='Go', description='Learn Go', instructor=self.instructor)
+        lesson = Lesson.objects.create(course=other, title='Goroutines', order=0)
+        response = self.sync((self.lessons[0], 10, False), (lesson, 10, False))
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Progress.objects.exists())
+
+
+# The buffer refuses process-local caches; these tests run it on local
+# memory as if it were shared
+@mock.patch.object(position_buffer, 'cache_is_shared', lambda: True)
+@override_settings(PROGRESS_WRITE_BEHIND=True, PROGRESS_FLUSH_INTERVAL=None)
+class PositionBufferTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.enrollment = Enrollment.objects.create(student=self.student, course=self.course)
+        self.lessons = list(self.course.lessons.all())
+
+    def position(self, lesson):
+        row = Progress.objects.filter(enrollment=self.enrollment, lesson=lesson).first()
+        return row.last_position if row else None
+
+    def sync(self, *updates):
+        return self.client_for(self.student).post('/api/progress/bulk/', {
+            'enrollment': self.enrollment.id,
+            'updates': [{'lesson': lesson.id, 'last_position': position} for lesson, position in updates],
+        }, format='json')
+
+    def test_positions_are_buffered_until_flushed(self):
+        self.assertEqual(self.sync((self.lessons[0], 50), (self.lessons[1], 7)).status_code, 200)
+        self.sync((self.lessons[0], 60))
+        self.assertIsNone(self.position(self.lessons[0]))
+        progress_list = self.client_for(self.student).get(f'/api/progress/?enrollment={self.enrollment.id}')
+        self.assertEqual(progress_list.json()['results'], [])
+        self.assertEqual(position_buffer.flush(), 2)
+        self.assertEqual((self.position(self.lessons[0]), self.position(self.lessons[1])), (60, 7))
+        self.assertEqual(position_buffer.flush(), 0)
+
+    def test_watermark_advances(self):
+        self.sync((self.lessons[0], 10), (self.lessons[1], 20))
+        sequence = cache.get(position_buffer.SEQUENCE_KEY)
+        self.assertEqual(position_buffer.flush(), 2)
+        self.assertEqual(cache.get(position_buffer.WATERMARK_KEY), sequence)
+        # A flushed pair is registered again by its next heartbeat
+        self.sync((self.lessons[0], 30))
+        self.assertEqual(cache.get(position_buffer.SEQUENCE_KEY), sequence + 1)
+        self.assertEqual(position_buffer.flush(), 1)
+        self.assertEqual(cache.get(position_buffer.WATERMARK_KEY), sequence + 1)
+        self.assertEqual(self.position(self.lessons[0]), 30)
+
+    def test_deleted_enrollment_and_lesson_are_dropped(self):
+        other = Enrollment.objects.create(student=self.instructor, course=self.course)
+        position_buffer.buffer_position(other.id, self.lessons[0].id, 15)
+        position_buffer.buffer_position(self.enrollment.id, self.lessons[1].id, 25)
+        position_buffer.buffer_position(self.enrollment.id, self.lessons[2].id, 35)
+        other.delete()
+        self.lessons[1].delete()
+        self.assertEqual(position_buffer.flush(), 1)
+        self.assertEqual(self.position(self.lessons[2]), 35)
+        self.assertEqual(cache.get(position_buffer.WATERMARK_KEY), cache.get(position_buffer.SEQUENCE_KEY))
+        self.assertEqual(position_buffer.flush(), 0)
+
+    def test_reserved_slot_is_not_skipped(self):
+        real_set = cache.set
+
+        def set_after_flush(key, *args, **kwargs):
+            # A flush runs after the slot number is reserved, before the slot is written
+            if key.startswith('progress:positions:slot:'):
+                self.assertEqual(position_buffer.flush(), 0)
+            return real_set(key, *args, **kwargs)
+
+        with mock.patch.object(cache, 'set', set_after_flush):
+            position_buffer.buffer_position(self.enrollment.id, self.lessons[0].id, 42)
+        self.assertEqual(position_buffer.flush(), 1)
+        self.assertEqual(self.position(self.lessons[0]), 42)
+
+    def test_abandoned_slot_is_skipped_after_gap_timeout(self):
+        cache.add(position_buffer.SEQUENCE_KEY, 0, timeout=None)
+        cache.incr(position_buffer.SEQUENCE_KEY)
+        position_buffer.buffer_position(self.enrollment.id, self.lessons[0].id, 11)
+        self.assertEqual(position_buffer.flush(), 0)
+        later = time.time() + position_buffer.GAP_TIMEOUT + 1
+        with mock.patch('time.time', return_value=later):
+            self.assertEqual(position_buffer.flush(), 1)
+
+    def test_heartbeat_during_flush_is_written_by_the_next_flush(self):
+        position_buffer.buffer_position(self.enrollment.id, self.lessons[0].id, 10)
+        apply_progress_updates = progress.apply_progress_updates
+
+        def heartbeat_then_apply(updates):
+            position_buffer.buffer_position(self.enrollment.id, self.lessons[0].id, 20)
+            return apply_progress_updates(updates)
+
+        with mock.patch.object(progress, 'apply_progress_updates', heartbeat_then_apply):
+            self.assertEqual(position_buffer.flush(), 1)
+        self.assertEqual(self.position(self.lessons[0]), 10)
+        self.assertEqual(position_buffer.flush(), 1)
+        self.assertEqual(self.position(self.lessons[0]), 20)
+
+    def test_learner_state_reads_the_buffer_off_the_event_loop(self):
+        self.sync((self.lessons[0], 70))
+        buffered_positions = position_buffer.buffered_positions
+
+        def off_the_loop(pairs):
+            with self.assertRaises(RuntimeError):
+                asyncio.get_running_loop()
+            return buffered_positions(pairs)
+
+        with mock.patch.object(position_buffer, 'buffered_positions', off_the_loop):
+            response = self.client_for(self.student).get(f'/api/courses/{self.course.id}/learner-state/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['progress'][str(self.lessons[0].id)]['last_position'], 70)
+
+    def test_completions_are_written_through(self):
+        response = self.client_for(self.student).post('/api/progress/bulk/', {
+            'enrollment': self.enrollment.id,
+            'updates': [{'lesson': self.lessons[0].id, 'last_position': 9, 'completed': True}],
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(Progress.objects.get(enrollment=self.enrollment, lesson=self.lessons[0]).completed)
+
+
+class PositionBufferLocalCacheTests(CatalogTestCase):
+    @override_settings(PROGRESS_WRITE_BEHIND=True)
+    def test_local_cache_is_refused(self):
+        self.assertFalse(position_buffer.is_enabled())
+        self.assertEqual([message.id for message in position_buffer.check_cache(None)], ['courses.W001'])
+
+
+class EnrollmentListQueryTests(CatalogTestCase):
+    # However many enrollments are listed: the count, the page and its courses,
+    # which the values() fast path reads in one query
+    QUERIES = {False: 3, True: 2}
+
+    def enroll(self, count):
+        for number in range(count):
+            course = Course.objects.create(
+                title=f'Course {number}', description='Course', instructor=self.instructor, is_published=True,
+            )
+            Lesson.objects.create(course=course, title='Lesson', order=0)
+            Enrollment.objects.create(student=self.student, course=course)
+
+    def assert_constant_queries(self, count):
+        self.enroll(count)
+        client = self.client_for(self.student)
+        for fast in (False, True):
+            with self.subTest(fast=fast), override_settings(FAST_SERIALIZATION=fast):
+                with self.assertNumQueries(self.QUERIES[fast]):
+                    response = client.get('/api/enrollments/')
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(response.json()['results']), count)
+
+    def test_one_enrollment(self):
+        self.assert_constant_queries(1)
+
+    def test_many_enrollments(self):
+        self.assert_constant_queries(8)
+
+
+@unittest.skipUnless(connection.vendor in ('sqlite', 'postgresql'), 'Query plans are only checked on SQLite and PostgreSQL')
+class ImportCatalogTests(CatalogTestCase):
+    def record(self, slug, **fields):
+        return {'slug': slug, 'title': slug.title(), 'description': 'Catalog', 'instructor': 'instructor', **fields}
+
+    def test_upsert_on_slug(self):
+        report = imports.import_catalog([(1, self.record('rust', lessons=[{'title': 'Ownership'}]))])
+        self.assertEqual((report['created'], report['updated'], report['lessons']), (1, 0, 1))
+        report = imports.import_catalog([(1, self.record('rust', title='Rust in depth', lessons=[
+            {'order': 2, 'title': 'Lifetimes'},
+        ]))])
+        self.assertEqual((report['created'], report['updated'], report['errors']), (0, 1, []))
+        course = Course.objects.get(slug='rust')
+        self.assertEqual((course.title, course.lessons_count), ('Rust in depth', 2))
+        self.assertEqual(list(course.lessons.values_list('title', flat=True)), ['Ownership', 'Lifetimes'])
+
+    def test_duplicate_lesson_order_is_rejected(self):
+        report = imports.import_catalog([
+            (1, self.record('rust', lessons=[{'order': 1, 'title': 'A'}, {'order': 1, 'title': 'B'}])),
+            (2, self.record('go')),
+        ])
+        self.assertEqual([error['row'] for error in report['errors']], [1])
+        self.assertIn('lessons', report['errors'][0]['errors'])
+        self.assertEqual(list(Course.objects.filter(slug__in=['rust', 'go']).values_list('slug', flat=True)), ['go'])
+
+    def test_failed_chunk_is_retried_course_by_course(self):
+        write_chunk = imports.write_chunk
+
+        def failing_write_chunk(rows):
+            if any(row['slug'] == 'go' for row in rows):
+                raise DatabaseError('go cannot be written')
+            return write_chunk(rows)
+
+        with mock.patch.object(imports, 'write_chunk', failing_write_chunk):
+            records = [(row, self.record(slug)) for row, slug in enumerate(['rust', 'go', 'zig'], start=1)]
+            report = imports.import_catalog(records)
+        self.assertEqual((report['created'], [error['row'] for error in report['errors']]), (2, [2]))
+        self.assertEqual(set(Course.objects.filter(slug__isnull=False).values_list('slug', flat=True)), {'rust', 'zig'})
+
+    def test_repeated_titles_are_numbered(self):
+        rust = {'title': 'Rust', 'description': 'Catalog', 'instructor': 'instructor'}
+        report = imports.import_catalog([(1, rust), (2, rust), (3, self.record('rust-3')), (4, self.record('rust-3'))])
+        self.assertEqual([error['row'] for error in report['errors']], [4])
+        self.assertEqual(
+            list(Course.objects.filter(slug__startswith='rust').order_by('pk').values_list('slug', flat=True)),
+            ['rust', 'rust-2', 'rust-3'],
+        )
+
+    def test_slug_backfill_skips_taken_suffixes(self):
+        migration = importlib.import_module('courses.migrations.0010_course_slug')
+        suffixed = Course.objects.create(title='Placeholder', instructor=self.instructor)
+        duplicate = Course.objects.create(title='Python', instructor=self.instructor)
+        # An older course whose own title slugifies to the duplicate's id suffix
+        suffixed.title = f'Python {duplicate.pk}'
+        suffixed.save()
+        Course.objects.update(slug=None)
+        migration.backfill_slugs(apps, None)
+        self.assertEqual(
+            list(Course.objects.order_by('pk').values_list('slug', flat=True)),
+            ['python', f'python-{duplicate.pk}', f'python-{duplicate.pk}-2'],
+        )
+
+
+@override_settings(ANALYTICS_SETTLE_SECONDS=0)
+class AnalyticsRefreshTests(CatalogTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.students = [
+            User.objects.create_user(f'learner{number}', f'learner{number}@example.com', 'x') for number in range(4)
+        ]
+        cls.lessons = list(cls.course.lessons.all())
+
+    def enroll(self, student):
+        return Enrollment.objects.create(student=student, course=self.course)
+
+    def test_refresh_adds_only_new_rows(self):
+        self.enroll(self.students[0])
+        self.assertEqual(analytics.refresh_analytics(), {'enrollments': 1, 'lessons': 0, 'courses': 1})
+        self.assertEqual(analytics.refresh_analytics(), {'enrollments': 0, 'lessons': 0, 'courses': 0})
+        self.enroll(self.students[1])
+        self.assertEqual(analytics.refresh_analytics()['enrollments'], 1)
+        self.assertEqual(CourseDailyStats.objects.get(course=self.course).enrollments, 2)
+        self.assertEqual(CourseStats.objects.get(course=self.course).enrolled_count, 2)
+        # A full rebuild arrives at the same totals
+        self.assertEqual(analytics.refresh_analytics(full=True)['enrollments'], 2)
+        self.assertEqual(CourseDailyStats.objects.get(course=self.course).enrollments, 2)
+
+    @override_settings(ANALYTICS_SETTLE_SECONDS=60)
+    def test_rows_inside_the_settle_window_wait_for_the_next_run(self):
+        self.enroll(self.students[0])
+        self.assertEqual(analytics.refresh_analytics()['enrollments'], 0)
+        later = timezone.now() + timedelta(minutes=2)
+        with mock.patch('django.utils.timezone.now', return_value=later):
+            self.assertEqual(analytics.refresh_analytics()['enrollments'], 1)
+            self.assertEqual(analytics.refresh_analytics()['enrollments'], 0)
+
+    def test_median_position(self):
+        enrollments = [self.enroll(student) for student in self.students]
+        for enrollment, position in zip(enrollments, (10, 30, 20)):
+            Progress.objects.create(enrollment=enrollment, lesson=self.lessons[0], last_position=position)
+        for enrollment, position in zip(enrollments, (10, 40)):
+            Progress.objects.create(enrollment=enrollment, lesson=self.lessons[1], last_position=position, completed=True)
+        self.assertEqual(analytics.refresh_analytics()['lessons'], 2)
+        first, second = (LessonStats.objects.get(lesson=lesson) for lesson in self.lessons[:2])
+        self.assertEqual((first.started_count, first.completed_count, first.median_position), (3, 0, 20))
+        self.assertEqual((second.started_count, second.completed_count, second.median_position), (2, 2, 25))
+        self.assertFalse(LessonStats.objects.filter(lesson=self.lessons[2]).exists())
+
+        # Only the lesson with new progress is recounted, from all of its rows
+        Progress.objects.create(enrollment=enrollments[3], lesson=self.lessons[0], last_position=50)
+        self.assertEqual(analytics.refresh_analytics()['lessons'], 1)
+        first = LessonStats.objects.get(lesson=self.lessons[0])
+        self.assertEqual((first.started_count, first.median_position), (4, 25))
+
+
+class ExportTests(CatalogTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.staff = User.objects.create_user('staff', 'staff@example.com', 'x', is_staff=True)
+        cls.enrollments = []
+        for student, enrolled_at in (
+            (cls.student, '2024-03-01T00:00:00'), (cls.instructor, '2024-03-01T23:59:59'),
+            (cls.staff, '2024-03-02T00:00:00'),
+        ):
+            enrollment = Enrollment.objects.create(student=student, course=cls.course)
+            Enrollment.objects.filter(pk=enrollment.pk).update(enrolled_at=parse_bound(enrolled_at))
+            cls.enrollments.append(enrollment.pk)
+
+    def exported(self, **bounds):
+        _, rows = export_rows('enrollments', **bounds)
+        return [row[0] for row in rows]
+
+    def test_parse_bound(self):
+        self.assertEqual(parse_bound('2024-03-01'), datetime(2024, 3, 1, tzinfo=dt_timezone.utc))
+        self.assertEqual(parse_bound('2024-03-01', end=True), datetime(2024, 3, 2, tzinfo=dt_timezone.utc))
+        self.assertEqual(parse_bound('2024-03-01T10:30'), datetime(2024, 3, 1, 10, 30, tzinfo=dt_timezone.utc))
+        self.assertEqual(
+            parse_bound('2024-03-01T10:30+02:00', end=True), datetime(2024, 3, 1, 8, 30, tzinfo=dt_timezone.utc),
+        )
+        for value in ('2024-13-01', 'yesterday', ''):
+            with self.subTest(value=value), self.assertRaises(ValueError):
+                parse_bound(value)
+
+    def test_date_bounds_cover_whole_days(self):
+        first, last, next_day = self.enrollments
+        self.assertEqual(self.exported(until='2024-03-01'), [first, last])
+        self.assertEqual(self.exported(since='2024-03-02'), [next_day])
+        self.assertEqual(self.exported(since='2024-03-01', until='2024-03-01'), [first, last])
+        self.assertEqual(self.exported(since='2024-03-03'), [])
+
+    def test_datetime_bounds_are_inclusive(self):
+        first, last, next_day = self.enrollments
+        self.assertEqual(self.exported(until='2024-03-01T23:59:59'), [first, last])
+        self.assertEqual(self.exported(until='2024-03-01T23:59:58'), [first])
+        self.assertEqual(self.exported(since='2024-03-01T23:59:59'), [last, next_day])
+
+    def test_endpoint_encodings(self):
+        client = self.client_for(self.staff)
+        response = client.get('/api/exports/enrollments/', {'until': '2024-03-01'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0].split(',')[:3], ['id', 'student_id', 'student_username'])
+        self.assertEqual(len(lines), 3)
+        self.assertIn('2024-03-01T00:00:00Z', lines[1])
+        self.assertIn(',false,', lines[1])
+
+        response = client.get('/api/exports/enrollments/', {'output': 'ndjson', 'since': '2024-03-02'})
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([(row['id'], row['enrolled_at'], row['is_completed']) for row in rows], [
+            (self.enrollments[2], '2024-03-02T00:00:00Z', False),
+        ])
+
+    def test_endpoint_rejects_bad_parameters(self):
+        client = self.client_for(self.staff)
+        for params in ({'until': '2024-02-30'}, {'output': 'xml'}, {'course': 'python'}):
+            with self.subTest(params=params):
+                self.assertEqual(client.get('/api/exports/enrollments/', params).status_code, 400)
+        self.assertEqual(client.get('/api/exports/lessons/').status_code, 404)
+        self.assertEqual(self.client_for(self.student).get('/api/exports/enrollments/').status_code, 403)
+
+
+class QueryPlanTests(TestCase):
+    """The querysets behind the hot endpoints must not fall back to a full table scan."""
+    # Small lookup tables that are cheaper to scan than to index for icontains
+    ALLOWED_SCANS = {'courses_category'}
+    SQLITE_SCAN_RE = re.compile(r'\bSCAN (\w+)$')
+    POSTGRES_SCAN_RE = re.compile(r'Seq Scan on (\w+)')
+
+    @classmethod
+    def setUpTestData(cls):
+        student = User.objects.create(username='query_plan_student', email='query_plan@example.com')
+        category = Category.objects.create(name='Query plan category')
+        course = Course.objects.create(
+            title='Query plan course', description='Query plan', instructor=student,
+            category=category, is_published=True,
+        )
+        lesson = Lesson.objects.create(course=course, title='Query plan lesson', order=1)
+        cls.enrollment = Enrollment.objects.create(student=student, course=course)
+        Progress.objects.create(enrollment=cls.enrollment, lesson=lesson, completed=True)
+
+    def setUp(self):
+        if connection.vendor == 'postgresql':
+            # Tiny tables would otherwise always be seq scanned
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+
+    def full_scans(self, plan):
+        pattern = self.SQLITE_SCAN_RE if connection.vendor == 'sqlite' else self.POSTGRES_SCAN_RE
+        scans = []
+        for line in plan.splitlines():
+            match = pattern.search(line.strip())
+            if match and match.group(1) not in self.ALLOWED_SCANS:
+                scans.append(match.group(1))
+        return scans
+
+    def viewset_queryset(self, viewset_class, action, path, user=None, **kwargs):
+        request = Request(APIRequestFactory().get(path))
+        request.user = user or AnonymousUser()
+        view = viewset_class(action=action, request=request, kwargs=kwargs, format_kwarg=None)
+        return view.get_queryset()
+
+    def hot_querysets(self):
+        enrollment = self.enrollment
+        student = enrollment.student
+        course = enrollment.course
+        page = slice(0, 10)
+        yield 'course list (anonymous)', self.viewset_queryset(CourseViewSet, 'list', '/api/courses/')[page]
+        yield 'course list (student)', self.viewset_queryset(CourseViewSet, 'list', '/api/courses/', student)[page]
+        yield 'course list by level', self.viewset_queryset(
+            CourseViewSet, 'list', '/api/courses/?level=beginner')[page]
+        yield 'course list by category', self.viewset_queryset(
+            CourseViewSet, 'list', '/api/courses/?category=query')[page]
+        yield 'course search', self.viewset_queryset(CourseViewSet, 'list', '/api/courses/?search=query')[page]
+        yield 'course detail', self.viewset_queryset(
+            CourseViewSet, 'retrieve', f'/api/courses/{course.pk}/', pk=course.pk).filter(pk=course.pk)
+        yield 'course detail validators', self.viewset_queryset(
+            CourseViewSet, 'retrieve', f'/api/courses/{course.pk}/', pk=course.pk
+        ).with_lessons_modified().filter(pk=course.pk).values('updated_at', 'lessons_modified')
+        yield 'course lessons', course.lessons.all()
+        yield 'category list', self.viewset_queryset(CategoryViewSet, 'list', '/api/categories/')[page]
+        yield 'enrollment list', self.viewset_queryset(
+            EnrollmentViewSet, 'list', '/api/enrollments/', student)[page]
+        yield 'progress list', self.viewset_queryset(ProgressViewSet, 'list', '/api/progress/', student)[page]
+        yield 'progress list by enrollment', self.viewset_queryset(
+            ProgressViewSet, 'list', f'/api/progress/?enrollment={enrollment.pk}', student)[page]
+        yield 'completed progress count', Progress.objects.filter(enrollment=enrollment, completed=True)
+        yield 'dashboard summary', StudentSummary.objects.filter(student=student)
+        yield 'dashboard enrollments', dashboard_enrollments(student.pk)
+        since = timezone.now() - timedelta(minutes=5)
+        yield 'analytics new enrollments', Enrollment.objects.filter(enrolled_at__gt=since).values('course_id')
+        yield 'analytics changed progress', Progress.objects.filter(updated_at__gt=since).values('lesson_id')
+        yield 'analytics lesson positions', Progress.objects.filter(
+            lesson=course.lessons.first()).order_by('last_position').values('last_position')
+        yield 'analytics course enrollments', Enrollment.objects.filter(course=course).values('is_completed')
+        yield 'analytics course list', self.viewset_queryset(
+            InstructorAnalyticsViewSet, 'list', '/api/instructor/analytics/', course.instructor,
+        ).values(*InstructorAnalyticsViewSet.summary_fields)[page]
+        yield 'analytics daily enrollments', CourseDailyStats.objects.filter(course=course, date__gte=since.date())
+        yield 'analytics funnel', Lesson.objects.filter(course=course).values('order', 'stats__completed_count')
+        yield 'export enrollments by course', export_rows('enrollments', [course.pk])[1]
+        yield 'export progress by course', export_rows('progress', [course.pk])[1]
+
+    def test_hot_queries_use_indexes(self):
+        for name, queryset in self.hot_querysets():
+            with self.subTest(name):
+                self.assertEqual(self.full_scans(queryset.explain()), [])
+
+
+@override_settings(PROGRESS_FLUSH_INTERVAL=None)
+class SerializerParityTests(TestCase):
+    """
+    Every course, lesson, enrollment and progress read endpoint answers with
+    the same bytes whether the values() fast path is on or off, and those
+    bytes are what JSONRenderer makes of the DRF serializers' output.
+    """
+    SEED = 11
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command(
+            'seed_courses', courses=30, lessons_per_course=5, students=5, enrollments_per_student=6,
+            progress_density=0.5, seed=cls.SEED, stdout=io.StringIO(),
+        )
+        cls.enrollment = cls.create_edge_cases()
+
+    @classmethod
+    def create_edge_cases(cls):
+        """Rows exercising nulls, files, decimals and characters JSON renderers disagree on."""
+        student = User.objects.get(username=f'synthetic{cls.SEED}_student0')
+        User.objects.filter(pk=student.pk).update(avatar='avatars/student0.png', bio='Line\u2028separator')
+        instructor = User.objects.filter(is_instructor=True).first()
+        course = Course.objects.create(
+            title='Ünïcode \u2029 course "quoted"', description='<b>html</b> & emoji \U0001F600',
+            instructor=instructor, category=None, thumbnail='course_thumbnails/edge.png',
+            price='19.90', is_free=False, is_published=True, level='advanced',
+        )
+        lessons = [
+            Lesson.objects.create(course=course, title=f'Edge lesson {order}', order=order,
+                                  video_url='https://example.com/v.mp4', content='')
+            for order in (2, 1)
+        ]
+        enrollment = Enrollment.objects.create(student=student, course=course)
+        Progress.objects.create(enrollment=enrollment, lesson=lessons[0], completed=True, last_position=42)
+        Category.objects.create(name='Empty category')
+        return enrollment
+
+    def endpoints(self):
+        """Yield (name, client, url) for every read endpoint and fieldset variant."""
+        enrollment = self.enrollment
+        course = enrollment.course
+        other = Course.objects.filter(is_published=True).exclude(pk=course.pk).first()
+        anonymous = APIClient(SERVER_NAME='localhost')
+        student = APIClient(SERVER_NAME='localhost')
+        student.force_authenticate(enrollment.student)
+
+        for client_name, client in (('anonymous', anonymous), ('student', student)):
+            yield f'courses-list ({client_name})', client, '/api/courses/'
+            yield f'courses-list-cursor ({client_name})', client, '/api/courses/?pagination=cursor&page_size=7'
+            yield f'courses-list-page2 ({client_name})', client, '/api/courses/?page=2'
+            yield f'courses-detail ({client_name})', client, f'/api/courses/{course.id}/'
+            yield f'courses-detail-other ({client_name})', client, f'/api/courses/{other.id}/'
+        yield 'courses-list-search', anonymous, '/api/courses/?search=python'
+        yield 'courses-list-level', anonymous, '/api/courses/?level=advanced'
+        yield 'courses-list-fields', student, '/api/courses/?fields=id,title,instructor.username,is_enrolled,price'
+        yield 'courses-list-collapsed', anonymous, '/api/courses/?fields=id,instructor,category'
+        yield 'courses-list-expand', anonymous, '/api/courses/?fields=id,instructor,category&expand=category'
+        yield 'courses-detail-lesson-fields', anonymous, f'/api/courses/{course.id}/?fields=title,lessons.title'
+        yield 'courses-detail-lesson-ids', anonymous, f'/api/courses/{course.id}/?fields=id,lessons'
+        yield 'courses-my-enrollment', student, f'/api/courses/{course.id}/my_enrollment/'
+        yield 'courses-learner-state', student, f'/api/courses/{course.id}/learner-state/'
+        yield 'courses-learner-state (anonymous)', anonymous, f'/api/courses/{other.id}/learner-state/'
+        yield 'categories-list', anonymous, '/api/categories/'
+        yield 'categories-detail', anonymous, f'/api/categories/{other.category_id}/'
+        yield 'enrollments-list', student, '/api/enrollments/'
+        yield 'enrollments-list-cursor', student, '/api/enrollments/?pagination=cursor&page_size=3'
+        yield 'enrollments-detail', student, f'/api/enrollments/{enrollment.id}/'
+        yield 'enrollments-list-fields', student, '/api/enrollments/?fields=id,progress_percentage,course.title'
+        yield 'enrollments-list-nested', student, (
+            '/api/enrollments/?fields=id,course.instructor,course.is_enrolled&expand=course.instructor'
+        )
+        yield 'progress-list', student, '/api/progress/'
+        yield 'progress-list-enrollment', student, f'/api/progress/?enrollment={enrollment.id}'
+
+    def fetch(self, client, url, fast):
+        cache.clear()
+        with override_settings(FAST_SERIALIZATION=fast):
+            return client.get(url)
+
+    def test_fast_path_matches_serializers(self):
+        for name, client, url in self.endpoints():
+            with self.subTest(name):
+                reference = self.fetch(client, url, fast=False)
+                fast = self.fetch(client, url, fast=True)
+                self.assertEqual((reference.status_code, fast.status_code), (200, 200))
+                expected = JSONRenderer().render(reference.data)
+                self.assertEqual(reference.content, expected, 'renderer output differs from JSONRenderer')
+                self.assertEqual(fast.content, expected, 'fast path output differs from the serializer')
+
+
+class EnrollRaceTests(TransactionTestCase):
+    """
+    Concurrent enroll requests for the same student and course, like a
+    double-clicked button, create exactly one enrollment; the others get the
+    "already enrolled" response, no exception escapes and enrolled_count
+    stays exact.
+    """
+    REQUESTS = 8
+    ROUNDS = 5
+
+    def race(self, student, course):
+        """POST enroll from REQUESTS threads released at once; return (statuses, errors)."""
+        barrier = threading.Barrier(self.REQUESTS)
+        statuses, errors = [], []
+
+        def request():
+            client = APIClient(SERVER_NAME='localhost')
+            client.force_authenticate(student)
+            try:
+                barrier.wait()
+                statuses.append(client.post(f'/api/courses/{course.pk}/enroll/').status_code)
+            except Exception as exc:
+                errors.append(f'{type(exc).__name__}: {exc}')
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=request) for _ in range(self.REQUESTS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return statuses, errors
+
+    def test_concurrent_enrolls_create_one_row(self):
+        student = User.objects.create_user(username='enroll_race', email='enroll_race@example.com')
+        course = Course.objects.create(
+            title='Enroll race', description='Enroll race', instructor=student, is_published=True,
+        )
+        # The rejected requests are expected; keep Django's 4xx warnings out of the output
+        request_logger = logging.getLogger('django.request')
+        level = request_logger.level
+        request_logger.setLevel(logging.ERROR)
+        self.addCleanup(request_logger.setLevel, level)
+        for round_number in range(self.ROUNDS):
+            with self.subTest(round=round_number):
+                statuses, errors = self.race(student, course)
+                course.refresh_from_db(fields=['enrolled_count'])
+                enrollments = Enrollment.objects.filter(student=student, course=course)
+                self.assertEqual(errors, [])
+                self.assertEqual(sorted(statuses), [201] + [400] * (self.REQUESTS - 1))
+                self.assertEqual(enrollments.count(), 1)
+                self.assertEqual(course.enrolled_count, 1)
+                # Deleting through the model keeps enrolled_count in step for the next round
+                for enrollment in enrollments:
+                    enrollment.delete()
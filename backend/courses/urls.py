@@ -1,14 +1,22 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import CategoryViewSet, CourseViewSet, EnrollmentViewSet, ProgressViewSet
+from .views import (
+    CategoryViewSet, CourseImportView, CourseViewSet, DashboardView, EnrollmentViewSet, ExportView,
+    InstructorAnalyticsViewSet, ProgressViewSet, catalog_cache_stats_view
+)
 
 router = DefaultRouter()
 router.register(r'categories', CategoryViewSet, basename='category')
 router.register(r'courses', CourseViewSet, basename='course')
 router.register(r'enrollments', EnrollmentViewSet, basename='enrollment')
 router.register(r'progress', ProgressViewSet, basename='progress')
+router.register(r'instructor/analytics', InstructorAnalyticsViewSet, basename='instructor-analytics')
 
 urlpatterns = [
+    path('dashboard/', DashboardView.as_view(), name='dashboard'),
+    path('exports/<str:table>/', ExportView.as_view(), name='export'),
+    path('imports/courses/', CourseImportView.as_view(), name='course-import'),
+    path('catalog-cache/stats/', catalog_cache_stats_view, name='catalog-cache-stats'),
     path('', include(router.urls)),
 ]
 
@@ -1,28 +1,98 @@
+import io
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
 from rest_framework import viewsets, status
-from rest_framework.decorators import action
-from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.parsers import MultiPartParser
+from rest_framework.permissions import IsAuthenticated, IsAdminUser, AllowAny
 from rest_framework.response import Response
+from rest_framework.serializers import ListSerializer
+from rest_framework.views import APIView
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Prefetch
+from django.db.models.functions import Length
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
-from .models import Category, Course, Lesson, Enrollment, Progress
+from django.utils import timezone
+from learning_platform.async_views import AsyncModelViewSet, AsyncReadOnlyModelViewSet, AsyncViewMixin
+from learning_platform.conditional import ConditionalRetrieveMixin
+from learning_platform.fastserializers import ValuesSerializationMixin
+from learning_platform.fieldsets import (
+    SparseFieldsetViewMixin, ordering_fields, parse_fieldset, query_paths, select_only
+)
+from learning_platform.streaming import (
+    ROW_ENCODERS, aiter_queryset, aiter_rows, aiter_text, is_asgi, iter_rows, iter_text
+)
+from users.authentication import get_full_user
+from users.permissions import IsInstructor
+from .models import Category, Course, CourseDailyStats, Lesson, Enrollment, Progress
+from .analytics import completion_funnel
+from .exports import EXPORT_TABLES, export_chunk_size, export_rows
+from .imports import FORMATS as IMPORT_FORMATS, CatalogError, catalog_format, import_catalog, read_catalog
+from .cache import (
+    CatalogCacheMixin, TAXONOMY_VERSION, CATALOG_VERSION, cache_stats, course_version_key, dashboard_cache_key
+)
+from .dashboard import absolute_thumbnails, build_dashboard
+from .pagination import CourseCursorPagination, EnrollmentCursorPagination, SelectablePaginationMixin
+from .search import get_search_backend
+from . import position_buffer
+from .progress import apply_progress_updates
 from .serializers import (
     CategorySerializer, CourseSerializer, CourseDetailSerializer,
-    LessonSerializer, EnrollmentSerializer, ProgressSerializer
+    LessonSerializer, EnrollmentSerializer, ProgressSerializer, BulkProgressSerializer, progress_percentage
 )
 
+# enroll answers with the new row only; the course is referenced by id
+ENROLL_RESPONSE_FIELDS = parse_fieldset('id,course,enrolled_at,completed_at,is_completed')
+
 
-class CategoryViewSet(viewsets.ReadOnlyModelViewSet):
+class CategoryViewSet(CatalogCacheMixin, ValuesSerializationMixin, AsyncReadOnlyModelViewSet):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
     permission_classes = [AllowAny]
+    cache_query_params = ('page',)
+
+    def get_cache_version_keys(self):
+        return [TAXONOMY_VERSION]
 
 
-class CourseViewSet(viewsets.ModelViewSet):
+class CourseViewSet(ConditionalRetrieveMixin, CatalogCacheMixin, SparseFieldsetViewMixin, ValuesSerializationMixin,
+                    SelectablePaginationMixin, AsyncModelViewSet):
     queryset = Course.objects.filter(is_published=True)
     serializer_class = CourseSerializer
     permission_classes = [AllowAny]
+    cursor_pagination_class = CourseCursorPagination
+    cache_query_params = (
+        'category', 'level', 'search', 'page', 'page_size', 'pagination', 'cursor', 'fields', 'expand',
+    )
+    values_serialization_actions = ('list', 'retrieve', 'learner_state')
 
-    def get_serializer_class(self):
+    def get_cache_version_keys(self):
         if self.action == 'retrieve':
+            return [course_version_key(self.kwargs['pk']), TAXONOMY_VERSION]
+        return [CATALOG_VERSION]
+
+    def get_cache_key(self, request):
+        key = super().get_cache_key(request)
+        if key is None or self.action != 'retrieve' or self.validators is None:
+            return key
+        # Counters such as enrolled_count change without bumping the course
+        # version; keying by the validators keeps the body in step with the ETag
+        return ':'.join([key, self.get_etag(self.validators[0]).strip('"')])
+
+    def uses_cursor_pagination(self):
+        # Search results are ordered by relevance, which a keyset cursor over
+        # (-created_at, id) would replace; searches always page by number
+        if self.request.query_params.get('search'):
+            return False
+        return super().uses_cursor_pagination()
+
+    def get_serializer_class(self):
+        if self.action in ('retrieve', 'learner_state'):
             return CourseDetailSerializer
         return CourseSerializer
 
@@ -38,7 +108,8 @@ class CourseViewSet(viewsets.ModelViewSet):
         if self.action in ['create', 'update', 'partial_update', 'destroy']:
             permission_classes = [IsAuthenticated]
         else:
-            permission_classes = [AllowAny]
+            # AllowAny, or the permission_classes an extra action declares
+            permission_classes = self.permission_classes
         return [permission() for permission in permission_classes]
 
     def get_queryset(self):
@@ -52,34 +123,125 @@ class CourseViewSet(viewsets.ModelViewSet):
         if level:
             queryset = queryset.filter(level=level)
         if search:
-            queryset = queryset.filter(title__icontains=search) | queryset.filter(description__icontains=search)
+            queryset = get_search_backend().search(queryset, search)
 
-        return queryset.select_related('instructor', 'category').prefetch_related('lessons', 'enrollments')
+        queryset = queryset.with_enrollment_status(self.request.user).select_related('instructor', 'category')
+        if self.action in ('retrieve', 'learner_state'):
+            # The outline never includes lesson bodies, see lesson_content()
+            queryset = queryset.prefetch_related(Prefetch('lessons', queryset=Lesson.objects.defer('content')))
+        return queryset
 
-    @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated])
-    def enroll(self, request, pk=None):
-        course = self.get_object()
-        student = request.user
+    def get_validators(self):
+        """
+        Read every course, instructor and category column the detail
+        serializer uses (narrowed by ?fields=), is_enrolled, and the lessons'
+        count and latest change in one row, without loading the lessons.
+        """
+        only = query_paths(self.get_serializer())[0]
+        queryset = self.filter_queryset(self.get_queryset()).prefetch_related(None).with_lessons_modified()
+        try:
+            row = queryset.filter(**{self.lookup_field: self.kwargs[self.lookup_field]}).values(
+                *only, *queryset.query.annotations, 'updated_at', 'lessons_count',
+            ).first()
+        except (TypeError, ValueError, ValidationError):
+            return None
+        if row is None:
+            return None
+        modified = [row['updated_at'], row['lessons_modified']]
+        return sorted(row.items()), max(value for value in modified if value is not None)
 
-        enrollment, created = Enrollment.objects.get_or_create(
-            student=student,
-            course=course
+    def narrow_queryset(self, queryset, serializer):
+        queryset = super().narrow_queryset(queryset, serializer).prefetch_related(None)
+        lessons = serializer.fields.get('lessons')
+        if lessons is None:
+            return queryset
+        # Lessons returned as ids only need the columns the prefetch joins on
+        lesson_only = query_paths(lessons)[0] if isinstance(lessons, ListSerializer) else ()
+        return queryset.prefetch_related(
+            Prefetch('lessons', queryset=Lesson.objects.only('course', *lesson_only))
         )
 
+    @action(detail=True, url_path=r'lessons/(?P<lesson_id>\d+)/content')
+    async def lesson_content(self, request, pk=None, lesson_id=None):
+        """
+        A lesson's HTML body, streamed in slices. The ETag follows the lesson's
+        last change, so a client revalidating unchanged content gets a 304.
+        """
+        try:
+            lessons = Lesson.objects.filter(pk=lesson_id, course_id=pk, course__is_published=True)
+            row = await lessons.annotate(length=Length('content')).values('updated_at', 'length').afirst()
+        except (TypeError, ValueError):
+            row = None
+        if row is None:
+            raise Http404
+
+        async def render():
+            stream = aiter_text if is_asgi(request) else iter_text
+            return StreamingHttpResponse(
+                stream(lessons, 'content', row['length']), content_type='text/html; charset=utf-8'
+            )
+
+        validators = ((row['updated_at'], row['length']), row['updated_at'])
+        return await self.conditional_response(request, validators, render)
+
+    @action(detail=True, url_path='learner-state')
+    async def learner_state(self, request, pk=None):
+        """
+        Everything the lesson viewer needs in one round trip: the course with
+        its lesson outline, the caller's enrollment (null when not enrolled)
+        and their progress keyed by lesson id. At most four queries.
+        """
+        course = await self.aget_object_data()
+        enrollment, progress = None, {}
+        if request.user.is_authenticated:
+            enrollment = await Enrollment.objects.filter(student_id=request.user.id, course_id=course['id']).values(
+                'id', 'enrolled_at', 'completed_at', 'is_completed', 'completed_lessons_count',
+            ).afirst()
+        if enrollment is not None:
+            enrollment['progress_percentage'] = progress_percentage(
+                enrollment['completed_lessons_count'], course['lessons_count']
+            )
+            rows = Progress.objects.filter(enrollment_id=enrollment['id']).values(
+                'lesson_id', 'completed', 'completed_at', 'last_position',
+            )
+            async for row in rows:
+                progress[row.pop('lesson_id')] = row
+            # Positions still waiting in the write-behind buffer are newer than the rows
+            buffered = await sync_to_async(position_buffer.buffered_positions)(
+                [(enrollment['id'], lesson['id']) for lesson in course['lessons']]
+            )
+            for (_, lesson_id), position in buffered.items():
+                row = progress.setdefault(lesson_id, {'completed': False, 'completed_at': None, 'last_position': 0})
+                row['last_position'] = max(row['last_position'], position)
+        return Response({'course': course, 'enrollment': enrollment, 'progress': progress})
+
+    @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated])
+    def enroll(self, request, pk=None):
+        # Only check that the course can be enrolled in; the insert itself
+        # decides whether this request or a concurrent one enrolls
+        try:
+            published = Course.objects.filter(pk=pk, is_published=True).exists()
+        except (TypeError, ValueError):
+            published = False
+        if not published:
+            raise Http404
+
+        enrollment, created = Enrollment.objects.enroll(request.user.id, int(pk))
         if not created:
             return Response(
                 {'message': 'Already enrolled in this course'},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        serializer = EnrollmentSerializer(enrollment)
+        serializer = EnrollmentSerializer(enrollment, fields=ENROLL_RESPONSE_FIELDS)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     @action(detail=True, methods=['get'], permission_classes=[IsAuthenticated])
     def my_enrollment(self, request, pk=None):
         course = self.get_object()
         try:
-            enrollment = Enrollment.objects.get(student=request.user, course=course)
+            enrollment = Enrollment.objects.get(student_id=request.user.id, course=course)
+            enrollment.student = get_full_user(request.user)
             serializer = EnrollmentSerializer(enrollment)
             return Response(serializer.data)
         except Enrollment.DoesNotExist:
@@ -89,12 +251,38 @@ class CourseViewSet(viewsets.ModelViewSet):
             )
 
 
-class EnrollmentViewSet(viewsets.ReadOnlyModelViewSet):
+class EnrollmentViewSet(SparseFieldsetViewMixin, ValuesSerializationMixin, SelectablePaginationMixin,
+                        AsyncReadOnlyModelViewSet):
     serializer_class = EnrollmentSerializer
     permission_classes = [IsAuthenticated]
+    cursor_pagination_class = EnrollmentCursorPagination
+
+    def get_courses(self):
+        return Course.objects.with_enrollment_status(self.request.user)
 
     def get_queryset(self):
-        return Enrollment.objects.filter(student=self.request.user)
+        courses = self.get_courses().select_related('instructor', 'category')
+        return (
+            Enrollment.objects.filter(student_id=self.request.user.id)
+            .select_related('student')
+            .prefetch_related(Prefetch('course', queryset=courses))
+        )
+
+    def narrow_queryset(self, queryset, serializer):
+        # The course is prefetched, so its paths narrow the prefetch queryset instead
+        only, related = query_paths(serializer)
+        prefix = 'course__'
+        course_only = {path[len(prefix):] for path in only if path.startswith(prefix)}
+        course_related = {path[len(prefix):] for path in related if path.startswith(prefix)}
+        queryset = (
+            select_only(queryset, [path for path in related if path != 'course' and not path.startswith(prefix)])
+            .only(*(path for path in only if not path.startswith(prefix)), *ordering_fields(self.paginator))
+            .prefetch_related(None)
+        )
+        if not course_only:
+            return queryset
+        courses = select_only(self.get_courses(), course_related).only(*course_only)
+        return queryset.prefetch_related(Prefetch('course', queryset=courses))
 
 
 class ProgressViewSet(viewsets.ModelViewSet):
@@ -104,16 +292,17 @@ class ProgressViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         enrollment_id = self.request.query_params.get('enrollment', None)
         if enrollment_id:
-            enrollment = get_object_or_404(Enrollment, id=enrollment_id, student=self.request.user)
+            enrollment = get_object_or_404(Enrollment, id=enrollment_id, student_id=self.request.user.id)
             return Progress.objects.filter(enrollment=enrollment)
-        return Progress.objects.filter(enrollment__student=self.request.user)
+        return Progress.objects.filter(enrollment__student_id=self.request.user.id)
 
+    @transaction.atomic
     def create(self, request, *args, **kwargs):
         enrollment_id = request.data.get('enrollment')
         lesson_id = request.data.get('lesson')
         completed = request.data.get('completed', False)
 
-        enrollment = get_object_or_404(Enrollment, id=enrollment_id, student=request.user)
+        enrollment = get_object_or_404(Enrollment, id=enrollment_id, student_id=request.user.id)
         lesson = get_object_or_404(Lesson, id=lesson_id, course=enrollment.course)
 
         progress, created = Progress.objects.get_or_create(
@@ -123,10 +312,245 @@ class ProgressViewSet(viewsets.ModelViewSet):
 
         progress.completed = completed
         if completed:
-            from django.utils import timezone
             progress.completed_at = timezone.now()
         progress.save()
 
         serializer = self.get_serializer(progress)
         return Response(serializer.data, status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
 
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """
+        Apply many (lesson, last_position, completed) updates for one enrollment.
+        last_position never moves backwards and a completed lesson stays
+        completed with its original completed_at, so retried or out-of-order
+        batches are harmless. Position-only updates may be buffered, see
+        courses.position_buffer.
+        """
+        serializer = BulkProgressSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        enrollment = get_object_or_404(
+            Enrollment, id=serializer.validated_data['enrollment'], student_id=request.user.id
+        )
+
+        # Collapse repeated updates for the same lesson within the batch
+        updates = {}
+        for update in serializer.validated_data['updates']:
+            merged = updates.setdefault(update['lesson'], {'last_position': 0, 'completed': False})
+            merged['last_position'] = max(merged['last_position'], update['last_position'])
+            merged['completed'] = merged['completed'] or update['completed']
+
+        owned = set(
+            Lesson.objects.filter(course_id=enrollment.course_id, id__in=updates).values_list('id', flat=True)
+        )
+        foreign = sorted(set(updates) - owned)
+        if foreign:
+            return Response(
+                {'updates': [f'Lesson {lesson_id} does not belong to this course' for lesson_id in foreign]},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        # Position-only ticks go to the write-behind buffer when it is enabled;
+        # anything that completes a lesson is written through immediately
+        buffered = {}
+        if position_buffer.is_enabled():
+            buffered = {lesson_id: update for lesson_id, update in updates.items() if not update['completed']}
+            for lesson_id, update in buffered.items():
+                position_buffer.buffer_position(enrollment.id, lesson_id, update['last_position'])
+
+        rows = []
+        if len(buffered) < len(updates):
+            with transaction.atomic():
+                rows = apply_progress_updates({
+                    (enrollment.id, lesson_id): update
+                    for lesson_id, update in updates.items()
+                    if lesson_id not in buffered
+                })
+        enrollment.refresh_from_db(fields=['completed_lessons_count', 'is_completed', 'completed_at'])
+
+        progress = [
+            {
+                'lesson': row.lesson_id,
+                'last_position': row.last_position,
+                'completed': row.completed,
+                'completed_at': row.completed_at,
+            }
+            for row in rows
+        ]
+        progress += [
+            {'lesson': lesson_id, 'last_position': update['last_position'], 'buffered': True}
+            for lesson_id, update in buffered.items()
+        ]
+        return Response({
+            'enrollment': enrollment.id,
+            'completed_lessons_count': enrollment.completed_lessons_count,
+            'is_completed': enrollment.is_completed,
+            'progress': progress,
+        })
+
+
+class DashboardView(AsyncViewMixin, APIView):
+    """
+    The caller's learning totals and most recently active courses, each with
+    the lesson to continue from. Served from the per-student cache; a miss
+    costs two queries.
+    """
+    permission_classes = [IsAuthenticated]
+
+    async def get(self, request):
+        key = dashboard_cache_key(request.user.id)
+        data = await cache.aget(key)
+        if data is None:
+            data = await build_dashboard(request.user.id)
+            await cache.aset(key, data, getattr(settings, 'DASHBOARD_CACHE_TIMEOUT', 300))
+        return Response(absolute_thumbnails(data, request))
+
+
+class InstructorAnalyticsViewSet(AsyncViewMixin, viewsets.GenericViewSet):
+    """
+    Enrollment and completion analytics of the caller's courses (every course
+    for staff), read from the summary tables courses.analytics maintains.
+    Figures are as of each course's refreshed_at.
+    """
+    permission_classes = [IsInstructor]
+    summary_fields = ('id', 'title', 'is_published', 'stats__enrolled_count', 'stats__completed_count',
+                      'stats__refreshed_at')
+
+    def get_queryset(self):
+        courses = Course.objects.all()
+        if not self.request.user.is_staff:
+            courses = courses.filter(instructor_id=self.request.user.id)
+        return courses
+
+    def course_summary(self, row):
+        enrolled, completed = row['stats__enrolled_count'] or 0, row['stats__completed_count'] or 0
+        return {
+            'id': row['id'],
+            'title': row['title'],
+            'is_published': row['is_published'],
+            'enrolled_count': enrolled,
+            'completed_count': completed,
+            'completion_rate': round(completed / enrolled, 4) if enrolled else 0.0,
+            'refreshed_at': row['stats__refreshed_at'],
+        }
+
+    async def list(self, request):
+        page = await self.apaginate_queryset(self.get_queryset().values(*self.summary_fields))
+        return self.get_paginated_response([self.course_summary(row) for row in page])
+
+    async def retrieve(self, request, pk=None):
+        """
+        The course totals, new enrollments per day over the last `?days=`
+        (default ANALYTICS_DAYS, at most 365) and the completion funnel in
+        lesson order with its drop-off lesson. Three queries.
+        """
+        try:
+            row = await self.get_queryset().filter(pk=pk).values(*self.summary_fields).afirst()
+            days = min(max(int(request.query_params.get('days', settings.ANALYTICS_DAYS)), 1), 365)
+        except (TypeError, ValueError):
+            raise Http404
+        if row is None:
+            raise Http404
+        data = self.course_summary(row)
+
+        today = timezone.localdate()
+        first_day = today - timedelta(days=days - 1)
+        enrollments = {
+            stats['date']: stats['enrollments']
+            async for stats in CourseDailyStats.objects.filter(course_id=row['id'], date__gte=first_day)
+            .values('date', 'enrollments')
+        }
+        data['daily_enrollments'] = [
+            {'date': day, 'enrollments': enrollments.get(day, 0)}
+            for day in (first_day + timedelta(days=offset) for offset in range(days))
+        ]
+
+        lessons = Lesson.objects.filter(course_id=row['id']).order_by('order').values(
+            'id', 'title', 'order', 'stats__started_count', 'stats__completed_count', 'stats__median_position',
+        )
+        data['funnel'], data['drop_off_lesson'] = completion_funnel(
+            data['enrolled_count'], [lesson async for lesson in lessons]
+        )
+        return Response(data)
+
+
+class ExportView(AsyncViewMixin, APIView):
+    """
+    Stream every row of an export table (see courses.exports) as CSV or NDJSON
+    (`?output=csv|ndjson`), optionally for some courses (`?course=`, repeatable)
+    and a date range (`?since=`, `?until=`, inclusive ISO dates or datetimes).
+    Staff only.
+    """
+    permission_classes = [IsAdminUser]
+
+    def perform_content_negotiation(self, request, force=False):
+        # The body is CSV or NDJSON whatever the Accept header asks for
+        return super().perform_content_negotiation(request, force=True)
+
+    async def get(self, request, table):
+        if table not in EXPORT_TABLES:
+            raise Http404
+        output = request.query_params.get('output', 'csv')
+        if output not in ROW_ENCODERS:
+            return Response(
+                {'message': f'output must be one of: {", ".join(ROW_ENCODERS)}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        courses = request.query_params.getlist('course')
+        if not all(course.isdigit() for course in courses):
+            return Response({'message': 'course must be a course id'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            columns, rows = export_rows(
+                table, [int(course) for course in courses],
+                request.query_params.get('since'), request.query_params.get('until'),
+            )
+        except ValueError as exc:
+            return Response({'message': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        encoder = ROW_ENCODERS[output](columns)
+        chunk_size = export_chunk_size()
+        if is_asgi(request):
+            body = aiter_rows(encoder, aiter_queryset(rows, chunk_size))
+        else:
+            # WSGI reads an async iterator whole before sending it; a sync one streams
+            body = iter_rows(encoder, rows.iterator(chunk_size=chunk_size))
+        response = StreamingHttpResponse(body, content_type=f'{encoder.media_type}; charset=utf-8')
+        filename = f'{table}-{timezone.now():%Y%m%d-%H%M%S}.{encoder.extension}'
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+
+class CourseImportView(AsyncViewMixin, APIView):
+    """
+    Import a JSON or CSV catalog uploaded as `file` (see courses.imports),
+    the format taken from `?input=json|csv` or else the file extension.
+    New courses naming no instructor are the uploader's. `?dry_run=1`
+    validates and rolls back. Answers with the created and updated counts and
+    the rows that were skipped. Staff only.
+    """
+    permission_classes = [IsAdminUser]
+    parser_classes = [MultiPartParser]
+
+    def post(self, request):
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'message': 'file is required'}, status=status.HTTP_400_BAD_REQUEST)
+        format = request.query_params.get('input') or catalog_format(upload.name)
+        if format not in IMPORT_FORMATS:
+            return Response(
+                {'message': f'input must be one of: {", ".join(IMPORT_FORMATS)}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            records = read_catalog(io.TextIOWrapper(upload, encoding='utf-8-sig', newline=''), format)
+        except (CatalogError, UnicodeDecodeError) as exc:
+            return Response({'message': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        dry_run = request.query_params.get('dry_run') in ('1', 'true')
+        report = import_catalog(records, request.user.username, dry_run=dry_run)
+        return Response({**report, 'dry_run': dry_run})
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def catalog_cache_stats_view(request):
+    return Response(cache_stats())
@@ -0,0 +1,17 @@
+"""
+ASGI config for learning_platform project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+Serve it with an ASGI server, e.g. ``uvicorn learning_platform.asgi:application``.
+
+For more information on this file, see
+https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
+"""
+
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'learning_platform.settings')
+
+application = get_asgi_application()
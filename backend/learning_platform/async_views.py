@@ -0,0 +1,121 @@
+"""
+Async support for DRF views.
+
+DRF dispatches every handler synchronously. AsyncViewMixin replaces
+dispatch() with a coroutine so handlers written as `async def` run on the
+event loop when the project is served through learning_platform.asgi, while
+sync handlers (writes, custom actions) still work and run in a thread. Under
+WSGI the same views keep working; Django runs them in a one-off event loop.
+
+Async handlers must not touch the database outside the async ORM, so before
+an async handler runs the request is authenticated through the
+authenticators' aauthenticate() coroutine where they have one (the JWT
+authentication from users.authentication does), and in a thread otherwise.
+Permission classes of an async view have to be database-free.
+"""
+import asyncio
+
+from asgiref.sync import markcoroutinefunction, sync_to_async
+from django.core.exceptions import ValidationError
+from django.http import Http404
+from rest_framework import exceptions, mixins, viewsets
+from rest_framework.response import Response
+
+
+class AsyncViewMixin:
+    @classmethod
+    def as_view(cls, *args, **initkwargs):
+        # DRF wraps the view in csrf_exempt, which hides that it returns a coroutine
+        return markcoroutinefunction(super().as_view(*args, **initkwargs))
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+
+            if asyncio.iscoroutinefunction(handler):
+                await self.aperform_authentication(request)
+                self.initial(request, *args, **kwargs)
+                response = await handler(request, *args, **kwargs)
+            else:
+                response = await sync_to_async(self.handle_sync)(handler, request, *args, **kwargs)
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+    async def aperform_authentication(self, request):
+        """Request._authenticate() without blocking the event loop; initial() then reuses the user."""
+        for authenticator in request.authenticators:
+            aauthenticate = getattr(authenticator, 'aauthenticate', None) or sync_to_async(authenticator.authenticate)
+            try:
+                user_auth_tuple = await aauthenticate(request)
+            except exceptions.APIException:
+                request._not_authenticated()
+                raise
+            if user_auth_tuple is not None:
+                request._authenticator = authenticator
+                request.user, request.auth = user_auth_tuple
+                return
+        request._not_authenticated()
+
+    def handle_sync(self, handler, request, *args, **kwargs):
+        self.initial(request, *args, **kwargs)
+        return handler(request, *args, **kwargs)
+
+    async def aget_object(self, queryset=None):
+        """get_object() through the async ORM, optionally on an already filtered queryset."""
+        if queryset is None:
+            queryset = self.filter_queryset(self.get_queryset())
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            obj = await queryset.aget(**{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        except (queryset.model.DoesNotExist, TypeError, ValueError, ValidationError):
+            raise Http404
+        self.check_object_permissions(self.request, obj)
+        return obj
+
+    async def apaginate_queryset(self, queryset):
+        # The paginators count and slice synchronously; run them in the ORM's thread
+        return await sync_to_async(self.paginate_queryset)(queryset)
+
+
+class AsyncListModelMixin:
+    async def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+
+        page = await self.apaginate_queryset(queryset)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+
+        # Async iteration does not run prefetch_related lookups on Django 4.2
+        serializer = self.get_serializer(await sync_to_async(list)(queryset), many=True)
+        return Response(serializer.data)
+
+
+class AsyncRetrieveModelMixin:
+    async def retrieve(self, request, *args, **kwargs):
+        instance = await self.aget_object()
+        serializer = self.get_serializer(instance)
+        return Response(serializer.data)
+
+
+class AsyncReadOnlyModelViewSet(AsyncViewMixin, AsyncRetrieveModelMixin, AsyncListModelMixin,
+                                viewsets.GenericViewSet):
+    pass
+
+
+class AsyncModelViewSet(AsyncViewMixin, AsyncRetrieveModelMixin, AsyncListModelMixin,
+                        mixins.CreateModelMixin, mixins.UpdateModelMixin, mixins.DestroyModelMixin,
+                        viewsets.GenericViewSet):
+    """ModelViewSet with async list/retrieve; writes stay synchronous."""
@@ -0,0 +1,66 @@
+"""
+Conditional GET for async DRF retrieve handlers.
+
+ConditionalRetrieveMixin asks the view for cheap validators before running
+retrieve(): a version that changes whenever the response body would, and
+the time of the last modification. A GET or HEAD whose If-None-Match (or,
+without it, If-Modified-Since) still matches gets a 304 before the object
+is loaded or serialized. Every other 200 carries a strong ETag, derived
+from the version and the negotiated media type, and Last-Modified. Other
+async handlers call conditional_response() with their own validators.
+
+The ETag is authoritative: validators may change without the modification
+time moving (counters, per-user fields), and If-None-Match takes precedence
+over If-Modified-Since when a client sends both. retrieve() keeps the
+validators on the view as `validators`, so a view that caches the body can
+key the cache by them and never serve a body older than its ETag.
+"""
+import hashlib
+
+from asgiref.sync import sync_to_async
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+
+class ConditionalRetrieveMixin:
+    def get_validators(self):
+        """Return (version, last_modified) for the requested object, or None to skip."""
+        raise NotImplementedError
+
+    def get_etag(self, version):
+        digest = hashlib.md5(repr((version, self.request.accepted_media_type)).encode()).hexdigest()
+        return quote_etag(digest)
+
+    async def conditional_response(self, request, validators, render):
+        """Return a 304 if `validators` match the request, else await render() and tag it."""
+        if validators is None:
+            return await render()
+        version, last_modified = validators
+        etag = self.get_etag(version)
+        timestamp = int(last_modified.timestamp()) if last_modified else None
+
+        response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+        if response is None:
+            response = await render()
+            if response.status_code != 200:
+                return response
+        response['ETag'] = etag
+        if timestamp is not None:
+            response['Last-Modified'] = http_date(timestamp)
+        # Responses may differ per user, so shared caches must not reuse them
+        # across credentials and every reuse is revalidated
+        patch_vary_headers(response, ['Accept', 'Authorization'])
+        if request.user.is_authenticated:
+            patch_cache_control(response, private=True, no_cache=True)
+        else:
+            patch_cache_control(response, no_cache=True)
+        return response
+
+    validators = None
+
+    async def retrieve(self, request, *args, **kwargs):
+        self.validators = await sync_to_async(self.get_validators)()
+        return await self.conditional_response(
+            request, self.validators,
+            lambda: super(ConditionalRetrieveMixin, self).retrieve(request, *args, **kwargs),
+        )
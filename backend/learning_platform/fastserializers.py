@@ -0,0 +1,242 @@
+"""
+values() fast path for read-only serializers.
+
+compile_values_plan() turns a ModelSerializer instance (after any sparse
+fieldset has been applied) into a ValuesPlan: the list of values() paths the
+serializer reads and one getter per output field. Rows are then fetched as
+plain dicts and turned into the response directly, with no model instances
+and no per-field get_attribute() walk. Reverse relations at the top level
+(a course's lessons) are loaded with one extra values() query each.
+
+Every value still goes through the same field's to_representation() unless
+the field is a plain string, integer or boolean, so the output is the same as
+the serializer's. Method fields are called with a lightweight row object
+carrying the columns listed in the serializer's `sparse_field_sources`, or
+an annotation from `values_annotations()`. Anything the plan can't reproduce
+exactly, such as an overridden to_representation() or a dotted source,
+raises NotCompilable and the view falls back to the serializer.
+courses.tests.SerializerParityTests compares both paths byte for byte.
+"""
+from collections import defaultdict
+from types import SimpleNamespace
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import FileField, ForeignKey, ManyToOneRel, OneToOneField
+from rest_framework import serializers
+from rest_framework.response import Response
+from .fieldsets import ordering_fields
+
+# Fields whose to_representation() returns a value of these types unchanged
+PASSTHROUGH_FIELDS = {
+    serializers.CharField, serializers.EmailField, serializers.URLField,
+    serializers.IntegerField, serializers.BooleanField, serializers.PrimaryKeyRelatedField,
+}
+
+
+class NotCompilable(Exception):
+    """The serializer does something the values() fast path can't reproduce exactly."""
+
+
+def _row_object(row, prefix, paths):
+    """Build nested attribute access over `paths` of a values() row for method fields."""
+    obj = SimpleNamespace()
+    for path in paths:
+        node = obj
+        *parents, leaf = path.split('__')
+        for parent in parents:
+            if not hasattr(node, parent):
+                setattr(node, parent, SimpleNamespace())
+            node = getattr(node, parent)
+        setattr(node, leaf, row[prefix + path])
+    return obj
+
+
+def _converter(field, model_field):
+    if type(field) in PASSTHROUGH_FIELDS:
+        return None
+    if isinstance(model_field, FileField):
+        return lambda name: field.to_representation(model_field.attr_class(None, model_field, name))
+    return field.to_representation
+
+
+class ValuesPlan:
+    def __init__(self, serializer, queryset_annotations=(), prefix='', nested=False):
+        if isinstance(serializer, serializers.ListSerializer):
+            serializer = serializer.child
+        if type(serializer).to_representation is not serializers.Serializer.to_representation:
+            raise NotCompilable(f'{type(serializer).__name__} overrides to_representation()')
+        model = serializer.Meta.model
+        self.model = model
+        self.prefix = prefix
+        self.pk_path = prefix + model._meta.pk.name
+        self.paths = {self.pk_path: None}
+        self.annotations = {}
+        self.getters = []
+        self.many = []
+
+        sources = getattr(serializer, 'sparse_field_sources', {})
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            if isinstance(field, serializers.SerializerMethodField):
+                self.add_method_field(serializer, name, field, sources, queryset_annotations)
+                continue
+            if len(field.source_attrs) != 1:
+                raise NotCompilable(f'{name} has a dotted source')
+            try:
+                model_field = model._meta.get_field(field.source)
+            except FieldDoesNotExist:
+                raise NotCompilable(f'{name} is not a model field')
+
+            if isinstance(model_field, ManyToOneRel):
+                if nested:
+                    raise NotCompilable(f'{name} is a reverse relation below the top level')
+                self.add_many_field(name, field, model_field)
+            elif isinstance(field, serializers.BaseSerializer):
+                if not isinstance(model_field, (ForeignKey, OneToOneField)):
+                    raise NotCompilable(f'{name} is not a forward relation')
+                child = ValuesPlan(field, prefix=f'{prefix}{field.source}__', nested=True)
+                self.paths.update(child.paths)
+                self.annotations.update(child.annotations)
+                self.getters.append((name, self.nested_getter(child)))
+            elif isinstance(field, serializers.PrimaryKeyRelatedField) or not model_field.is_relation:
+                self.add_column(name, prefix + field.source, _converter(field, model_field))
+            else:
+                raise NotCompilable(f'{name} uses {type(field).__name__}')
+
+    def add_column(self, name, path, convert):
+        self.paths[path] = None
+        if convert is None:
+            self.getters.append((name, lambda row, related: row[path]))
+        else:
+            self.getters.append((
+                name, lambda row, related: None if row[path] is None else convert(row[path])
+            ))
+
+    def add_method_field(self, serializer, name, field, sources, queryset_annotations):
+        method = getattr(serializer, field.method_name)
+        prefix = self.prefix
+        if name in sources:
+            paths = sources[name]
+            self.paths.update((prefix + path, None) for path in paths)
+        elif not prefix and name in queryset_annotations:
+            paths = (name,)
+            self.paths[name] = None
+        else:
+            # The serializer's own expression, correlated to this level's pk and
+            # annotated under a prefixed alias so nested levels can't collide
+            annotations = {}
+            if hasattr(serializer, 'values_annotations'):
+                annotations = serializer.values_annotations(prefix[:-2] if prefix else 'pk')
+            if name not in annotations:
+                raise NotCompilable(f'{name} does not declare the columns it reads')
+            alias = prefix.replace('__', '_') + name
+            self.annotations[alias] = annotations[name]
+            self.paths[alias] = None
+            self.getters.append((
+                name, lambda row, related: method(SimpleNamespace(**{name: row[alias]}))
+            ))
+            return
+        self.getters.append((name, lambda row, related: method(_row_object(row, prefix, paths))))
+
+    def add_many_field(self, name, field, relation):
+        foreign_key = relation.field
+        child = None
+        if isinstance(field, serializers.ListSerializer):
+            child = ValuesPlan(field, nested=True)
+        elif not isinstance(field, serializers.ManyRelatedField) or not isinstance(
+                field.child_relation, serializers.PrimaryKeyRelatedField):
+            raise NotCompilable(f'{name} uses {type(field).__name__}')
+        self.many.append((name, foreign_key, child))
+        pk_path = self.pk_path
+        self.getters.append((name, lambda row, related: related[name].get(row[pk_path], [])))
+
+    def nested_getter(self, child):
+        def getter(row, related):
+            if row[child.pk_path] is None:
+                return None
+            return child.build(row, related)
+        return getter
+
+    def build(self, row, related):
+        return {name: getter(row, related) for name, getter in self.getters}
+
+    def values_queryset(self, queryset, *extra_paths):
+        return (
+            queryset.prefetch_related(None)
+            .annotate(**self.annotations)
+            .values(*dict.fromkeys([*self.paths, *extra_paths]))
+        )
+
+    def load_related(self, rows):
+        related = {}
+        ids = [row[self.pk_path] for row in rows]
+        for name, foreign_key, child in self.many:
+            model = foreign_key.model
+            paths = child.paths if child else {model._meta.pk.name: None}
+            grouped = defaultdict(list)
+            if ids:
+                items = model._default_manager.filter(**{f'{foreign_key.name}__in': ids}).annotate(
+                    **(child.annotations if child else {})
+                ).values(*dict.fromkeys([foreign_key.attname, *paths]))
+                for item in items:
+                    value = child.build(item, {}) if child else item[model._meta.pk.name]
+                    grouped[item[foreign_key.attname]].append(value)
+            related[name] = grouped
+        return related
+
+    def serialize(self, rows):
+        rows = list(rows)
+        related = self.load_related(rows)
+        return [self.build(row, related) for row in rows]
+
+
+def compile_values_plan(serializer, queryset=None):
+    annotations = queryset.query.annotations if queryset is not None else ()
+    return ValuesPlan(serializer, annotations)
+
+
+class ValuesSerializationMixin:
+    """
+    Serve list and retrieve through compile_values_plan() when
+    FAST_SERIALIZATION is on and the serializer compiles; otherwise fall back
+    to the serializer. Use before the async list/retrieve mixins.
+    """
+    values_serialization_actions = ('list', 'retrieve')
+
+    def get_values_plan(self, queryset):
+        if not getattr(settings, 'FAST_SERIALIZATION', False):
+            return None
+        if self.action not in self.values_serialization_actions:
+            return None
+        try:
+            return compile_values_plan(self.get_serializer(), queryset)
+        except NotCompilable:
+            return None
+
+    async def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        plan = self.get_values_plan(queryset)
+        if plan is None:
+            return await super().list(request, *args, **kwargs)
+
+        rows = plan.values_queryset(queryset, *ordering_fields(self.paginator))
+        page = await self.apaginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(await sync_to_async(plan.serialize)(page))
+        return Response(await sync_to_async(plan.serialize)(rows))
+
+    async def aget_object_data(self):
+        """The serialized object retrieve() returns, for handlers that embed it."""
+        queryset = self.filter_queryset(self.get_queryset())
+        plan = self.get_values_plan(queryset)
+        if plan is None:
+            instance = await self.aget_object(queryset)
+            return await sync_to_async(lambda: self.get_serializer(instance).data)()
+        row = await self.aget_object(plan.values_queryset(queryset))
+        return (await sync_to_async(plan.serialize)([row]))[0]
+
+    async def retrieve(self, request, *args, **kwargs):
+        return Response(await self.aget_object_data())
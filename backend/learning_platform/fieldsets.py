@@ -0,0 +1,136 @@
+"""
+Sparse fieldsets: ?fields= and ?expand= on read endpoints.
+
+`fields` is a comma separated list of the fields to return, with dotted
+names selecting fields of nested objects (`id,title,instructor.username`).
+A relation named without subfields is returned as its primary key unless it
+is also listed in `expand`, which returns the whole nested object. Without
+`fields` every field is returned as before and `expand` has no effect.
+
+The view narrows its queryset with only() and select_related() to the
+columns the selected fields read, so unused columns are never fetched.
+Serializer method fields declare the columns they read in
+`sparse_field_sources`.
+"""
+from rest_framework import serializers
+
+
+def parse_fieldset(value):
+    """Parse 'a,b.c,b.d' into {'a': {}, 'b': {'c': {}, 'd': {}}}."""
+    tree = {}
+    for path in (value or '').split(','):
+        node = tree
+        for name in path.strip().split('.'):
+            if not name:
+                break
+            node = node.setdefault(name, {})
+    return tree
+
+
+class SparseFieldsetMixin:
+    """ModelSerializer mixin accepting `fields` and `expand` trees from parse_fieldset()."""
+    sparse_field_sources = {}
+
+    def __init__(self, *args, fields=None, expand=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            self.apply_fieldset(fields, expand or {})
+
+    def apply_fieldset(self, fields, expand):
+        for name, field in list(self.fields.items()):
+            if name not in fields:
+                del self.fields[name]
+                continue
+            many = isinstance(field, serializers.ListSerializer)
+            nested = field.child if many else field
+            if not isinstance(nested, serializers.BaseSerializer):
+                continue
+
+            source = {} if field.source == name else {'source': field.source}
+            if fields[name] and isinstance(nested, SparseFieldsetMixin):
+                self.fields[name] = type(nested)(
+                    fields=fields[name], expand=expand.get(name), many=many, read_only=True, **source
+                )
+            elif fields[name] or name in expand:
+                self.fields[name] = type(nested)(many=many, read_only=True, **source)
+            else:
+                self.fields[name] = serializers.PrimaryKeyRelatedField(many=many, read_only=True, **source)
+
+
+def query_paths(serializer):
+    """
+    Return (only, select_related) ORM paths covering the columns `serializer`
+    reads. Nested serializers for forward relations are followed; reverse
+    relations are left to the view's prefetches.
+    """
+    if isinstance(serializer, serializers.ListSerializer):
+        serializer = serializer.child
+    model = serializer.Meta.model
+    forward = {field.name for field in model._meta.concrete_fields}
+    sources = getattr(serializer, 'sparse_field_sources', {})
+    only, related = {model._meta.pk.name}, set()
+
+    for name, field in serializer.fields.items():
+        if field.write_only:
+            continue
+        if name in sources:
+            only.update(sources[name])
+        elif field.source not in forward:
+            continue
+        elif isinstance(field, serializers.BaseSerializer):
+            nested_only, nested_related = query_paths(field)
+            only.add(field.source)
+            only.update(f'{field.source}__{path}' for path in nested_only)
+            related.add(field.source)
+            related.update(f'{field.source}__{path}' for path in nested_related)
+        else:
+            only.add(field.source)
+    return only, related
+
+
+def ordering_fields(paginator):
+    """Fields cursor pagination reads from the last row of a page."""
+    ordering = getattr(paginator, 'ordering', None) or ()
+    if isinstance(ordering, str):
+        ordering = (ordering,)
+    return [name.lstrip('-') for name in ordering]
+
+
+def select_only(queryset, related):
+    """Replace the queryset's select_related() with exactly `related`."""
+    queryset = queryset.select_related(None)
+    # select_related() without arguments would follow every foreign key
+    return queryset.select_related(*related) if related else queryset
+
+
+class SparseFieldsetViewMixin:
+    """
+    Pass ?fields= / ?expand= to the serializer on list and retrieve and
+    narrow the queryset to match. Views with prefetches override
+    narrow_queryset().
+    """
+    sparse_fieldset_actions = ('list', 'retrieve')
+
+    def get_fieldset(self):
+        """Return (fields, expand) trees; fields is None when all fields are wanted."""
+        params = self.request.query_params
+        if self.action not in self.sparse_fieldset_actions or not params.get('fields', '').strip():
+            return None, {}
+        return parse_fieldset(params['fields']), parse_fieldset(params.get('expand'))
+
+    def get_serializer(self, *args, **kwargs):
+        fields, expand = self.get_fieldset()
+        if fields is not None:
+            kwargs.setdefault('fields', fields)
+            kwargs.setdefault('expand', expand)
+        return super().get_serializer(*args, **kwargs)
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.get_fieldset()[0] is None:
+            return queryset
+        return self.narrow_queryset(queryset, self.get_serializer())
+
+    def narrow_queryset(self, queryset, serializer):
+        only, related = query_paths(serializer)
+        return select_only(queryset, related).only(*only, *ordering_fields(self.paginator))
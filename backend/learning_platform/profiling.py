@@ -0,0 +1,244 @@
+"""
+Opt-in per-request profiling.
+
+When REQUEST_PROFILING is on, every response carries a Server-Timing header
+breaking the request down into SQL, DRF authentication and serialization
+time, and a sample of requests (REQUEST_PROFILING_LOG_SAMPLE_RATE) is logged
+as one structured record including duplicated queries, the usual sign of an
+N+1. When it is off the middleware removes itself at startup and the DRF
+hooks are never installed, so there is no per-request cost.
+
+The middleware runs natively under both WSGI and ASGI, and queries are
+recorded on whichever thread runs them, including sync_to_async workers.
+A streamed response has sent its headers before its body is produced, so
+its Server-Timing covers the view only; the logged record is written once
+the stream is consumed and covers the queries made while streaming too.
+"""
+import json
+import logging
+import random
+import re
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+logger = logging.getLogger(__name__)
+
+_current = ContextVar('request_profile', default=None)
+_hooks_installed = False
+_query_hook_installed = False
+
+IN_LIST_RE = re.compile(r'\((?:%s, )+%s\)')
+LITERAL_RE = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+
+
+def normalize_sql(sql):
+    """Collapse literals and IN lists so repeats of the same query compare equal."""
+    return LITERAL_RE.sub('?', IN_LIST_RE.sub('(%s...)', sql))
+
+
+class RequestProfile:
+    def __init__(self):
+        self.queries = Counter()
+        self.query_count = 0
+        self.sql_time = 0.0
+        self.auth_time = 0.0
+        self.serializer_time = 0.0
+        self.depth = Counter()
+
+    def record_query(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_time += time.perf_counter() - start
+            self.query_count += 1
+            self.queries[normalize_sql(sql)] += 1
+
+    def duplicates(self):
+        return {sql: count for sql, count in self.queries.most_common() if count > 1}
+
+    def server_timing(self, total):
+        return ', '.join([
+            f'db;dur={self.sql_time * 1000:.1f};desc="{self.query_count} queries, '
+            f'{sum(self.duplicates().values())} duplicated"',
+            f'auth;dur={self.auth_time * 1000:.1f}',
+            f'serialize;dur={self.serializer_time * 1000:.1f}',
+            f'total;dur={total * 1000:.1f}',
+        ])
+
+
+def _timed(attribute, function):
+    """Wrap `function` so its outermost call adds its duration to the current profile."""
+    def wrapper(*args, **kwargs):
+        profile = _current.get()
+        if profile is None or profile.depth[attribute]:
+            return function(*args, **kwargs)
+        profile.depth[attribute] += 1
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            profile.depth[attribute] -= 1
+            setattr(profile, attribute, getattr(profile, attribute) + time.perf_counter() - start)
+    return wrapper
+
+
+def _atimed(attribute, function):
+    """_timed() for coroutine functions."""
+    async def wrapper(*args, **kwargs):
+        profile = _current.get()
+        if profile is None or profile.depth[attribute]:
+            return await function(*args, **kwargs)
+        profile.depth[attribute] += 1
+        start = time.perf_counter()
+        try:
+            return await function(*args, **kwargs)
+        finally:
+            profile.depth[attribute] -= 1
+            setattr(profile, attribute, getattr(profile, attribute) + time.perf_counter() - start)
+    return wrapper
+
+
+def install_drf_hooks():
+    """Time DRF authentication, serializer .data access and values plans for profiled requests."""
+    global _hooks_installed
+    if _hooks_installed:
+        return
+    from rest_framework import serializers
+    from rest_framework.request import Request
+    from .async_views import AsyncViewMixin
+    from .fastserializers import ValuesPlan
+
+    Request._authenticate = _timed('auth_time', Request._authenticate)
+    AsyncViewMixin.aperform_authentication = _atimed('auth_time', AsyncViewMixin.aperform_authentication)
+    for serializer_class in (serializers.Serializer, serializers.ListSerializer):
+        data = serializer_class.data
+        serializer_class.data = property(_timed('serializer_time', data.fget))
+    # FAST_SERIALIZATION responses never touch .data
+    ValuesPlan.serialize = _timed('serializer_time', ValuesPlan.serialize)
+    _hooks_installed = True
+
+
+def install_query_hook():
+    """
+    Record the queries of every connection into the current profile.
+    Connections are per thread, and under ASGI the ORM runs on sync_to_async
+    workers rather than the thread handling the request, so this wraps the
+    cursor itself instead of the connections of one thread.
+    """
+    global _query_hook_installed
+    if _query_hook_installed:
+        return
+    from django.db.backends.utils import CursorWrapper
+
+    execute_with_wrappers = CursorWrapper._execute_with_wrappers
+
+    def wrapper(self, sql, params, many, executor):
+        profile = _current.get()
+        if profile is None:
+            return execute_with_wrappers(self, sql, params, many, executor)
+        return profile.record_query(
+            lambda *args: execute_with_wrappers(self, sql, params, many, executor), sql, params, many, None,
+        )
+
+    CursorWrapper._execute_with_wrappers = wrapper
+    _query_hook_installed = True
+
+
+class RequestProfilingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'REQUEST_PROFILING', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.log_sample_rate = getattr(settings, 'REQUEST_PROFILING_LOG_SAMPLE_RATE', 0.01)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        install_drf_hooks()
+        install_query_hook()
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        profile = RequestProfile()
+        token = _current.set(profile)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.process_profile(request, response, profile, start)
+
+    async def __acall__(self, request):
+        profile = RequestProfile()
+        token = _current.set(profile)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.process_profile(request, response, profile, start)
+
+    def process_profile(self, request, response, profile, start):
+        response['Server-Timing'] = profile.server_timing(time.perf_counter() - start)
+        if random.random() >= self.log_sample_rate:
+            return response
+        if response.streaming:
+            response.streaming_content = self.profile_stream(
+                response, profile, lambda: self.log(request, response, profile, time.perf_counter() - start),
+            )
+        else:
+            self.log(request, response, profile, time.perf_counter() - start)
+        return response
+
+    def profile_stream(self, response, profile, done):
+        """Wrap the streaming content so its queries join `profile`; call done() at the end."""
+        content = response.streaming_content
+        if response.is_async:
+            async def stream():
+                iterator = aiter(content)
+                while True:
+                    token = _current.set(profile)
+                    try:
+                        chunk = await anext(iterator)
+                    except StopAsyncIteration:
+                        break
+                    finally:
+                        _current.reset(token)
+                    yield chunk
+                done()
+        else:
+            def stream():
+                iterator = iter(content)
+                while True:
+                    token = _current.set(profile)
+                    try:
+                        chunk = next(iterator)
+                    except StopIteration:
+                        break
+                    finally:
+                        _current.reset(token)
+                    yield chunk
+                done()
+        return stream()
+
+    def log(self, request, response, profile, total):
+        logger.info(json.dumps({
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'streaming': response.streaming,
+            'total_ms': round(total * 1000, 2),
+            'sql_ms': round(profile.sql_time * 1000, 2),
+            'queries': profile.query_count,
+            'auth_ms': round(profile.auth_time * 1000, 2),
+            'serializer_ms': round(profile.serializer_time * 1000, 2),
+            'duplicated_queries': profile.duplicates(),
+        }))
@@ -0,0 +1,32 @@
+"""
+JSON renderer backed by orjson when it is installed.
+
+The output is byte-identical to rest_framework.renderers.JSONRenderer with
+the default compact, non-ASCII settings: datetimes, decimals and lazy strings
+go through DRF's own encoder, and U+2028/U+2029 are escaped the same way.
+Indented output (browsable API, `; indent=` in Accept) and anything orjson
+refuses, such as integers wider than 64 bits, fall back to JSONRenderer.
+"""
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class ORJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (
+            orjson is None or data is None or self.ensure_ascii or not self.compact
+            or self.get_indent(accepted_media_type, renderer_context or {}) is not None
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            content = orjson.dumps(
+                data, default=self.encoder_class().default,
+                option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS,
+            )
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        return content.replace('\u2028'.encode(), b'\\u2028').replace('\u2029'.encode(), b'\\u2029')
@@ -45,6 +45,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'learning_platform.profiling.RequestProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -74,6 +75,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'learning_platform.wsgi.application'
+ASGI_APPLICATION = 'learning_platform.asgi.application'
 
 
 # Database
@@ -83,13 +85,115 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # A file rather than the shared in-memory database, whose table locks
+        # fail concurrent writers at once instead of waiting (see
+        # courses.tests.EnrollRaceTests)
+        'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
     }
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# Local memory is per process; point this at Redis or Memcached in production
+# so every worker shares the catalog cache.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'learning-platform',
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    }
+}
+
+# Seconds a cached anonymous catalog response is kept
+CATALOG_CACHE_TIMEOUT = 300
+
+# Student dashboard (courses/dashboard.py): courses listed, most recently
+# active first, and seconds a built dashboard is cached. The cache entry is
+# dropped whenever the student's progress rollups change.
+DASHBOARD_COURSES = 12
+DASHBOARD_CACHE_TIMEOUT = 300
+
+# Instructor analytics (courses/analytics.py), aggregated by
+# `manage.py refresh_analytics --loop`: a run skips rows younger than
+# ANALYTICS_SETTLE_SECONDS so transactions still committing are not missed,
+# and course analytics show the last ANALYTICS_DAYS days by default.
+ANALYTICS_SETTLE_SECONDS = 10
+ANALYTICS_DAYS = 30
+
+# Buffer video position heartbeats in the cache and write them in batches
+# (see courses/position_buffer.py). Needs a cache shared by every process,
+# such as Redis or Memcached; with local memory it stays disabled. Flushing
+# runs in a thread of each process every PROGRESS_FLUSH_INTERVAL seconds, or
+# with None in `manage.py flush_progress_positions --loop`.
+PROGRESS_WRITE_BEHIND = False
+PROGRESS_FLUSH_INTERVAL = 5
+
+# Characters read per query when streaming large text columns such as lesson
+# content (see learning_platform/streaming.py)
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# Rows fetched per round trip by the enrollment and progress exports
+# (see courses/exports.py)
+EXPORT_CHUNK_SIZE = 2000
+
+# Courses written per bulk_create batch and savepoint by catalog imports
+# (see courses/imports.py)
+IMPORT_CHUNK_SIZE = 500
+
+
+# Request profiling (learning_platform/profiling.py): Server-Timing headers with
+# SQL, auth and serializer time plus a sampled structured log. Off by default;
+# when off the middleware unloads itself at startup.
+REQUEST_PROFILING = os.environ.get('REQUEST_PROFILING', '') == '1'
+REQUEST_PROFILING_LOG_SAMPLE_RATE = float(os.environ.get('REQUEST_PROFILING_LOG_SAMPLE_RATE', '0.01'))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'learning_platform.profiling': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
+# Password hashing. The first hasher hashes new passwords; the others verify
+# existing hashes, which are upgraded to the first one on the next login.
+PASSWORD_HASH_ALGORITHM = os.environ.get('PASSWORD_HASH_ALGORITHM', 'argon2')
+_PREFERRED_HASHERS = {
+    'argon2': 'users.hashers.TunedArgon2PasswordHasher',
+    'bcrypt': 'users.hashers.TunedBCryptSHA256PasswordHasher',  # requires the bcrypt package
+    'pbkdf2': 'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+}
+PASSWORD_HASHERS = [_PREFERRED_HASHERS[PASSWORD_HASH_ALGORITHM]] + [
+    hasher for name, hasher in _PREFERRED_HASHERS.items() if name != PASSWORD_HASH_ALGORITHM
+] + [
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+ARGON2_TIME_COST = int(os.environ.get('ARGON2_TIME_COST', '2'))
+ARGON2_MEMORY_COST = int(os.environ.get('ARGON2_MEMORY_COST', '19456'))  # KiB
+ARGON2_PARALLELISM = int(os.environ.get('ARGON2_PARALLELISM', '1'))
+BCRYPT_ROUNDS = int(os.environ.get('BCRYPT_ROUNDS', '12'))
+# Threads verifying login passwords, and how many logins may wait for one
+PASSWORD_CHECK_WORKERS = int(os.environ.get('PASSWORD_CHECK_WORKERS', '4'))
+PASSWORD_CHECK_QUEUE = int(os.environ.get('PASSWORD_CHECK_QUEUE', '64'))
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -138,11 +242,15 @@ AUTH_USER_MODEL = 'users.User'
 # REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'users.authentication.ClaimsJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'learning_platform.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 10
 }
@@ -152,8 +260,19 @@ SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(days=1),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=7),
     'ROTATE_REFRESH_TOKENS': True,
+    # Build request.user from token claims instead of a per-request user query
+    'TOKEN_USER_CLASS': 'users.authentication.ClaimsUser',
+    # Refuse deactivated users and stamp their current claims on refresh
+    'TOKEN_REFRESH_SERIALIZER': 'users.tokens.ClaimsTokenRefreshSerializer',
 }
 
+# Serve read-only course, category and enrollment endpoints from values()
+# rows instead of model instances, see learning_platform.fastserializers
+FAST_SERIALIZATION = True
+
+# Seconds a full user row fetched for a token user stays cached
+TOKEN_USER_CACHE_TIMEOUT = 60
+
 # CORS Settings
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",
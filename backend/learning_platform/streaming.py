@@ -0,0 +1,160 @@
+"""
+Streaming large values out of the database.
+
+aiter_text() yields one text column of one row in fixed-size slices read
+with SUBSTR, so a response body is never held in memory whole; under ASGI
+each slice is sent as soon as it is read. Under WSGI Django has to collect
+an async iterator before sending it, so serve iter_text() there instead.
+
+iter_rows() and aiter_rows() do the same for many rows: they encode tuples
+from values_list(...).iterator() (or aiter_queryset()) as CSV or NDJSON and
+yield them in STREAM_CHUNK_SIZE batches, so memory stays constant however
+many rows there are. Views pick the async or the sync variant with
+is_asgi().
+"""
+import csv
+import io
+from datetime import date, time
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models.functions import Substr
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def stream_chunk_size():
+    return getattr(settings, 'STREAM_CHUNK_SIZE', 64 * 1024)
+
+
+def is_asgi(request):
+    """Whether `request` (a Django or DRF request) is served by the ASGI handler."""
+    return isinstance(getattr(request, '_request', request), ASGIRequest)
+
+
+async def aiter_text(queryset, field, length, chunk_size=None):
+    """Yield `field` of the single row of `queryset`, `length` characters long, as UTF-8 slices."""
+    chunk_size = chunk_size or stream_chunk_size()
+    for start in range(1, length + 1, chunk_size):
+        chunk = await queryset.values_list(Substr(field, start, chunk_size), flat=True).afirst()
+        if not chunk:
+            # The row was deleted or shortened while streaming
+            return
+        yield chunk.encode()
+
+
+def iter_text(queryset, field, length, chunk_size=None):
+    """aiter_text() for WSGI responses."""
+    chunk_size = chunk_size or stream_chunk_size()
+    for start in range(1, length + 1, chunk_size):
+        chunk = queryset.values_list(Substr(field, start, chunk_size), flat=True).first()
+        if not chunk:
+            return
+        yield chunk.encode()
+
+
+async def aiter_queryset(queryset, chunk_size):
+    """
+    Yield the rows of queryset.iterator(chunk_size=chunk_size), fetching each
+    chunk in the ORM's thread. Django 4.2's aiterator() runs values_list()
+    queries on the event loop, which raises SynchronousOnlyOperation.
+    """
+    rows = queryset.iterator(chunk_size=chunk_size)
+    while True:
+        batch = await sync_to_async(list)(islice(rows, chunk_size))
+        if not batch:
+            return
+        for row in batch:
+            yield row
+
+
+class CSVEncoder:
+    """CSV with a header row; datetimes as in the API, booleans as true/false, nulls empty."""
+    media_type = 'text/csv'
+    extension = 'csv'
+
+    def __init__(self, columns):
+        self.columns = columns
+        self.buffer = io.StringIO()
+        self.writer = csv.writer(self.buffer)
+        self.default = JSONEncoder().default
+
+    def value(self, value):
+        if isinstance(value, bool):
+            return 'true' if value else 'false'
+        if isinstance(value, (date, time)):
+            return self.default(value)
+        return value
+
+    def header(self):
+        return self.encode_row(self.columns)
+
+    def encode(self, row):
+        return self.encode_row([self.value(value) for value in row])
+
+    def encode_row(self, values):
+        self.writer.writerow(values)
+        line = self.buffer.getvalue()
+        self.buffer.seek(0)
+        self.buffer.truncate()
+        return line
+
+
+class NDJSONEncoder:
+    """One JSON object per line, keyed by column, encoded like the API responses."""
+    media_type = 'application/x-ndjson'
+    extension = 'ndjson'
+
+    def __init__(self, columns):
+        self.columns = columns
+        self.default = JSONEncoder().default
+
+    def header(self):
+        return ''
+
+    def encode(self, row):
+        data = dict(zip(self.columns, row))
+        if orjson is not None:
+            return orjson.dumps(data, default=self.default, option=orjson.OPT_PASSTHROUGH_DATETIME).decode() + '\n'
+        return JSONEncoder(ensure_ascii=False, separators=(',', ':')).encode(data) + '\n'
+
+
+ROW_ENCODERS = {'csv': CSVEncoder, 'ndjson': NDJSONEncoder}
+
+
+def iter_rows(encoder, rows, chunk_size=None):
+    """Yield `rows` encoded by `encoder`, header first, batched into chunk_size-character strings."""
+    chunk_size = chunk_size or stream_chunk_size()
+    batch = [encoder.header()]
+    size = len(batch[0])
+    for row in rows:
+        line = encoder.encode(row)
+        batch.append(line)
+        size += len(line)
+        if size >= chunk_size:
+            yield ''.join(batch)
+            batch, size = [], 0
+    if size:
+        yield ''.join(batch)
+
+
+async def aiter_rows(encoder, rows, chunk_size=None):
+    """iter_rows() over an async iterable of rows, yielding UTF-8 bytes for StreamingHttpResponse."""
+    chunk_size = chunk_size or stream_chunk_size()
+    batch = [encoder.header()]
+    size = len(batch[0])
+    async for row in rows:
+        line = encoder.encode(row)
+        batch.append(line)
+        size += len(line)
+        if size >= chunk_size:
+            yield ''.join(batch).encode()
+            batch, size = [], 0
+    if size:
+        yield ''.join(batch).encode()
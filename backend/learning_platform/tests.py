@@ -0,0 +1,66 @@
+import json
+import re
+
+from asgiref.sync import iscoroutinefunction
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import AsyncClient, TestCase, override_settings
+from rest_framework.test import APIClient
+from courses.models import Course, Enrollment, Lesson
+from .profiling import RequestProfilingMiddleware
+
+User = get_user_model()
+
+SERVER_TIMING_QUERIES = re.compile(r'db;dur=[\d.]+;desc="(\d+) queries')
+
+
+def timed_queries(response):
+    return int(SERVER_TIMING_QUERIES.search(response['Server-Timing']).group(1))
+
+
+@override_settings(REQUEST_PROFILING=True, REQUEST_PROFILING_LOG_SAMPLE_RATE=0)
+class RequestProfilingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('staff', 'staff@example.com', 'x', is_staff=True)
+        course = Course.objects.create(
+            title='Python', description='Learn Python', instructor=cls.staff, is_published=True,
+        )
+        lesson = Lesson.objects.create(course=course, title='Lesson', order=0)
+        Enrollment.objects.create(student=cls.staff, course=course)
+        cls.course, cls.lesson = course, lesson
+
+    def setUp(self):
+        cache.clear()
+
+    def test_middleware_follows_the_handler_mode(self):
+        async def async_view(request):
+            return HttpResponse()
+
+        with override_settings(REQUEST_PROFILING=True):
+            self.assertFalse(iscoroutinefunction(RequestProfilingMiddleware(lambda request: HttpResponse())))
+            self.assertTrue(iscoroutinefunction(RequestProfilingMiddleware(async_view)))
+
+    def test_wsgi_request(self):
+        response = self.client.get('/api/courses/')
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(timed_queries(response), 0)
+
+    async def test_asgi_request_counts_queries_on_worker_threads(self):
+        response = await AsyncClient().get('/api/courses/')
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(timed_queries(response), 0)
+
+    @override_settings(REQUEST_PROFILING_LOG_SAMPLE_RATE=1.0)
+    def test_streamed_queries_are_logged(self):
+        client = APIClient()
+        client.force_authenticate(self.staff)
+        with self.assertLogs('learning_platform.profiling', 'INFO') as logs:
+            response = client.get(f'/api/exports/enrollments/?course={self.course.id}')
+            self.assertEqual(logs.output, [])
+            body = b''.join(response.streaming_content)
+        self.assertIn(b'staff', body)
+        record = json.loads(logs.records[0].getMessage())
+        self.assertTrue(record['streaming'])
+        self.assertGreater(record['queries'], timed_queries(response))
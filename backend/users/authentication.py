@@ -0,0 +1,158 @@
+"""
+Stateless JWT authentication.
+
+Access tokens issued by users.tokens.ClaimsRefreshToken carry the user's
+username, is_staff and is_instructor. With SIMPLE_JWT['TOKEN_USER_CLASS'] set
+to ClaimsUser, ClaimsJWTAuthentication builds request.user from the token
+instead of querying the user row on every request. Views that need the rest of
+the row call get_full_user().
+
+The claims are checked against the user row, cached for
+TOKEN_USER_CACHE_TIMEOUT seconds and invalidated whenever the user is saved or
+deleted (see users.signals): a token is rejected once its user is deleted or
+deactivated or its role claims no longer match, so changes take effect within
+one cache timeout. Refreshing a token stamps the current claims on the new
+one. Tokens issued without the claims are rejected; refresh them or log in
+again.
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.utils.functional import cached_property
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTStatelessUserAuthentication
+from rest_framework_simplejwt.models import TokenUser
+
+TOKEN_USER_CLAIMS = ('username', 'is_staff', 'is_instructor')
+
+
+def user_cache_key(user_id):
+    return f'users:user:{int(user_id)}'
+
+
+def get_cached_user(user_id):
+    """Return the user row for `user_id`, served from the cache when possible."""
+    key = user_cache_key(user_id)
+    user = cache.get(key)
+    if user is None:
+        user = get_user_model().objects.get(pk=user_id)
+        cache.set(key, user, getattr(settings, 'TOKEN_USER_CACHE_TIMEOUT', 60))
+    return user
+
+
+async def aget_cached_user(user_id):
+    key = user_cache_key(user_id)
+    user = await cache.aget(key)
+    if user is None:
+        user = await get_user_model().objects.aget(pk=user_id)
+        await cache.aset(key, user, getattr(settings, 'TOKEN_USER_CACHE_TIMEOUT', 60))
+    return user
+
+
+def get_full_user(user):
+    """Return a model instance for request.user whichever authentication class set it."""
+    if isinstance(user, ClaimsUser):
+        return user.get_full_user()
+    return user
+
+
+async def aget_full_user(user):
+    if isinstance(user, ClaimsUser):
+        return await user.aget_full_user()
+    return user
+
+
+def check_user(user):
+    """Raise AuthenticationFailed unless `user`, a row or None, may still use its tokens."""
+    if user is None:
+        raise AuthenticationFailed('User not found', code='user_not_found')
+    if not user.is_active:
+        raise AuthenticationFailed('User is inactive', code='user_inactive')
+
+
+class ClaimsJWTAuthentication(JWTStatelessUserAuthentication):
+    """
+    JWTStatelessUserAuthentication checking the token's claims against the
+    cached user row. aauthenticate() does the same through the async cache and
+    ORM, for the async views of learning_platform.async_views.
+    """
+
+    def get_user(self, validated_token):
+        user = super().get_user(validated_token)
+        try:
+            row = get_cached_user(user.id)
+        except get_user_model().DoesNotExist:
+            row = None
+        return self.check_claims(user, row)
+
+    async def aauthenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+        user = super().get_user(validated_token)
+        try:
+            row = await aget_cached_user(user.id)
+        except get_user_model().DoesNotExist:
+            row = None
+        return self.check_claims(user, row), validated_token
+
+    def check_claims(self, user, row):
+        check_user(row)
+        for claim in TOKEN_USER_CLAIMS:
+            if claim not in user.token:
+                raise AuthenticationFailed('Token has no role claims, refresh it', code='token_outdated')
+            if user.token[claim] != getattr(row, claim):
+                raise AuthenticationFailed('Token claims are out of date, refresh it', code='token_outdated')
+        user._full_user = row
+        return user
+
+
+class ClaimsUser(TokenUser):
+    """
+    request.user built from access token claims. ClaimsJWTAuthentication
+    attaches the cached user row, which any other model field is read from.
+    """
+
+    def get_full_user(self):
+        if '_full_user' not in self.__dict__:
+            self._full_user = get_cached_user(self.id)
+        return self._full_user
+
+    async def aget_full_user(self):
+        if '_full_user' not in self.__dict__:
+            self._full_user = await aget_cached_user(self.id)
+        return self._full_user
+
+    def _claim(self, name):
+        if name in self.token:
+            return self.token[name]
+        return getattr(self.get_full_user(), name)
+
+    @cached_property
+    def username(self):
+        return self._claim('username')
+
+    @cached_property
+    def is_staff(self):
+        return self._claim('is_staff')
+
+    @cached_property
+    def is_superuser(self):
+        return self._claim('is_superuser')
+
+    @cached_property
+    def is_instructor(self):
+        return self._claim('is_instructor')
+
+    def __getattr__(self, name):
+        if name.startswith('_') or name not in _user_field_names():
+            raise AttributeError(name)
+        return getattr(self.get_full_user(), name)
+
+
+def _user_field_names():
+    return {field.attname for field in get_user_model()._meta.concrete_fields}
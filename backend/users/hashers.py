@@ -0,0 +1,82 @@
+"""
+Password hashers with costs taken from settings, and a bounded pool for
+verifying passwords off the request thread.
+
+Changing ARGON2_* or BCRYPT_ROUNDS, or moving PASSWORD_HASHERS to a different
+preferred hasher, re-hashes each user's password the next time they log in.
+"""
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import (
+    Argon2PasswordHasher, BCryptSHA256PasswordHasher, check_password, make_password,
+)
+
+_pool = None
+_pool_lock = threading.Lock()
+_pending = None
+
+
+class TunedArgon2PasswordHasher(Argon2PasswordHasher):
+    @property
+    def time_cost(self):
+        return getattr(settings, 'ARGON2_TIME_COST', 2)
+
+    @property
+    def memory_cost(self):
+        return getattr(settings, 'ARGON2_MEMORY_COST', 19456)
+
+    @property
+    def parallelism(self):
+        return getattr(settings, 'ARGON2_PARALLELISM', 1)
+
+
+class TunedBCryptSHA256PasswordHasher(BCryptSHA256PasswordHasher):
+    @property
+    def rounds(self):
+        return getattr(settings, 'BCRYPT_ROUNDS', 12)
+
+
+class HashPoolBusy(Exception):
+    """More password checks are queued than PASSWORD_CHECK_QUEUE allows."""
+
+
+def _get_pool():
+    global _pool, _pending
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pending = threading.BoundedSemaphore(getattr(settings, 'PASSWORD_CHECK_QUEUE', 64))
+                _pool = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'PASSWORD_CHECK_WORKERS', 4),
+                    thread_name_prefix='password-check',
+                )
+    return _pool
+
+
+def _verify(password, encoded):
+    upgraded = []
+    is_correct = check_password(password, encoded, setter=lambda raw: upgraded.append(make_password(raw)))
+    return is_correct, upgraded[0] if upgraded else None
+
+
+async def verify_password(password, encoded):
+    """
+    Check `password` against `encoded` in the password-check pool. Returns
+    (is_correct, new_encoded) where new_encoded is set when the stored hash
+    should be replaced. Pass encoded=None to spend the same time on an
+    unknown user. Raises HashPoolBusy instead of queueing without bound.
+    """
+    pool = _get_pool()
+    if not _pending.acquire(blocking=False):
+        raise HashPoolBusy
+    try:
+        loop = asyncio.get_running_loop()
+        if encoded is None:
+            await loop.run_in_executor(pool, make_password, password)
+            return False, None
+        return await loop.run_in_executor(pool, _verify, password, encoded)
+    finally:
+        _pending.release()
@@ -0,0 +1,9 @@
+from rest_framework.permissions import BasePermission
+
+
+class IsInstructor(BasePermission):
+    """Instructors and staff, read from the token claims without a user query."""
+
+    def has_permission(self, request, view):
+        user = request.user
+        return bool(user and user.is_authenticated and (user.is_instructor or user.is_staff))
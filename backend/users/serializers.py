@@ -1,9 +1,10 @@
 from rest_framework import serializers
 from django.contrib.auth.password_validation import validate_password
+from learning_platform.fieldsets import SparseFieldsetMixin
 from .models import User
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ['id', 'username', 'email', 'bio', 'avatar', 'is_instructor', 'date_joined']
@@ -0,0 +1,84 @@
+import json
+import threading
+from unittest import mock
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.signals import user_login_failed
+from django.test import TestCase
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from . import hashers
+from .models import User
+
+
+class LoginTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('ada', 'ada@example.com', 'correct horse', bio='Zürich')
+
+    def login(self, username='ada', password='correct horse', **kwargs):
+        return APIClient().post('/api/auth/login/', {'username': username, 'password': password}, **kwargs)
+
+    def test_login_then_profile(self):
+        response = self.login(format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        data = json.loads(response.content)
+        # Compact separators, non-ASCII kept, datetimes as DRF writes them
+        self.assertEqual(response.content, JSONRenderer().render(data))
+        self.assertEqual((data['user']['username'], data['user']['bio']), ('ada', 'Zürich'))
+
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {data["access"]}')
+        profile = client.get('/api/auth/profile/')
+        self.assertEqual(profile.status_code, 200)
+        self.assertEqual(profile.json(), data['user'])
+
+    def test_form_encoded_login(self):
+        self.assertEqual(self.login().status_code, 200)
+
+    def test_bad_credentials(self):
+        failures = []
+
+        def record(sender, credentials, **kwargs):
+            failures.append(credentials['username'])
+
+        user_login_failed.connect(record)
+        self.addCleanup(user_login_failed.disconnect, record)
+        for username, password in (('ada', 'wrong'), ('nobody', 'correct horse')):
+            with self.subTest(username=username):
+                response = self.login(username, password, format='json')
+                self.assertEqual(response.status_code, 401)
+                self.assertEqual(response.content, b'{"error":"Invalid credentials"}')
+        self.assertEqual(failures, ['ada', 'nobody'])
+
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertEqual(self.login(format='json').status_code, 401)
+
+    def test_malformed_bodies(self):
+        client = APIClient()
+        for body in ('{', '[]', '{"username": "ada"}', '{"username": "ada", "password": 1}'):
+            with self.subTest(body=body):
+                response = client.post('/api/auth/login/', body, content_type='application/json')
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('error', response.json())
+
+    def test_outdated_hash_is_upgraded(self):
+        User.objects.filter(pk=self.user.pk).update(
+            password=make_password('correct horse', hasher='pbkdf2_sha256')
+        )
+        self.assertEqual(self.login(format='json').status_code, 200)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith('argon2'))
+        self.assertTrue(self.user.check_password('correct horse'))
+
+    def test_full_check_queue_answers_503(self):
+        hashers._get_pool()
+        with mock.patch.object(hashers, '_pending', threading.BoundedSemaphore(1)) as pending:
+            pending.acquire()
+            response = self.login(format='json')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertEqual(response.content, b'{"error":"Too many logins in progress, please retry"}')
+        # The slot is free again once the queue drains
+        self.assertEqual(self.login(format='json').status_code, 200)
@@ -0,0 +1,50 @@
+from django.contrib.auth import get_user_model
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+from .authentication import TOKEN_USER_CLAIMS, check_user, get_cached_user
+
+
+class ClaimsRefreshToken(RefreshToken):
+    """Refresh token whose access tokens carry the claims ClaimsUser reads."""
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        token.stamp_claims(user)
+        return token
+
+    def stamp_claims(self, user):
+        for claim in TOKEN_USER_CLAIMS:
+            self[claim] = getattr(user, claim)
+
+
+class ClaimsTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    Refresh against the cached user row: deleted and deactivated users are
+    refused, and the new tokens carry the user's current claims.
+    """
+    token_class = ClaimsRefreshToken
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+        try:
+            user = get_cached_user(refresh[api_settings.USER_ID_CLAIM])
+        except (KeyError, get_user_model().DoesNotExist):
+            user = None
+        check_user(user)
+        refresh.stamp_claims(user)
+
+        data = {'access': str(refresh.access_token)}
+        if api_settings.ROTATE_REFRESH_TOKENS:
+            if api_settings.BLACKLIST_AFTER_ROTATION:
+                try:
+                    refresh.blacklist()
+                except AttributeError:
+                    pass
+            refresh.set_jti()
+            refresh.set_exp()
+            refresh.set_iat()
+            data['refresh'] = str(refresh)
+        return data
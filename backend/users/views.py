@@ -1,11 +1,22 @@
+import json
+
 from rest_framework import generics, status
-from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
-from rest_framework_simplejwt.tokens import RefreshToken
-from django.contrib.auth import authenticate
+from rest_framework.views import APIView
+from asgiref.sync import sync_to_async
+from django.contrib.auth.signals import user_login_failed
+from django.http import HttpResponse
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from learning_platform.async_views import AsyncViewMixin
+from learning_platform.renderers import ORJSONRenderer
+from .authentication import aget_full_user
+from .hashers import HashPoolBusy, verify_password
 from .models import User
 from .serializers import UserSerializer, RegisterSerializer
+from .tokens import ClaimsRefreshToken
 
 
 class RegisterView(generics.CreateAPIView):
@@ -18,7 +29,7 @@ class RegisterView(generics.CreateAPIView):
         serializer.is_valid(raise_exception=True)
         user = serializer.save()
         
-        refresh = RefreshToken.for_user(user)
+        refresh = ClaimsRefreshToken.for_user(user)
         return Response({
             'user': UserSerializer(user).data,
             'refresh': str(refresh),
@@ -26,37 +37,78 @@ class RegisterView(generics.CreateAPIView):
         }, status=status.HTTP_201_CREATED)
 
 
-@api_view(['POST'])
-@permission_classes([AllowAny])
-def login_view(request):
-    username = request.data.get('username')
-    password = request.data.get('password')
-    
-    if username is None or password is None:
-        return Response(
-            {'error': 'Please provide both username and password'},
-            status=status.HTTP_400_BAD_REQUEST
-        )
-    
-    user = authenticate(username=username, password=password)
-    
-    if not user:
-        return Response(
-            {'error': 'Invalid credentials'},
-            status=status.HTTP_401_UNAUTHORIZED
-        )
-    
-    refresh = RefreshToken.for_user(user)
-    return Response({
-        'user': UserSerializer(user).data,
-        'refresh': str(refresh),
-        'access': str(refresh.access_token),
-    })
-
-
-@api_view(['GET'])
-@permission_classes([IsAuthenticated])
-def profile_view(request):
-    serializer = UserSerializer(request.user)
-    return Response(serializer.data)
+def json_response(data, status=status.HTTP_200_OK):
+    """`data` rendered by the API's JSON renderer, so plain views answer byte for byte like DRF ones."""
+    return HttpResponse(ORJSONRenderer().render(data), content_type=ORJSONRenderer.media_type, status=status)
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class LoginView(View):
+    """
+    Async login. The password hash is checked in the bounded password-check
+    pool (see users.hashers) so a burst of logins queues there instead of
+    tying up the workers serving other traffic; when the queue is full the
+    client is asked to retry. Hashes made with outdated settings are
+    upgraded on a successful login.
+    """
+
+    async def post(self, request):
+        try:
+            data = json.loads(request.body) if request.content_type == 'application/json' else request.POST
+        except ValueError:
+            return json_response({'error': 'Malformed JSON body'}, status=status.HTTP_400_BAD_REQUEST)
+        if not isinstance(data, dict):
+            return json_response({'error': 'Expected a JSON object'}, status=status.HTTP_400_BAD_REQUEST)
+        username = data.get('username')
+        password = data.get('password')
+
+        if not isinstance(username, str) or not isinstance(password, str):
+            return json_response(
+                {'error': 'Please provide both username and password'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            user = await User.objects.aget(**{User.USERNAME_FIELD: username})
+        except User.DoesNotExist:
+            user = None
+
+        try:
+            # An unknown username still pays for one hash, like authenticate()
+            is_correct, new_encoded = await verify_password(password, user.password if user else None)
+        except HashPoolBusy:
+            response = json_response(
+                {'error': 'Too many logins in progress, please retry'},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE
+            )
+            response['Retry-After'] = '1'
+            return response
+
+        if not is_correct or not user.is_active:
+            await sync_to_async(user_login_failed.send)(
+                sender=__name__, credentials={'username': username}, request=request
+            )
+            return json_response(
+                {'error': 'Invalid credentials'},
+                status=status.HTTP_401_UNAUTHORIZED
+            )
+
+        if new_encoded:
+            user.password = new_encoded
+            await user.asave(update_fields=['password'])
+
+        refresh = ClaimsRefreshToken.for_user(user)
+        return json_response({
+            'user': UserSerializer(user).data,
+            'refresh': str(refresh),
+            'access': str(refresh.access_token),
+        })
+
+
+class ProfileView(AsyncViewMixin, APIView):
+    permission_classes = [IsAuthenticated]
+
+    async def get(self, request):
+        serializer = UserSerializer(await aget_full_user(request.user))
+        return Response(serializer.data)
 
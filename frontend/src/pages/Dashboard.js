@@ -6,24 +6,32 @@ import './Dashboard.css';
 
 const Dashboard = () => {
   const { user } = useAuth();
+  const [summary, setSummary] = useState(null);
   const [enrollments, setEnrollments] = useState([]);
   const [loading, setLoading] = useState(true);
 
   useEffect(() => {
-    fetchEnrollments();
+    fetchDashboard();
   }, []);
 
-  const fetchEnrollments = async () => {
+  // Totals and the most recently active courses, precomputed on the server
+  const fetchDashboard = async () => {
     try {
-      const response = await api.get('/enrollments/');
-      setEnrollments(response.data.results || response.data);
+      const response = await api.get('/dashboard/');
+      setSummary(response.data.summary);
+      setEnrollments(response.data.enrollments);
     } catch (error) {
-      console.error('Error fetching enrollments:', error);
+      console.error('Error fetching dashboard:', error);
     } finally {
       setLoading(false);
     }
   };
 
+  const continueUrl = (enrollment) =>
+    enrollment.last_lesson && !enrollment.is_completed
+      ? `/courses/${enrollment.course.id}/lessons/${enrollment.last_lesson.id}`
+      : `/courses/${enrollment.course.id}`;
+
   if (loading) {
     return <div className="loading">Loading dashboard...</div>;
   }
@@ -46,6 +54,22 @@ const Dashboard = () => {
           </div>
         ) : (
           <div className="enrollments-section">
+            {summary && (
+              <div className="dashboard-stats">
+                <div className="stat">
+                  <span className="stat-value">{summary.enrolled_count}</span>
+                  <span className="stat-label">Enrolled</span>
+                </div>
+                <div className="stat">
+                  <span className="stat-value">{summary.completed_count}</span>
+                  <span className="stat-label">Completed</span>
+                </div>
+                <div className="stat">
+                  <span className="stat-value">{Math.round(summary.watched_seconds / 60)}</span>
+                  <span className="stat-label">Minutes watched</span>
+                </div>
+              </div>
+            )}
             <h2>My Courses</h2>
             <div className="enrollments-grid">
               {enrollments.map((enrollment) => (
@@ -65,8 +89,11 @@ const Dashboard = () => {
                       </span>
                     </div>
                     <p className="card-text">
-                      {enrollment.course.description.substring(0, 100)}...
+                      {enrollment.course.description}...
                     </p>
+                    {enrollment.last_lesson && (
+                      <p className="last-lesson">Last lesson: {enrollment.last_lesson.title}</p>
+                    )}
                     <div className="progress-section">
                       <div className="progress-info">
                         <span>Progress: {enrollment.progress_percentage || 0}%</span>
@@ -79,7 +106,7 @@ const Dashboard = () => {
                       </div>
                     </div>
                     <Link
-                      to={`/courses/${enrollment.course.id}`}
+                      to={continueUrl(enrollment)}
                       className="btn btn-primary btn-block"
                     >
                       {enrollment.is_completed ? 'Review Course' : 'Continue Learning'}
@@ -8,12 +8,13 @@ const LessonViewer = () => {
   const navigate = useNavigate();
   const [course, setCourse] = useState(null);
   const [lesson, setLesson] = useState(null);
-  const [progress, setProgress] = useState(null);
+  const [enrollment, setEnrollment] = useState(null);
+  const [progressByLesson, setProgressByLesson] = useState({});
   const [loading, setLoading] = useState(true);
   const [currentLessonIndex, setCurrentLessonIndex] = useState(0);
 
   useEffect(() => {
-    fetchCourse();
+    fetchLearnerState();
   }, [courseId]);
 
   useEffect(() => {
@@ -22,11 +23,14 @@ const LessonViewer = () => {
     }
   }, [course, lessonId]);
 
-  const fetchCourse = async () => {
+  // Course outline, enrollment and progress arrive together in one request
+  const fetchLearnerState = async () => {
     try {
-      const response = await api.get(`/courses/${courseId}/`);
-      setCourse(response.data);
-      const index = response.data.lessons.findIndex((l) => l.id === parseInt(lessonId));
+      const response = await api.get(`/courses/${courseId}/learner-state/`);
+      setCourse(response.data.course);
+      setEnrollment(response.data.enrollment);
+      setProgressByLesson(response.data.progress);
+      const index = response.data.course.lessons.findIndex((l) => l.id === parseInt(lessonId));
       setCurrentLessonIndex(index >= 0 ? index : 0);
     } catch (error) {
       console.error('Error fetching course:', error);
@@ -38,40 +42,36 @@ const LessonViewer = () => {
   const fetchLesson = async () => {
     try {
       const lessonData = course.lessons.find((l) => l.id === parseInt(lessonId));
-      setLesson(lessonData);
-
-      // Try to fetch enrollment and progress, but don't fail if not enrolled
-      try {
-        const enrollmentResponse = await api.get(`/courses/${courseId}/my_enrollment/`);
-        const enrollment = enrollmentResponse.data;
-
-        const progressResponse = await api.get(
-          `/progress/?enrollment=${enrollment.id}&lesson=${lessonId}`
-        );
-        if (progressResponse.data.length > 0) {
-          setProgress(progressResponse.data[0]);
-        }
-      } catch (enrollmentError) {
-        // User might not be enrolled, that's okay
-        console.log('Enrollment not found, continuing without progress data');
+      if (!lessonData) {
+        setLesson(null);
+        return;
       }
+      // The course outline leaves out lesson bodies; fetch this one's separately
+      const contentResponse = await api.get(
+        `/courses/${courseId}/lessons/${lessonId}/content/`,
+        { responseType: 'text' }
+      );
+      setLesson({ ...lessonData, content: contentResponse.data });
     } catch (error) {
       console.error('Error fetching lesson:', error);
     }
   };
 
+  const progress = progressByLesson[lessonId] || null;
+
   const markAsComplete = async () => {
+    if (!enrollment) {
+      console.error('Error marking lesson complete: not enrolled in this course');
+      return;
+    }
     try {
-      const enrollmentResponse = await api.get(`/courses/${courseId}/my_enrollment/`);
-      const enrollment = enrollmentResponse.data;
-
       await api.post('/progress/', {
         enrollment: enrollment.id,
         lesson: lessonId,
         completed: true,
       });
 
-      setProgress({ ...progress, completed: true });
+      setProgressByLesson({ ...progressByLesson, [lessonId]: { ...progress, completed: true } });
       alert('Lesson marked as complete!');
     } catch (error) {
       console.error('Error marking lesson complete:', error);